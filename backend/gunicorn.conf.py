@@ -0,0 +1,27 @@
+# Gunicorn running the ASGI app on uvicorn workers:
+#   gunicorn -c gunicorn.conf.py
+# asgi.py turns on the async read views (ASYNC_READ_VIEWS) and closes DB
+# connections per request (DB_CONN_MAX_AGE=0). The WSGI path, for comparison
+# with `manage.py bench_asgi`:
+#   gunicorn humoura_backend.wsgi -k gthread --workers 4 --threads 8 -b 127.0.0.1:8001
+import multiprocessing
+import os
+
+wsgi_app = "humoura_backend.asgi:application"
+worker_class = "uvicorn_worker.UvicornWorker"
+bind = os.environ.get("BIND", "0.0.0.0:8000")
+# One event loop per core; each worker holds thousands of idle keep-alive connections
+workers = int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count()))
+# Workers must share the catalog version (cache invalidation, search index,
+# recommender features), so default to the file-based catalog cache; set
+# CATALOG_CACHE_BACKEND=redis for several hosts. Workers load the app after
+# this file runs and inherit these variables, so users/apps.py refuses to
+# start them if CATALOG_CACHE_BACKEND=locmem is forced with workers > 1.
+os.environ.setdefault("CATALOG_CACHE_BACKEND", "file")
+os.environ["WEB_CONCURRENCY"] = str(workers)
+keepalive = int(os.environ.get("KEEPALIVE", 5))
+timeout = int(os.environ.get("WORKER_TIMEOUT", 60))
+graceful_timeout = 30
+# Each worker warms its own search index (asgi.py), so don't preload
+preload_app = False
+accesslog = os.environ.get("ACCESS_LOG")   # e.g. "-" for stdout
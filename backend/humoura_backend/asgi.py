@@ -12,5 +12,13 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'humoura_backend.settings')
+# Persistent connections leak under ASGI (one per event-loop thread); close per request.
+os.environ.setdefault('DB_CONN_MAX_AGE', '0')
+os.environ.setdefault('ASYNC_READ_VIEWS', '1')
 
 application = get_asgi_application()
+
+# Build the in-memory song search index in the background at startup
+from users.search_index import song_index  # noqa: E402
+
+song_index.warm_async()
@@ -1,4 +1,5 @@
 from pathlib import Path
+import importlib.util
 import os
 
 # Base directory of the project
@@ -58,17 +59,118 @@ TEMPLATES = [
 
 WSGI_APPLICATION = 'humoura_backend.wsgi.application'
 
-# Database configuration (MySQL)
-DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.mysql',
-        'NAME': 'harmoura',
-        'USER': 'root',
-        'PASSWORD': 'password',  # replace with your MySQL root password
-        'HOST': 'localhost',
-        'PORT': '3306',
+# Database configuration (MySQL; DB_ENGINE=sqlite for local runs against db.sqlite3)
+DB_ENGINE = os.environ.get('DB_ENGINE', 'mysql')
+if DB_ENGINE == 'sqlite':
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('DB_NAME', BASE_DIR / 'db.sqlite3'),
+        }
+    }
+else:
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.mysql',
+            'NAME': os.environ.get('DB_NAME', 'harmoura'),
+            'USER': os.environ.get('DB_USER', 'root'),
+            'PASSWORD': os.environ.get('DB_PASSWORD', 'password'),  # replace with your MySQL root password
+            'HOST': os.environ.get('DB_HOST', 'localhost'),
+            'PORT': os.environ.get('DB_PORT', '3306'),
+        }
+    }
+
+# Connection reuse. Persistent connections live for DB_CONN_MAX_AGE seconds and
+# are pinged before reuse. asgi.py defaults DB_CONN_MAX_AGE to 0, as Django
+# recommends for ASGI. DB_POOL_SIZE > 0 switches MySQL to a real pool
+# (django-db-connection-pool) when it is installed; the pool then owns reuse.
+DB_CONN_MAX_AGE = int(os.environ.get('DB_CONN_MAX_AGE', 60))
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 0))
+DATABASES['default']['CONN_MAX_AGE'] = DB_CONN_MAX_AGE
+DATABASES['default']['CONN_HEALTH_CHECKS'] = True
+if DB_POOL_SIZE and DB_ENGINE == 'mysql' and importlib.util.find_spec('dj_db_conn_pool'):
+    DATABASES['default'].update({
+        'ENGINE': 'dj_db_conn_pool.backends.mysql',
+        'CONN_MAX_AGE': 0,
+        'POOL_OPTIONS': {
+            'POOL_SIZE': DB_POOL_SIZE,
+            'MAX_OVERFLOW': int(os.environ.get('DB_POOL_MAX_OVERFLOW', DB_POOL_SIZE)),
+            'RECYCLE': int(os.environ.get('DB_POOL_RECYCLE', 3600)),
+            'PRE_PING': True,
+        },
+    })
+
+# Optional read replica for read-only catalog/search/tile views (users/routers.py).
+# DB_REPLICA_HOST for MySQL, DB_REPLICA_NAME for another SQLite file.
+if os.environ.get('DB_REPLICA_HOST') or os.environ.get('DB_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'HOST': os.environ.get('DB_REPLICA_HOST', DATABASES['default'].get('HOST', '')),
+        'PORT': os.environ.get('DB_REPLICA_PORT', DATABASES['default'].get('PORT', '')),
+        'NAME': os.environ.get('DB_REPLICA_NAME', DATABASES['default']['NAME']),
+        'TEST': {'MIRROR': 'default'},
     }
+DATABASE_ROUTERS = ['users.routers.PrimaryReplicaRouter']
+# Seconds after a catalog change during which cached views skip the replica (users/cache.py)
+REPLICA_LAG_SECONDS = float(os.environ.get('DB_REPLICA_LAG_SECONDS', 5))
+
+# Cache configuration
+# The "catalog" cache holds versioned catalog/tile responses (users/cache.py)
+# and the catalog version every worker checks its caches, search index and
+# recommender features against. CATALOG_CACHE_BACKEND: "locmem" (default,
+# single process only), "file" or "redis" (shared between processes).
+# With WEB_CONCURRENCY > 1 (gunicorn/uvicorn workers) locmem refuses to start.
+WEB_CONCURRENCY = int(os.environ.get('WEB_CONCURRENCY', 1))
+CATALOG_CACHE_BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+CATALOG_CACHE_BACKEND = os.environ.get('CATALOG_CACHE_BACKEND', 'locmem')
+CATALOG_CACHE_LOCATION = os.environ.get('CATALOG_CACHE_LOCATION', {
+    'locmem': 'harmoura-catalog',
+    'file': os.path.join(BASE_DIR, '.cache', 'catalog'),
+    'redis': 'redis://127.0.0.1:6379/1',
+}.get(CATALOG_CACHE_BACKEND, ''))
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    },
+    'catalog': {
+        'BACKEND': CATALOG_CACHE_BACKENDS[CATALOG_CACHE_BACKEND],
+        'LOCATION': CATALOG_CACHE_LOCATION,
+        'TIMEOUT': None,  # entries are invalidated by catalog version, not time
+        'OPTIONS': {'MAX_ENTRIES': 2000} if CATALOG_CACHE_BACKEND != 'redis' else {},
+    },
 }
+CATALOG_CACHE_ALIAS = 'catalog'
+CATALOG_CACHE_TIMEOUT = int(os.environ.get('CATALOG_CACHE_TIMEOUT', 24 * 60 * 60))
+
+# Per-process cache of authenticated users and their profiles (users/authentication.py)
+AUTH_CACHE_TTL = int(os.environ.get('AUTH_CACHE_TTL', 60))  # seconds; bounds staleness across processes
+AUTH_CACHE_SIZE = int(os.environ.get('AUTH_CACHE_SIZE', 10000))
+STREAM_TOKEN_MAX_AGE = int(os.environ.get('STREAM_TOKEN_MAX_AGE', 300))  # seconds a signed stream URL stays valid
+
+# Background work (users/tasks.py)
+BACKGROUND_WORKERS = int(os.environ.get('BACKGROUND_WORKERS', 4))
+BACKGROUND_TASKS_EAGER = os.environ.get('BACKGROUND_TASKS_EAGER', '') == '1'
+PLAY_FOLD_DELAY = float(os.environ.get('PLAY_FOLD_DELAY', 2.0))  # seconds between play_song and stat folding
+PLAYS_HALF_LIFE_DAYS = float(os.environ.get('PLAYS_HALF_LIFE_DAYS', 30))  # recommendations weigh a play half as much after this
+PLAYLIST_OPEN_FLUSH_INTERVAL = float(os.environ.get('PLAYLIST_OPEN_FLUSH_INTERVAL', 2.0))  # seconds
+PLAYLIST_CHANGELOG_RETENTION_DAYS = int(os.environ.get('PLAYLIST_CHANGELOG_RETENTION_DAYS', 30))  # older sync tokens get a full snapshot
+PLAYLIST_SYNC_SETTLE_SECONDS = int(os.environ.get('PLAYLIST_SYNC_SETTLE_SECONDS', 30))  # longer than any playlist write transaction
+
+# Password hashing: PBKDF2 cost is tunable; hashes at another cost are
+# upgraded on the user's next successful login (users/hashers.py)
+PASSWORD_HASHERS = [
+    'users.hashers.TunedPBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+PASSWORD_HASH_ITERATIONS = int(os.environ.get('PASSWORD_HASH_ITERATIONS', 1_000_000))  # Django 5.2 default
 
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
@@ -103,14 +205,44 @@ SIMPLE_JWT = {
 }
 
 REST_FRAMEWORK = {
+    # JWTAuthentication plus a short-lived per-process user cache (users/authentication.py)
     "DEFAULT_AUTHENTICATION_CLASSES": (
-        "rest_framework_simplejwt.authentication.JWTAuthentication",
+        "users.authentication.CachedJWTAuthentication",
     ),
     "DEFAULT_PERMISSION_CLASSES": (
         "rest_framework.permissions.IsAuthenticated",
     ),
+    # orjson-backed JSON when installed; plain DRF JSON otherwise
+    "DEFAULT_RENDERER_CLASSES": (
+        "users.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ),
+    "DEFAULT_PARSER_CLASSES": (
+        "users.parsers.FastJSONParser",
+        "rest_framework.parsers.FormParser",
+        "rest_framework.parsers.MultiPartParser",
+    ),
+    # Used by LoginView (users/throttles.py)
+    "DEFAULT_THROTTLE_RATES": {
+        "login_ip": os.environ.get('LOGIN_RATE_PER_IP', '30/min'),
+        "login_account": os.environ.get('LOGIN_RATE_PER_ACCOUNT', '10/min'),
+    },
 }
+FAST_JSON = os.environ.get('FAST_JSON', '1') == '1'  # set FAST_JSON=0 to force the stdlib encoder
 
 # Media files (user-uploaded content like songs)
 MEDIA_URL = '/media/'
-MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
\ No newline at end of file
+MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
+
+# Let the front-end server send streamed media: 'X-Accel-Redirect' (nginx, with an
+# `internal` location at MEDIA_OFFLOAD_PREFIX aliased to MEDIA_ROOT) or 'X-Sendfile'
+# (Apache mod_xsendfile / lighttpd). Empty = Django streams the file itself.
+MEDIA_OFFLOAD_HEADER = os.environ.get('MEDIA_OFFLOAD_HEADER', '')
+MEDIA_OFFLOAD_PREFIX = os.environ.get('MEDIA_OFFLOAD_PREFIX', '/protected-media/')
+
+# Profile picture uploads are streamed here and processed in the background
+UPLOAD_STAGING_DIR = os.environ.get('UPLOAD_STAGING_DIR', os.path.join(BASE_DIR, '.cache', 'uploads'))
+
+# Serve the hot read endpoints from users/async_views.py. asgi.py turns this
+# on; under WSGI the DRF views are used.
+ASYNC_READ_VIEWS = os.environ.get('ASYNC_READ_VIEWS', '0') == '1'
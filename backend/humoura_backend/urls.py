@@ -4,8 +4,11 @@ from django.views.generic import RedirectView
 from django.conf import settings
 from django.conf.urls.static import static
 
-# Import search view from users app
-from users.views import search_songs_artists_emotions
+# Import search view from users app (async twin under ASGI, see users/urls.py)
+if settings.ASYNC_READ_VIEWS:
+    from users.async_views import search_songs_artists_emotions
+else:
+    from users.views import search_songs_artists_emotions
 
 urlpatterns = [
     path('admin/', admin.site.urls),
@@ -14,3 +14,8 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'humoura_backend.settings')
 
 application = get_wsgi_application()
+
+# Build the in-memory song search index in the background at startup
+from users.search_index import song_index  # noqa: E402
+
+song_index.warm_async()
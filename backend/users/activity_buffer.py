@@ -0,0 +1,124 @@
+import atexit
+import logging
+import threading
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from . import tasks
+from .models import Playlist, PlaylistActivity, PlaylistChange
+
+logger = logging.getLogger(__name__)
+
+
+# ---------------- Playlist Open Buffer ---------------- #
+class PlaylistOpenBuffer:
+    """
+    Coalesces playlist opens per (user, playlist) in memory and writes them
+    in one upsert per flush. Readers merge pending_for_user() so responses stay
+    read-your-writes consistent before the flush lands.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._pending = {}   # (user_id, playlist_id) -> [open count delta, last opened]
+
+    def record(self, user_id, playlist_id, opened_at):
+        with self._lock:
+            entry = self._pending.get((user_id, playlist_id))
+            if entry is None:
+                self._pending[(user_id, playlist_id)] = [1, opened_at]
+            else:
+                entry[0] += 1
+                entry[1] = max(entry[1], opened_at)
+        tasks.schedule(
+            "flush_playlist_opens", self.flush, getattr(settings, "PLAYLIST_OPEN_FLUSH_INTERVAL", 2.0),
+        )
+
+    def pending_for_user(self, user_id):
+        """{playlist_id: (open count delta, last opened)} not yet written."""
+        with self._lock:
+            return {
+                playlist_id: (count, opened)
+                for (uid, playlist_id), (count, opened) in self._pending.items()
+                if uid == user_id
+            }
+
+    def apply_pending(self, user_id, activity):
+        """Fold this user's unflushed opens into a PlaylistActivity instance."""
+        delta = self.pending_for_user(user_id).get(activity.playlist_id)
+        if delta:
+            activity.open_count = (activity.open_count or 0) + delta[0]
+            activity.last_opened = max(filter(None, (activity.last_opened, delta[1])))
+        return activity
+
+    def _restore(self, batch):
+        with self._lock:
+            for key, (count, opened) in batch.items():
+                entry = self._pending.setdefault(key, [0, opened])
+                entry[0] += count
+                entry[1] = max(entry[1], opened)
+
+    def flush(self):
+        """Write every pending open; returns the number of rows upserted."""
+        with self._lock:
+            batch, self._pending = self._pending, {}
+        if not batch:
+            return 0
+        try:
+            return self._write(batch)
+        except Exception:
+            logger.exception("Flushing %d playlist opens failed; will retry", len(batch))
+            self._restore(batch)
+            tasks.schedule(
+                "flush_playlist_opens", self.flush, getattr(settings, "PLAYLIST_OPEN_FLUSH_INTERVAL", 2.0),
+            )
+            return 0
+
+    @staticmethod
+    def _write(batch):
+        from .changelog import record_changes
+
+        user_ids = {user_id for user_id, _ in batch}
+        playlist_ids = {playlist_id for _, playlist_id in batch}
+        with transaction.atomic():
+            # Opens of playlists deleted in the meantime are dropped.
+            owners = dict(Playlist.objects.filter(id__in=playlist_ids).values_list("id", "user_id"))
+            live = set(owners)
+            current = {
+                (a.user_id, a.playlist_id): a
+                for a in PlaylistActivity.objects.select_for_update()
+                .filter(user_id__in=user_ids, playlist_id__in=live)
+                .only("user_id", "playlist_id", "open_count", "last_opened")
+            }
+            rows = []
+            for (user_id, playlist_id), (count, opened) in batch.items():
+                if playlist_id not in live:
+                    continue
+                existing = current.get((user_id, playlist_id))
+                rows.append(PlaylistActivity(
+                    user_id=user_id,
+                    playlist_id=playlist_id,
+                    open_count=(existing.open_count if existing else 0) + count,
+                    last_opened=max(existing.last_opened, opened) if existing else opened,
+                ))
+            unique_fields = (
+                ["user", "playlist"] if connection.features.supports_update_conflicts_with_target else None
+            )
+            PlaylistActivity.objects.bulk_create(
+                rows,
+                update_conflicts=True,
+                unique_fields=unique_fields,
+                update_fields=["open_count", "last_opened"],
+            )
+            # Owners' own opens feed their playlist sync log
+            record_changes([
+                (row.user_id, row.playlist_id, PlaylistChange.OPENED, ())
+                for row in rows if owners[row.playlist_id] == row.user_id
+            ])
+        return len(rows)
+
+
+open_buffer = PlaylistOpenBuffer()
+# Don't lose the last few seconds of opens on a clean worker shutdown.
+atexit.register(open_buffer.flush)
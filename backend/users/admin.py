@@ -1,14 +1,38 @@
 # users/admin.py
 from django.contrib import admin
-from .models import Song, Playlist
+from .models import Song, Playlist, PlaylistSong
+from .ordering import append_songs, remove_songs
 
 @admin.register(Song)
 class SongAdmin(admin.ModelAdmin):
     list_display = ('title', 'artist', 'src', 'cover')  # ✅ added cover to display
     # Optional: add search or filter
     search_fields = ('title', 'artist')
+    # Filled in by audio analysis after the file is saved
+    readonly_fields = ('duration', 'sample_rate', 'bitrate', 'loudness_db')
+
+class PlaylistSongInline(admin.TabularInline):
+    model = PlaylistSong
+    extra = 0
+    autocomplete_fields = ('song',)
+    readonly_fields = ('rank',)  # order is kept by ordering.py; new rows are appended
 
 @admin.register(Playlist)
 class PlaylistAdmin(admin.ModelAdmin):
     list_display = ('name', 'user', 'created_at')
-    filter_horizontal = ('songs',)  # for easier many-to-many selection
\ No newline at end of file
+    inlines = (PlaylistSongInline,)
+
+    def save_formset(self, request, form, formset, change):
+        if formset.model is not PlaylistSong:
+            return super().save_formset(request, form, formset, change)
+        # Rows go through ordering.py so they get a rank after the last song
+        # and land in the owner's sync log; swapping a row's song is a
+        # removal plus an append.
+        entries = formset.save(commit=False)
+        changed = [entry for entry in entries if entry.pk]
+        previous = dict(PlaylistSong.objects.filter(pk__in=[entry.pk for entry in changed])
+                        .values_list("pk", "song_id"))
+        remove_songs(form.instance, [entry.song_id for entry in formset.deleted_objects]
+                     + [previous[entry.pk] for entry in changed if previous.get(entry.pk) != entry.song_id])
+        append_songs(form.instance, [entry.song_id for entry in entries
+                                     if not entry.pk or previous.get(entry.pk) != entry.song_id])
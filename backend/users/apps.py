@@ -4,3 +4,15 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from django.conf import settings
+
+        from . import signals  # noqa: F401  (connects Song change receivers)
+        from .cache import require_shared_catalog_cache
+
+        # Catalog invalidation, the search index and recommender features all
+        # follow the catalog version: refuse to start workers that can't share it
+        workers = getattr(settings, "WEB_CONCURRENCY", 1)
+        if workers > 1:
+            require_shared_catalog_cache(f"WEB_CONCURRENCY={workers}")
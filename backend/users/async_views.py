@@ -0,0 +1,189 @@
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.models import AnonymousUser
+from django.db.models import aprefetch_related_objects
+from django.views.decorators.csrf import csrf_exempt
+from rest_framework import status
+from rest_framework.exceptions import APIException, NotAuthenticated
+
+from .activity_buffer import open_buffer
+from .authentication import CachedJWTAuthentication, aget_profile
+from .cache import acatalog_version, async_cached_catalog_view
+from .catalog import acatalog_response
+from .encoders import SongEncoder, asong_rows
+from .listening import recommendation_stats
+from .models import Playlist, PlaylistActivity, Song
+from .ordering import ordered_songs
+from .recommender import engine
+from .renderers import JSONResponse
+from .routers import read_from_replica
+from .search_index import search_catalog, song_index
+from .views import (
+    playlist_list_options, playlist_summaries, playlist_summary_entries, ranked_activities,
+    recommendation_options, serialize_playlist, songs_matching, split_recent_frequent,
+)
+
+# ---------------- Async Read Endpoints ---------------- #
+# Async-native twins of the hot read views, mounted instead of them when
+# ASYNC_READ_VIEWS is on (asgi.py turns it on). DRF views are sync-only, so
+# under ASGI each of them holds a thread for the whole request; these stay
+# on the event loop and only touch the DB through the async ORM. Bodies,
+# status codes and error payloads match the DRF views.
+_auth = CachedJWTAuthentication()
+
+
+def _error(exc):
+    response = JSONResponse({"detail": exc.detail}, status=exc.status_code)
+    if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+        response["WWW-Authenticate"] = _auth.authenticate_header(None)
+    return response
+
+
+def async_read_view(allow_any=False):
+    """GET-only async view with JWT authentication (IsAuthenticated unless allow_any)."""
+    def decorator(view):
+        @csrf_exempt
+        @wraps(view)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ("GET", "HEAD", "OPTIONS"):
+                response = JSONResponse(
+                    {"detail": f'Method "{request.method}" not allowed.'},
+                    status=status.HTTP_405_METHOD_NOT_ALLOWED,
+                )
+                response["Allow"] = "GET, HEAD, OPTIONS"
+                return response
+            try:
+                result = await _auth.aauthenticate(request)
+                if result is None and not allow_any:
+                    raise NotAuthenticated()
+            except APIException as exc:
+                return _error(exc)
+            request.user = result[0] if result else AnonymousUser()
+            return await view(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+# ---------------- Catalog ---------------- #
+@async_read_view()
+@read_from_replica
+@async_cached_catalog_view
+async def all_songs(request):
+    return await acatalog_response(request, Song.objects.all())
+
+
+@async_read_view(allow_any=True)
+@read_from_replica
+@async_cached_catalog_view
+async def public_songs(request):
+    return await acatalog_response(request, Song.objects.all())
+
+
+# ---------------- Search ---------------- #
+@async_read_view()
+@read_from_replica
+async def search_songs_artists_emotions(request):
+    query = request.GET.get("q", "").strip()
+    if not query:
+        return JSONResponse({"songs": [], "artists": [], "emotions": [], "languages": []})
+
+    if song_index.ready and song_index.version == await acatalog_version():
+        result = song_index.search(query)
+        by_id = {song.id: song async for song in Song.objects.filter(id__in=result["song_ids"])}
+        songs = [by_id[song_id] for song_id in result["song_ids"] if song_id in by_id]
+        artists, emotions, languages = result["artists"], result["emotions"], result["languages"]
+    else:
+        # Cold or stale index: the sync path starts the rebuild and falls back to the DB
+        songs, artists, emotions, languages = await sync_to_async(search_catalog)(query)
+
+    return JSONResponse({
+        "songs": SongEncoder(request).encode_many(songs),
+        "artists": artists,
+        "emotions": emotions,
+        "languages": languages,
+    })
+
+
+# ---------------- Tile Click Endpoints ---------------- #
+def _tile_view(field):
+    @async_read_view()
+    @read_from_replica
+    @async_cached_catalog_view
+    async def view(request, **kwargs):
+        value = kwargs[f"{field}_name"]
+        rows = await asong_rows(songs_matching(field, value))
+        return JSONResponse({field: value, "songs": SongEncoder(request).encode_many(rows)})
+    view.__name__ = view.__qualname__ = f"songs_by_{field}"
+    return view
+
+
+songs_by_artist = _tile_view("artist")
+songs_by_emotion = _tile_view("emotion")
+songs_by_language = _tile_view("language")
+
+
+# ---------------- Recommendations ---------------- #
+@async_read_view()
+async def recommended_songs(request):
+    try:
+        options = recommendation_options(request.GET)
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    profile = await aget_profile(request.user)
+    version = await acatalog_version()
+    features = engine.current(version) or await sync_to_async(engine.features)(version)
+    # Recency-weighted: plays fade with PLAYS_HALF_LIFE_DAYS (see listening.py)
+    top_ids = engine.recommend(
+        *recommendation_stats(profile),
+        last_played_language=getattr(profile, "last_played_language", None),
+        features=features,
+        **options,
+    )
+    by_id = await Song.objects.ain_bulk(top_ids)
+    top_songs = [by_id[song_id] for song_id in top_ids if song_id in by_id]
+    return JSONResponse(SongEncoder(request).tracks(top_songs))
+
+
+# ---------------- Recent & Frequent Playlists ---------------- #
+async def aactivities_with_pending(user, activities, pending):
+    """views.activities_with_pending() for async views."""
+    rows = {activity.playlist_id: activity async for activity in activities}
+    missing = [playlist_id for playlist_id in pending if playlist_id not in rows]
+    if missing:
+        async for playlist in Playlist.objects.filter(id__in=missing):
+            rows[playlist.id] = PlaylistActivity(user=user, playlist=playlist, open_count=0, last_opened=None)
+    for activity in rows.values():
+        open_buffer.apply_pending(user.id, activity)
+    return rows
+
+
+async def aserialize_playlists_for(request, activities, summary, covers):
+    """views.serialize_playlists_for() for async views."""
+    encoder = SongEncoder(request)
+    if summary:
+        playlist_ids = [a.playlist_id for a in activities]
+        entries = [row async for row in playlist_summary_entries(playlist_ids, covers)]
+        summaries = playlist_summaries(playlist_ids, covers, entries)
+        return [serialize_playlist(request, a, encoder, summaries[a.playlist_id]) for a in activities]
+    await aprefetch_related_objects([a.playlist for a in activities], ordered_songs())
+    return [serialize_playlist(request, a, encoder) for a in activities]
+
+
+@async_read_view()
+async def recent_playlists(request):
+    try:
+        summary, covers = playlist_list_options(request.GET)
+    except ValueError as exc:
+        return JSONResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    user = request.user
+    pending = open_buffer.pending_for_user(user.id)
+    rows = await aactivities_with_pending(user, ranked_activities(user, pending), pending)
+    recent, frequent = split_recent_frequent(list(rows.values()))
+
+    payload = await aserialize_playlists_for(request, recent + frequent, summary, covers)
+    return JSONResponse({
+        "recent_playlists": payload[:len(recent)],
+        "frequent_playlists": payload[len(recent):],
+    })
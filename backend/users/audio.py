@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import shutil
+import struct
+import subprocess
+import tempfile
+import threading
+import wave
+
+import numpy as np
+from django.db import transaction
+
+from . import tasks
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Audio Analysis ---------------- #
+# Precomputes what players need before downloading a track: duration,
+# sample rate, average bitrate, RMS loudness (dBFS) and a waveform of
+# WAVEFORM_POINTS peak values stored as one byte each. Decoding is
+# streamed block by block so a long track never sits in memory:
+# - WAV is decoded in-process with `wave` + NumPy;
+# - anything else is piped through ffmpeg as mono PCM when it is installed;
+# - MP3 without ffmpeg falls back to parsing frame headers (duration,
+#   sample rate and bitrate only).
+# The functions here take plain paths and touch no models, so they can run
+# in ProcessPoolExecutor workers.
+WAVEFORM_POINTS = 256
+PEAK_WINDOW = 1024          # samples per raw peak before downsampling
+DECODE_BLOCK_FRAMES = 65536
+FFMPEG_SAMPLE_RATE = 22050
+SILENCE_DB = -96.0
+FFMPEG_TIMEOUT = 600        # wall-clock seconds before a stuck decode is killed
+
+
+class AudioAnalysisError(Exception):
+    pass
+
+
+class _Accumulator:
+    """Running sum of squares and per-window peaks over mono float blocks."""
+
+    def __init__(self, window=PEAK_WINDOW):
+        self.window = window
+        self.count = 0
+        self.sum_squares = 0.0
+        self.peaks = []
+        self._carry = np.empty(0, dtype=np.float32)
+
+    def add(self, block):
+        self.count += len(block)
+        self.sum_squares += float(np.dot(block, block))
+        block = np.concatenate((self._carry, np.abs(block)))
+        whole = len(block) - len(block) % self.window
+        if whole:
+            self.peaks.append(block[:whole].reshape(-1, self.window).max(axis=1))
+        self._carry = block[whole:]
+
+    def result(self):
+        if len(self._carry):
+            self.peaks.append(np.array([self._carry.max()], dtype=np.float32))
+        peaks = np.concatenate(self.peaks) if self.peaks else np.zeros(1, dtype=np.float32)
+        rms = np.sqrt(self.sum_squares / self.count) if self.count else 0.0
+        loudness = max(20 * np.log10(rms), SILENCE_DB) if rms > 0 else SILENCE_DB
+        return round(float(loudness), 2), waveform_bytes(peaks)
+
+
+def waveform_bytes(peaks, points=WAVEFORM_POINTS):
+    """Resample peak magnitudes (0..1) to `points` buckets, one uint8 each."""
+    edges = (np.arange(points) * len(peaks)) // points
+    if len(peaks) >= points:
+        peaks = np.maximum.reduceat(peaks, edges)
+    else:
+        peaks = peaks[edges]   # very short clips: repeat the nearest peak
+    return np.clip(np.rint(peaks * 255), 0, 255).astype(np.uint8).tobytes()
+
+
+def waveform_peaks(data):
+    """Stored waveform bytes back to a list of 0..1 floats."""
+    if not data:
+        return []
+    return [round(v / 255, 3) for v in bytes(data)]
+
+
+def _pcm_to_float(raw, width):
+    if width == 1:
+        return (np.frombuffer(raw, dtype=np.uint8).astype(np.float32) - 128) / 128
+    if width == 2:
+        return np.frombuffer(raw, dtype="<i2").astype(np.float32) / 32768
+    if width == 3:
+        b = np.frombuffer(raw, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        values = b[:, 0] | (b[:, 1] << 8) | (b[:, 2] << 16)
+        values = np.where(values & 0x800000, values - 0x1000000, values)
+        return values.astype(np.float32) / 8388608
+    if width == 4:
+        return np.frombuffer(raw, dtype="<i4").astype(np.float32) / 2147483648
+    raise AudioAnalysisError(f"Unsupported WAV sample width {width}")
+
+
+def _analyze_wav(path):
+    try:
+        reader = wave.open(path, "rb")
+    except (wave.Error, EOFError) as exc:
+        raise AudioAnalysisError(str(exc)) from exc
+    with reader:
+        channels, width, rate = reader.getnchannels(), reader.getsampwidth(), reader.getframerate()
+        # The length is known up front, so size windows for ~4 raw peaks per point.
+        acc = _Accumulator(min(PEAK_WINDOW, max(1, reader.getnframes() // (WAVEFORM_POINTS * 4))))
+        while True:
+            raw = reader.readframes(DECODE_BLOCK_FRAMES)
+            if not raw:
+                break
+            samples = _pcm_to_float(raw, width)
+            acc.add(samples.reshape(-1, channels).mean(axis=1) if channels > 1 else samples)
+    loudness, waveform = acc.result()
+    return {"duration": acc.count / rate if rate else 0.0, "sample_rate": rate,
+            "loudness_db": loudness, "waveform": waveform}
+
+
+def _ffprobe_sample_rate(path):
+    if not shutil.which("ffprobe"):
+        return None
+    try:
+        out = subprocess.run(
+            ["ffprobe", "-v", "error", "-select_streams", "a:0", "-show_entries", "stream=sample_rate",
+             "-of", "json", path],
+            capture_output=True, check=True, timeout=60,
+        ).stdout
+        return int(json.loads(out)["streams"][0]["sample_rate"])
+    except (subprocess.SubprocessError, OSError, KeyError, IndexError, ValueError):
+        return None
+
+
+def _analyze_ffmpeg(path):
+    # stderr goes to a temp file: a pipe only read after stdout EOF fills up on
+    # a noisy corrupt input and blocks ffmpeg (and this worker) forever. A timer
+    # kills ffmpeg once the wall-clock budget is spent, which ends the read loop.
+    timed_out = threading.Event()
+
+    def kill():
+        timed_out.set()
+        process.kill()
+
+    with tempfile.TemporaryFile() as stderr:
+        process = subprocess.Popen(
+            ["ffmpeg", "-v", "error", "-nostdin", "-i", path, "-f", "s16le", "-ac", "1",
+             "-ar", str(FFMPEG_SAMPLE_RATE), "-"],
+            stdout=subprocess.PIPE, stderr=stderr,
+        )
+        timer = threading.Timer(FFMPEG_TIMEOUT, kill)
+        timer.start()
+        acc = _Accumulator()
+        pending = b""
+        try:
+            with process:
+                while True:
+                    chunk = process.stdout.read(DECODE_BLOCK_FRAMES * 2)
+                    if not chunk:
+                        break
+                    chunk = pending + chunk
+                    usable = len(chunk) - len(chunk) % 2
+                    acc.add(_pcm_to_float(chunk[:usable], 2))
+                    pending = chunk[usable:]
+        finally:
+            timer.cancel()
+        stderr.seek(0)
+        error = stderr.read().decode(errors="replace").strip()
+    if timed_out.is_set():
+        raise AudioAnalysisError(f"ffmpeg did not finish within {timer.interval:g}s")
+    if process.returncode or not acc.count:
+        raise AudioAnalysisError(error or "ffmpeg produced no audio")
+    loudness, waveform = acc.result()
+    return {"duration": acc.count / FFMPEG_SAMPLE_RATE, "sample_rate": _ffprobe_sample_rate(path),
+            "loudness_db": loudness, "waveform": waveform}
+
+
+# MPEG audio frame header tables: [version][layer] -> kbps by index
+_MPEG_BITRATES = {
+    (1, 1): (0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448),
+    (1, 2): (0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384),
+    (1, 3): (0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320),
+    (2, 1): (0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256),
+    (2, 2): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+    (2, 3): (0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160),
+}
+_MPEG_RATES = {1: (44100, 48000, 32000), 2: (22050, 24000, 16000), 25: (11025, 12000, 8000)}
+
+
+def _analyze_mp3_headers(path):
+    """Duration / sample rate from the first frame (Xing/Info frame count for VBR)."""
+    size = os.path.getsize(path)
+    with open(path, "rb") as fh:
+        head = fh.read(min(size, 1 << 20))
+    offset = 0
+    if head[:3] == b"ID3" and len(head) >= 10:
+        offset = 10 + ((head[6] << 21) | (head[7] << 14) | (head[8] << 7) | head[9])
+    while offset + 4 <= len(head):
+        if head[offset] == 0xFF and head[offset + 1] & 0xE0 == 0xE0:
+            b1, b2, b3 = head[offset + 1], head[offset + 2], head[offset + 3]
+            version = {3: 1, 2: 2, 0: 25}.get((b1 >> 3) & 3)
+            layer = {3: 1, 2: 2, 1: 3}.get((b1 >> 1) & 3)
+            bitrate_index, rate_index = b2 >> 4, (b2 >> 2) & 3
+            if version and layer and 0 < bitrate_index < 15 and rate_index < 3:
+                break
+        offset += 1
+    else:
+        raise AudioAnalysisError("No MPEG audio frame found")
+
+    table_version = 1 if version == 1 else 2
+    bitrate = _MPEG_BITRATES[(table_version, layer)][bitrate_index]
+    rate = _MPEG_RATES[version][rate_index]
+    samples_per_frame = 384 if layer == 1 else (1152 if layer == 2 or version == 1 else 576)
+    mono = (b3 >> 6) == 3
+    side_info = (17 if mono else 32) if version == 1 else (9 if mono else 17)
+    xing = offset + 4 + side_info
+    if head[xing:xing + 4] in (b"Xing", b"Info") and struct.unpack(">I", head[xing + 4:xing + 8])[0] & 1:
+        frames = struct.unpack(">I", head[xing + 8:xing + 12])[0]
+        duration = frames * samples_per_frame / rate
+    else:
+        audio_bytes = size - offset - (128 if size >= 128 else 0)
+        duration = audio_bytes * 8 / (bitrate * 1000)
+    return {"duration": duration, "sample_rate": rate, "loudness_db": None, "waveform": None}
+
+
+def analyze_file(path):
+    """
+    Analyze one audio file. Returns a dict with duration (s), sample_rate (Hz),
+    bitrate (kbps, file average), loudness_db and waveform (bytes) – the last
+    two are None when only headers could be read.
+    """
+    if not os.path.isfile(path):
+        raise AudioAnalysisError(f"{path} does not exist")
+    ext = os.path.splitext(path)[1].lower()
+    if ext in (".wav", ".wave"):
+        result = _analyze_wav(path)
+    elif shutil.which("ffmpeg"):
+        result = _analyze_ffmpeg(path)
+    elif ext in (".mp3", ".mp2", ".mpga"):
+        result = _analyze_mp3_headers(path)
+    else:
+        raise AudioAnalysisError(f"Cannot decode {ext or 'file'} without ffmpeg")
+    duration = result["duration"]
+    result["duration"] = round(duration, 3)
+    result["bitrate"] = round(os.path.getsize(path) * 8 / duration / 1000) if duration else None
+    return result
+
+
+# ---------------- Storing Results ---------------- #
+# Model (and catalog cache) imports stay inside these functions: process-pool
+# workers import this module for analyze_file() without setting Django up.
+ANALYSIS_FIELDS = ("duration", "sample_rate", "bitrate", "loudness_db", "waveform")
+
+
+def analyze_path(job):
+    """Process-pool entry point: (song_id, src_name, path) -> (song_id, src_name, result, error)."""
+    song_id, src_name, path = job
+    try:
+        return song_id, src_name, analyze_file(path), None
+    except (AudioAnalysisError, OSError) as exc:
+        return song_id, src_name, None, str(exc)
+
+
+def store_analysis(song_id, src_name, result, bump=True):
+    """Save an analysis unless the song's file changed in the meantime."""
+    from .cache import bump_catalog_version
+    from .models import Song
+
+    # .update() skips post_save, so saving results doesn't queue another analysis.
+    updated = Song.objects.filter(id=song_id, src=src_name).update(
+        analyzed_src=src_name, **{field: result[field] for field in ANALYSIS_FIELDS},
+    )
+    if updated and bump:
+        bump_catalog_version()
+    return bool(updated)
+
+
+def analyze_song(song_id):
+    """Analyze one Song's audio file in the current process and store the result."""
+    from .models import Song
+
+    src_name = Song.objects.filter(id=song_id).values_list("src", flat=True).first()
+    if not src_name:
+        return False
+    storage = Song._meta.get_field("src").storage
+    try:
+        result = analyze_file(storage.path(src_name))
+    except (AudioAnalysisError, OSError, NotImplementedError):
+        logger.warning("Audio analysis failed for song %s (%s)", song_id, src_name, exc_info=True)
+        return False
+    return store_analysis(song_id, src_name, result)
+
+
+def needs_analysis(song):
+    return bool(song.src) and song.analyzed_src != song.src.name
+
+
+def queue_analysis(song):
+    """Analyze a saved song's file on the worker pool if it changed since the last run."""
+    if needs_analysis(song):
+        transaction.on_commit(lambda: tasks.submit(analyze_song, song.id))
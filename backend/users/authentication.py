@@ -0,0 +1,218 @@
+import copy
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core import signing
+from rest_framework.authentication import BaseAuthentication
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings as jwt_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import UserProfile
+
+
+# ---------------- Per-process Object Cache ---------------- #
+class TTLCache:
+    """Small thread-safe LRU whose entries also expire after `ttl` seconds."""
+
+    def __init__(self, maxsize, ttl):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                return None
+            expires, value = entry
+            if expires < time.monotonic():
+                del self._data[key]
+                return None
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic() + self.ttl, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def pop(self, *keys):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+
+# Entries hold plain field values; every hit builds a fresh instance, so a
+# view mutating request.user or a profile can't leak into other requests.
+user_cache = TTLCache(getattr(settings, "AUTH_CACHE_SIZE", 10000), getattr(settings, "AUTH_CACHE_TTL", 60))
+profile_cache = TTLCache(getattr(settings, "AUTH_CACHE_SIZE", 10000), getattr(settings, "AUTH_CACHE_TTL", 60))
+
+_USER_FIELDS = tuple(f.attname for f in User._meta.concrete_fields)
+_PROFILE_FIELDS = tuple(f.attname for f in UserProfile._meta.concrete_fields)
+
+
+def _snapshot(instance, fields):
+    return tuple(getattr(instance, name) for name in fields)
+
+
+def _restore(model, fields, values):
+    return model.from_db(None, fields, copy.deepcopy(values))
+
+
+def get_profile(user, refresh=False):
+    """The user's UserProfile (created if missing), served from the profile cache."""
+    values = None if refresh else profile_cache.get(user.pk)
+    if values is not None:
+        return _restore(UserProfile, _PROFILE_FIELDS, values)
+    profile, _ = UserProfile.objects.get_or_create(user=user)
+    profile_cache.set(user.pk, _snapshot(profile, _PROFILE_FIELDS))
+    return profile
+
+
+async def aget_profile(user):
+    """get_profile() for async views."""
+    values = profile_cache.get(user.pk)
+    if values is not None:
+        return _restore(UserProfile, _PROFILE_FIELDS, values)
+    profile, _ = await UserProfile.objects.aget_or_create(user=user)
+    profile_cache.set(user.pk, _snapshot(profile, _PROFILE_FIELDS))
+    return profile
+
+
+def invalidate_user(user_id):
+    """Drop a user (and their profile) from the caches after it changed."""
+    user_cache.pop(str(user_id))
+    profile_cache.pop(user_id)
+
+
+def invalidate_profiles(*user_ids):
+    """For writes that skip signals (QuerySet.update / bulk_update)."""
+    profile_cache.pop(*user_ids)
+
+
+# ---------------- Authentication ---------------- #
+class CachedJWTAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that trusts a validly signed token for up to
+    AUTH_CACHE_TTL seconds instead of loading the User on every request.
+    User saves/deletes in this process invalidate the entry immediately
+    (see signals.py); changes made elsewhere apply once the entry expires.
+    """
+
+    def get_user(self, validated_token):
+        user_id = self._user_id(validated_token)
+        user = self._cached_user(user_id, validated_token)
+        if user is None:
+            user = super().get_user(validated_token)
+            user_cache.set(user_id, _snapshot(user, _USER_FIELDS))
+        return user
+
+    async def aauthenticate(self, request):
+        """authenticate() for async views: same checks, async ORM on a cache miss."""
+        header = self.get_header(request)
+        if header is None:
+            return None
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+        validated_token = self.get_validated_token(raw_token)
+        user_id = self._user_id(validated_token)
+        user = self._cached_user(user_id, validated_token)
+        if user is None:
+            try:
+                user = await User.objects.aget(**{jwt_settings.USER_ID_FIELD: user_id})
+            except User.DoesNotExist:
+                raise AuthenticationFailed("User not found", code="user_not_found")
+            if jwt_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+                raise AuthenticationFailed("User is inactive", code="user_inactive")
+            self._check_revoked(user, validated_token)
+            user_cache.set(user_id, _snapshot(user, _USER_FIELDS))
+        return user, validated_token
+
+    @staticmethod
+    def _user_id(validated_token):
+        try:
+            user_id = validated_token[jwt_settings.USER_ID_CLAIM]
+        except KeyError:
+            raise InvalidToken("Token contained no recognizable user identification")
+        return str(user_id)   # the claim may be a str or an int depending on the issuer
+
+    @staticmethod
+    def _check_revoked(user, validated_token):
+        if jwt_settings.CHECK_REVOKE_TOKEN and validated_token.get(
+            jwt_settings.REVOKE_TOKEN_CLAIM
+        ) != get_md5_hash_password(user.password):
+            raise AuthenticationFailed("The user's password has been changed.", code="password_changed")
+
+    def _cached_user(self, user_id, validated_token):
+        values = user_cache.get(user_id)
+        if values is None:
+            return None
+        user = _restore(User, _USER_FIELDS, values)
+        self._check_revoked(user, validated_token)
+        return user
+
+
+# ---------------- Stream URL Tokens ---------------- #
+# <audio src> elements can't send an Authorization header, so stream URLs
+# carry a short-lived token signed for one user and one song instead of the
+# access token itself (which would otherwise end up in logs and history).
+STREAM_TOKEN_SALT = "users.stream"
+
+
+def stream_token_max_age():
+    return getattr(settings, "STREAM_TOKEN_MAX_AGE", 300)
+
+
+def make_stream_token(user, song_id):
+    """Signed, timestamped ?token= value for streaming one song as `user`."""
+    return signing.TimestampSigner(salt=STREAM_TOKEN_SALT).sign(f"{user.pk}:{song_id}")
+
+
+class StreamTokenAuthentication(BaseAuthentication):
+    """
+    Accepts ?token= minted by make_stream_token() for the song in the URL.
+    Tokens expire after STREAM_TOKEN_MAX_AGE seconds and are useless for
+    any other song or endpoint.
+    """
+
+    def authenticate(self, request):
+        token = request.query_params.get("token")
+        if not token:
+            return None
+        try:
+            value = signing.TimestampSigner(salt=STREAM_TOKEN_SALT).unsign(token, max_age=stream_token_max_age())
+        except signing.SignatureExpired:
+            raise AuthenticationFailed("Stream token has expired", code="token_expired")
+        except signing.BadSignature:
+            raise AuthenticationFailed("Invalid stream token", code="token_not_valid")
+        user_id, _, song_id = value.partition(":")
+        if song_id != str(request.parser_context["kwargs"].get("song_id")):
+            raise AuthenticationFailed("Stream token is for another song", code="token_not_valid")
+        return self._get_user(user_id), None
+
+    @staticmethod
+    def _get_user(user_id):
+        values = user_cache.get(user_id)
+        if values is not None:
+            return _restore(User, _USER_FIELDS, values)
+        try:
+            user = User.objects.get(pk=user_id)
+        except User.DoesNotExist:
+            raise AuthenticationFailed("User not found", code="user_not_found")
+        if not user.is_active:
+            raise AuthenticationFailed("User is inactive", code="user_inactive")
+        user_cache.set(user_id, _snapshot(user, _USER_FIELDS))
+        return user
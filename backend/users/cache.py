@@ -0,0 +1,195 @@
+import hashlib
+import os
+import time
+from contextlib import contextmanager
+from functools import wraps
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.filebased import FileBasedCache
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponseNotModified
+from django.utils.cache import patch_cache_control
+from rest_framework import status
+from rest_framework.response import Response
+
+from .renderers import JSONResponse
+from .routers import primary_reads, replica_in_use
+
+try:
+    import fcntl
+except ImportError:  # Windows: no multi-worker servers there, so no lock needed
+    fcntl = None
+
+# ---------------- Catalog Response Cache ---------------- #
+# Every cached catalog response is keyed by a global "catalog version".
+# Song post_save/post_delete signals bump the version (see signals.py), so
+# stale entries are never read again and simply age out of the backend.
+# The version only reaches other processes through a shared backend (file
+# or redis); a locmem catalog cache is for single-process servers. Bumps
+# must be atomic across processes: redis and locmem incr() are, the file
+# backend's is a read-modify-write, so bumps there hold a file lock.
+# A replica may lag the write behind a bump, so for REPLICA_LAG_SECONDS after
+# one, cache misses in read_from_replica() views read the primary and are not
+# stored: replica rows from before the write never land under the new version.
+VERSION_KEY = "catalog:version"
+BUMPED_AT_KEY = "catalog:bumped_at"
+VERSION_LOCK_FILE = "catalog-version.lock"   # not *.djcache: clear()/culling leave it alone
+
+
+def get_catalog_cache():
+    return caches[getattr(settings, "CATALOG_CACHE_ALIAS", "default")]
+
+
+def catalog_cache_is_shared():
+    return not isinstance(get_catalog_cache(), LocMemCache)
+
+
+def require_shared_catalog_cache(reason):
+    """Raise ImproperlyConfigured when catalog version bumps would stay in this process."""
+    if not catalog_cache_is_shared():
+        raise ImproperlyConfigured(
+            f"{reason} needs a catalog cache shared between processes, otherwise catalog "
+            "changes are invisible to other workers; set CATALOG_CACHE_BACKEND=file or redis."
+        )
+
+
+def catalog_version():
+    """Current catalog version; seeded from the clock if the backend lost it."""
+    cache = get_catalog_cache()
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns() // 1000, None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+async def acatalog_version():
+    """catalog_version() for async views."""
+    cache = get_catalog_cache()
+    version = await cache.aget(VERSION_KEY)
+    if version is None:
+        await cache.aadd(VERSION_KEY, time.time_ns() // 1000, None)
+        version = await cache.aget(VERSION_KEY)
+    return version
+
+
+@contextmanager
+def _version_lock(cache):
+    """Serialize version bumps between processes sharing a file-based cache."""
+    if fcntl is None or not isinstance(cache, FileBasedCache):
+        yield
+        return
+    os.makedirs(cache._dir, exist_ok=True)
+    with open(os.path.join(cache._dir, VERSION_LOCK_FILE), "a") as fh:
+        fcntl.flock(fh, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(fh, fcntl.LOCK_UN)
+
+
+def bump_catalog_version():
+    """Invalidate every cached catalog response."""
+    cache = get_catalog_cache()
+    with _version_lock(cache):
+        try:
+            version = cache.incr(VERSION_KEY)
+        except ValueError:
+            # Key was evicted: start again from the clock so old keys can't collide.
+            version = time.time_ns() // 1000
+            cache.set(VERSION_KEY, version, None)
+        cache.set(BUMPED_AT_KEY, time.time(), None)
+        return version
+
+
+def _replica_may_lag(bumped_at):
+    """True while a replica read could predate the last bump's write."""
+    return (replica_in_use() and bumped_at is not None
+            and time.time() - bumped_at < getattr(settings, "REPLICA_LAG_SECONDS", 5))
+
+
+def etag_matches(request, etag, header="If-None-Match"):
+    header = request.headers.get(header)
+    if not header:
+        return False
+    candidates = [tag.strip() for tag in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+
+def _uncached(response):
+    # No ETag either: the primary may not have committed the write yet.
+    patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def cached_catalog_view(view):
+    """
+    Cache a read-only catalog view's Response.data per catalog version and URL.
+    Adds an ETag and answers matching If-None-Match requests with 304
+    before the view (or the cache) is touched.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        version = catalog_version()
+        digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        etag = f'"{version}-{digest[:16]}"'
+
+        if etag_matches(request, etag):
+            response = Response(status=status.HTTP_304_NOT_MODIFIED)
+        else:
+            cache = get_catalog_cache()
+            key = f"catalog:{version}:{digest}"
+            data = cache.get(key)
+            if data is not None:
+                response = Response(data)
+            elif _replica_may_lag(cache.get(BUMPED_AT_KEY)):
+                with primary_reads():
+                    response = view(request, *args, **kwargs)
+                return _uncached(response)
+            else:
+                response = view(request, *args, **kwargs)
+                # Streams, errors etc. pass through untouched.
+                if not isinstance(response, Response) or response.status_code != status.HTTP_200_OK:
+                    return response
+                cache.set(key, response.data, getattr(settings, "CATALOG_CACHE_TIMEOUT", None))
+
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
+
+
+def async_cached_catalog_view(view):
+    """cached_catalog_view() for async views returning JSONResponse; shares its cache entries."""
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        version = await acatalog_version()
+        digest = hashlib.sha1(request.build_absolute_uri().encode()).hexdigest()
+        etag = f'"{version}-{digest[:16]}"'
+
+        if etag_matches(request, etag):
+            response = HttpResponseNotModified()
+        else:
+            cache = get_catalog_cache()
+            key = f"catalog:{version}:{digest}"
+            data = await cache.aget(key)
+            if data is not None:
+                response = JSONResponse(data)
+            elif _replica_may_lag(await cache.aget(BUMPED_AT_KEY)):
+                with primary_reads():
+                    response = await view(request, *args, **kwargs)
+                return _uncached(response)
+            else:
+                response = await view(request, *args, **kwargs)
+                if not isinstance(response, JSONResponse) or response.status_code != status.HTTP_200_OK:
+                    return response
+                await cache.aset(key, response.data, getattr(settings, "CATALOG_CACHE_TIMEOUT", None))
+
+        response["ETag"] = etag
+        patch_cache_control(response, private=True, no_cache=True)
+        return response
+
+    return wrapper
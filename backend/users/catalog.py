@@ -0,0 +1,208 @@
+import base64
+import binascii
+
+from django.http import StreamingHttpResponse
+from rest_framework import status
+from rest_framework.response import Response
+
+from .encoders import SERIALIZER_FIELDS, SONG_ROW_FIELDS, SongEncoder, SongRow, asong_rows, song_rows
+from .renderers import JSONResponse, dumps
+
+# ---------------- Catalog Paging & Streaming ---------------- #
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 500
+STREAM_CHUNK_SIZE = 500
+STREAM_FORMATS = ("ndjson", "json")
+
+
+class CatalogQueryError(ValueError):
+    """Raised when ?cursor=, ?limit=, ?fields= or ?stream= is invalid."""
+
+
+def encode_cursor(song_id):
+    """Opaque cursor pointing just after the given song id."""
+    return base64.urlsafe_b64encode(str(song_id).encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor):
+    padded = cursor + "=" * (-len(cursor) % 4)
+    try:
+        return int(base64.urlsafe_b64decode(padded.encode()).decode())
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise CatalogQueryError("Invalid cursor")
+
+
+def parse_limit(raw):
+    if raw in (None, ""):
+        return DEFAULT_PAGE_SIZE
+    try:
+        limit = int(raw)
+    except ValueError:
+        raise CatalogQueryError("limit must be an integer")
+    if limit < 1:
+        raise CatalogQueryError("limit must be positive")
+    return min(limit, MAX_PAGE_SIZE)
+
+
+def parse_fields(raw):
+    """Turn ?fields=id,title into a tuple of output fields (default: all)."""
+    if not raw:
+        return SERIALIZER_FIELDS
+    fields = tuple(dict.fromkeys(f.strip() for f in raw.split(",") if f.strip()))
+    unknown = [f for f in fields if f not in SERIALIZER_FIELDS]
+    if unknown:
+        raise CatalogQueryError(f"Unknown fields: {', '.join(unknown)}")
+    return fields or SERIALIZER_FIELDS
+
+
+def _encode_chunks(queryset, fields, encoder, chunk_size):
+    """Yield lists of encoded rows, one list per DB chunk."""
+    chunk = []
+    for values in queryset.values_list(*SONG_ROW_FIELDS).iterator(chunk_size=chunk_size):
+        chunk.append(SongRow(*values))
+        if len(chunk) >= chunk_size:
+            yield encoder.encode_many(chunk, fields)
+            chunk = []
+    if chunk:
+        yield encoder.encode_many(chunk, fields)
+
+
+def _stream_ndjson(queryset, fields, encoder, chunk_size):
+    for rows in _encode_chunks(queryset, fields, encoder, chunk_size):
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+def _stream_json_array(queryset, fields, encoder, chunk_size):
+    yield b"["
+    first = True
+    for rows in _encode_chunks(queryset, fields, encoder, chunk_size):
+        body = b",".join(dumps(row) for row in rows)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+
+def parse_catalog_query(params):
+    """(fields, stream, paginate, limit, after) from the query string; raises CatalogQueryError."""
+    fields = parse_fields(params.get("fields"))
+    stream = params.get("stream")
+    if stream and stream not in STREAM_FORMATS:
+        raise CatalogQueryError(f"stream must be one of: {', '.join(STREAM_FORMATS)}")
+    paginate = "limit" in params or "cursor" in params
+    limit = parse_limit(params.get("limit"))
+    after = decode_cursor(params["cursor"]) if params.get("cursor") else None
+    return fields, stream, paginate, limit, after
+
+
+def catalog_response(request, queryset, absolute_urls=False):
+    """
+    Serve a song queryset in one of three shapes:
+    - no params: the full list, exactly as before
+    - ?limit=&cursor=: a keyset page {"results": [...], "next_cursor": ...}
+    - ?stream=ndjson|json: rows streamed from the DB in chunks
+    ?fields=id,title,artist trims every row in all three modes.
+    Media URLs are relative unless absolute_urls is set.
+    """
+    encoder = SongEncoder(request if absolute_urls else None)
+    try:
+        fields, stream, paginate, limit, after = parse_catalog_query(request.query_params)
+    except CatalogQueryError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = queryset.order_by("id")
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    if stream:
+        # Pin the DB now: the body is read after the view (and its routing) returns
+        queryset = queryset.using(queryset.db)
+        if paginate:
+            queryset = queryset[:limit]
+        if stream == "ndjson":
+            body, content_type = _stream_ndjson, "application/x-ndjson"
+        else:
+            body, content_type = _stream_json_array, "application/json"
+        return StreamingHttpResponse(
+            body(queryset, fields, encoder, STREAM_CHUNK_SIZE),
+            content_type=content_type,
+        )
+
+    if not paginate:
+        return Response(encoder.encode_many(song_rows(queryset), fields))
+
+    page = list(song_rows(queryset[:limit + 1]))
+    has_more = len(page) > limit
+    page = page[:limit]
+    return Response({
+        "results": encoder.encode_many(page, fields),
+        "next_cursor": encode_cursor(page[-1].id) if has_more else None,
+    })
+
+
+# ---------------- Async Variant ---------------- #
+# Same three shapes for users/async_views.py, read with the async ORM.
+# Streams page by id instead of using values_list().aiterator(), which runs
+# its query on the event loop thread and fails there.
+async def _aencode_chunks(queryset, fields, encoder, chunk_size, limit=None):
+    after = None
+    while limit is None or limit > 0:
+        size = chunk_size if limit is None else min(chunk_size, limit)
+        page = queryset if after is None else queryset.filter(id__gt=after)
+        rows = await asong_rows(page[:size])
+        if rows:
+            yield encoder.encode_many(rows, fields)
+        if len(rows) < size:
+            return
+        after = rows[-1].id
+        if limit is not None:
+            limit -= len(rows)
+
+
+async def _astream_ndjson(chunks):
+    async for rows in chunks:
+        yield b"".join(dumps(row) + b"\n" for row in rows)
+
+
+async def _astream_json_array(chunks):
+    yield b"["
+    first = True
+    async for rows in chunks:
+        body = b",".join(dumps(row) for row in rows)
+        yield body if first else b"," + body
+        first = False
+    yield b"]"
+
+
+async def acatalog_response(request, queryset, absolute_urls=False):
+    """catalog_response() for async views; returns a JSONResponse or a streaming response."""
+    encoder = SongEncoder(request if absolute_urls else None)
+    try:
+        fields, stream, paginate, limit, after = parse_catalog_query(request.GET)
+    except CatalogQueryError as exc:
+        return JSONResponse({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    queryset = queryset.order_by("id")
+    if after is not None:
+        queryset = queryset.filter(id__gt=after)
+
+    if stream:
+        # Pin the DB now: the body is read after the view (and its routing) returns
+        chunks = _aencode_chunks(
+            queryset.using(queryset.db), fields, encoder, STREAM_CHUNK_SIZE, limit if paginate else None,
+        )
+        if stream == "ndjson":
+            body, content_type = _astream_ndjson, "application/x-ndjson"
+        else:
+            body, content_type = _astream_json_array, "application/json"
+        return StreamingHttpResponse(body(chunks), content_type=content_type)
+
+    if not paginate:
+        return JSONResponse(encoder.encode_many(await asong_rows(queryset), fields))
+
+    page = await asong_rows(queryset[:limit + 1])
+    has_more = len(page) > limit
+    page = page[:limit]
+    return JSONResponse({
+        "results": encoder.encode_many(page, fields),
+        "next_cursor": encode_cursor(page[-1].id) if has_more else None,
+    })
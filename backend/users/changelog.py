@@ -0,0 +1,191 @@
+import base64
+import binascii
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.db.models import F, OuterRef, Subquery
+from django.utils.timezone import now
+
+from .activity_buffer import open_buffer
+from .encoders import SONG_ROW_FIELDS, SongEncoder, SongRow
+from .models import Playlist, PlaylistActivity, PlaylistChange, Song
+
+# ---------------- Playlist Change Log ---------------- #
+# Every playlist edit appends a PlaylistChange row for the owner. The sync
+# endpoint turns "changes after token T" into the current state of just the
+# touched playlists and songs, so replaying a delta twice is harmless.
+# Change ids are handed out at insert time but become visible at commit, so
+# a long transaction can commit an id below one a client has already seen.
+# Tokens therefore only advance past changes older than the settle window;
+# younger ones are sent again on the next sync.
+SYNC_MAX_CHANGES = 500   # more changes than this since the token: send a snapshot
+
+
+def retention():
+    return timedelta(days=getattr(settings, "PLAYLIST_CHANGELOG_RETENTION_DAYS", 30))
+
+
+def settle_window():
+    return timedelta(seconds=getattr(settings, "PLAYLIST_SYNC_SETTLE_SECONDS", 30))
+
+
+def record_change(user_id, playlist_id, kind, song_ids=()):
+    PlaylistChange.objects.create(user_id=user_id, playlist_id=playlist_id, kind=kind, song_ids=list(song_ids))
+
+
+def record_changes(entries):
+    """Bulk record_change() for (user_id, playlist_id, kind, song_ids) tuples."""
+    PlaylistChange.objects.bulk_create([
+        PlaylistChange(user_id=user_id, playlist_id=playlist_id, kind=kind, song_ids=list(song_ids))
+        for user_id, playlist_id, kind, song_ids in entries
+    ])
+
+
+def prune_changes():
+    """Delete entries past the retention window; tokens that old get a snapshot."""
+    deleted, _ = PlaylistChange.objects.filter(created_at__lt=now() - retention()).delete()
+    return deleted
+
+
+# ---------------- Sync Tokens ---------------- #
+def encode_token(change_id):
+    """Opaque token: the last change id the client has, plus when it was issued."""
+    raw = f"{change_id}.{int(time.time())}".encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip("=")
+
+
+def decode_token(token):
+    """(change id, issued at) from a token; raises ValueError."""
+    padded = token + "=" * (-len(token) % 4)
+    try:
+        change_id, issued = base64.urlsafe_b64decode(padded.encode()).decode().split(".")
+        return int(change_id), int(issued)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid sync token")
+
+
+def settled_cursor(user, since, latest):
+    """
+    The id to put in the next token: the newest change up to `latest` that
+    is older than the settle window, so ids still committing behind it are
+    picked up next time. Never moves backwards past `since`.
+    """
+    cutoff = now() - settle_window()
+    settled = PlaylistChange.objects.filter(user=user, id__gt=since, id__lte=latest, created_at__lt=cutoff)\
+        .order_by("-id").values_list("id", flat=True).first()
+    return settled or since
+
+
+# ---------------- Sync Payloads ---------------- #
+def _playlists(user, ids=None):
+    """The user's playlists with open activity, unflushed opens merged in."""
+    activity = PlaylistActivity.objects.filter(user=user, playlist=OuterRef("pk"))
+    playlists = Playlist.objects.filter(user=user).annotate(
+        last_opened=Subquery(activity.values("last_opened")[:1]),
+        open_count=Subquery(activity.values("open_count")[:1]),
+    ).order_by("id")
+    if ids is not None:
+        playlists = playlists.filter(id__in=ids)
+    pending = open_buffer.pending_for_user(user.id)
+    for playlist in playlists:
+        if playlist.id in pending:
+            count, opened = pending[playlist.id]
+            playlist.open_count = (playlist.open_count or 0) + count
+            playlist.last_opened = max(filter(None, (playlist.last_opened, opened)))
+        yield playlist
+
+
+def _entries(**filters):
+    """(playlist id, rank, SongRow) for playlist entries, in playlist order, in one query."""
+    rows = Song.objects.filter(**filters)\
+        .annotate(entry_playlist=F("playlist_entries__playlist_id"), entry_rank=F("playlist_entries__rank"))\
+        .order_by("entry_playlist", "entry_rank")\
+        .values_list(*SONG_ROW_FIELDS, "entry_playlist", "entry_rank")
+    width = len(SONG_ROW_FIELDS)
+    for values in rows:
+        yield values[width], values[width + 1], SongRow(*values[:width])
+
+
+def _meta(playlist):
+    return {
+        "id": playlist.id,
+        "name": playlist.name,
+        "created_at": playlist.created_at,
+        "last_opened": playlist.last_opened,
+        "open_count": playlist.open_count or 0,
+    }
+
+
+def snapshot_payload(request, user, latest):
+    encoder = SongEncoder(request)
+    songs = defaultdict(list)
+    for playlist_id, rank, row in _entries(playlist_entries__playlist__user=user):
+        songs[playlist_id].append({**encoder.encode(row), "rank": rank})
+    return {
+        "token": encode_token(settled_cursor(user, 0, latest)),
+        "reset": True,
+        "playlists": [{**_meta(p), "songs": songs.get(p.id, [])} for p in _playlists(user)],
+        "deleted": [],
+    }
+
+
+def sync_payload(request, user, token=None):
+    """
+    Changes for `user` since `token` (None: everything). Deltas list the
+    touched playlists' metadata, the current rank of every touched song
+    still in them and the ids of those that left; deleted playlists are
+    listed by id. Stale tokens get a full snapshot with "reset": true.
+    Changes younger than the settle window are repeated in the next delta.
+    """
+    # Read the head first: changes landing during the build are resent next time
+    latest = PlaylistChange.objects.filter(user=user).order_by("-id").values_list("id", flat=True).first() or 0
+    if token is None:
+        return snapshot_payload(request, user, latest)
+    since, issued = decode_token(token)
+    if time.time() - issued > retention().total_seconds() or since > latest:
+        return snapshot_payload(request, user, latest)
+    changes = list(
+        PlaylistChange.objects.filter(user=user, id__gt=since, id__lte=latest)
+        .order_by("id").values_list("playlist_id", "kind", "song_ids")[:SYNC_MAX_CHANGES + 1]
+    )
+    if len(changes) > SYNC_MAX_CHANGES:
+        return snapshot_payload(request, user, latest)
+
+    touched_songs = defaultdict(set)
+    deleted = set()
+    for playlist_id, kind, song_ids in changes:
+        if kind == PlaylistChange.DELETED:
+            deleted.add(playlist_id)
+        touched_songs[playlist_id].update(song_ids)
+
+    # Opens still in this worker's buffer have no log entry yet
+    for playlist_id in open_buffer.pending_for_user(user.id):
+        touched_songs[playlist_id]
+    playlists = list(_playlists(user, ids=set(touched_songs)))
+    deleted -= {p.id for p in playlists}
+    song_ids = set().union(*(touched_songs[p.id] for p in playlists)) if playlists else set()
+    present = defaultdict(list)
+    if song_ids:
+        for playlist_id, rank, row in _entries(
+            playlist_entries__playlist__in=[p.id for p in playlists], id__in=song_ids,
+        ):
+            if row.id in touched_songs[playlist_id]:
+                present[playlist_id].append((rank, row))
+
+    encoder = SongEncoder(request)
+    result = []
+    for playlist in playlists:
+        kept = present.get(playlist.id, [])
+        result.append({
+            **_meta(playlist),
+            "songs": [{**encoder.encode(row), "rank": rank} for rank, row in kept],
+            "removed_song_ids": sorted(touched_songs[playlist.id] - {row.id for _, row in kept}),
+        })
+    return {
+        "token": encode_token(settled_cursor(user, since, latest)),
+        "reset": False,
+        "playlists": result,
+        "deleted": sorted(deleted),
+    }
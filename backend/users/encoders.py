@@ -0,0 +1,138 @@
+from django.core.files.storage import FileSystemStorage
+from django.utils.encoding import filepath_to_uri
+
+from .images import variant_base_url, variant_urls
+from .models import Song
+
+# ---------------- Song Encoding ---------------- #
+# One encoder for every song payload. Rows come either straight from
+# Song.objects.values_list(*SONG_ROW_FIELDS) or from Song instances, and
+# media URLs are built from a prefix computed once per request instead of
+# calling FieldFile.url + request.build_absolute_uri for every field.
+SONG_ROW_FIELDS = (
+    "id", "title", "artist", "src", "cover", "emotion", "language",
+    "duration", "sample_rate", "bitrate", "loudness_db",
+)
+
+# SongSerializer's output keys, in order
+SERIALIZER_FIELDS = (
+    "id", "title", "artist", "src", "src_url", "cover_url", "cover_variants", "emotion", "language",
+    "duration", "sample_rate", "bitrate", "loudness_db",
+)
+# Compact "track" shape used by recommendations and recent/frequent playlists
+TRACK_FIELDS = (
+    "id", "title", "artist", "src", "cover_url", "cover_variants", "emotion", "language", "duration",
+)
+
+
+class SongRow:
+    """Lightweight song record: file fields hold storage names, not FieldFiles."""
+
+    __slots__ = SONG_ROW_FIELDS
+
+    def __init__(self, id, title, artist, src, cover, emotion, language,
+                 duration=None, sample_rate=None, bitrate=None, loudness_db=None):
+        self.id = id
+        self.title = title
+        self.artist = artist
+        self.src = src
+        self.cover = cover
+        self.emotion = emotion
+        self.language = language
+        self.duration = duration
+        self.sample_rate = sample_rate
+        self.bitrate = bitrate
+        self.loudness_db = loudness_db
+
+    @classmethod
+    def from_song(cls, song):
+        return cls(song.id, song.title, song.artist, song.src.name, song.cover.name,
+                   song.emotion, song.language, song.duration, song.sample_rate,
+                   song.bitrate, song.loudness_db)
+
+
+def song_rows(queryset):
+    """Iterate SongRow objects for a Song queryset without building models."""
+    return (SongRow(*values) for values in queryset.values_list(*SONG_ROW_FIELDS))
+
+
+async def asong_rows(queryset):
+    """song_rows() for async views, as a list."""
+    return [SongRow(*values) async for values in queryset.values_list(*SONG_ROW_FIELDS)]
+
+
+class SongEncoder:
+    """
+    Turns SongRow/Song objects into response dicts. Create one per request:
+    with a request URLs are absolute, without one they are relative, which
+    matches what SongSerializer produced with and without request context.
+    """
+
+    def __init__(self, request=None):
+        storage = Song._meta.get_field("src").storage
+        self._request = request
+        self._storage = storage
+        if isinstance(storage, FileSystemStorage):
+            base = storage.base_url
+            self._prefix = request.build_absolute_uri(base) if request is not None else base
+        else:
+            self._prefix = None
+        self._variant_base = None
+        self._plans = {}
+
+    def url(self, name):
+        """URL for a stored file name; None for empty file fields."""
+        if not name:
+            return None
+        if self._prefix is not None:
+            return self._prefix + filepath_to_uri(name).lstrip("/")
+        url = self._storage.url(name)
+        return self._request.build_absolute_uri(url) if self._request is not None else url
+
+    def variants(self, name):
+        """Resized image URLs (see images.py) for a stored image name."""
+        if not name:
+            return None
+        if self._variant_base is None:
+            self._variant_base = variant_base_url(self._request)
+        return variant_urls(name, self._variant_base)
+
+    def _plan(self, fields):
+        plan = self._plans.get(fields)
+        if plan is None:
+            url, variants = self.url, self.variants
+            getters = {
+                "id": lambda row: row.id,
+                "title": lambda row: row.title,
+                "artist": lambda row: row.artist,
+                "src": lambda row: url(row.src),
+                "src_url": lambda row: url(row.src),
+                "cover_url": lambda row: url(row.cover),
+                "cover_variants": lambda row: variants(row.cover),
+                "emotion": lambda row: row.emotion,
+                "language": lambda row: row.language,
+                "duration": lambda row: row.duration,
+                "sample_rate": lambda row: row.sample_rate,
+                "bitrate": lambda row: row.bitrate,
+                "loudness_db": lambda row: row.loudness_db,
+            }
+            plan = self._plans[fields] = tuple((name, getters[name]) for name in fields)
+        return plan
+
+    def encode(self, row, fields=SERIALIZER_FIELDS):
+        """One song dict. `row` may be a SongRow or a Song instance."""
+        if isinstance(row, Song):
+            row = SongRow.from_song(row)
+        return {name: get(row) for name, get in self._plan(fields)}
+
+    def encode_many(self, rows, fields=SERIALIZER_FIELDS):
+        plan = self._plan(fields)
+        out = []
+        for row in rows:
+            if isinstance(row, Song):
+                row = SongRow.from_song(row)
+            out.append({name: get(row) for name, get in plan})
+        return out
+
+    def tracks(self, rows):
+        return self.encode_many(rows, TRACK_FIELDS)
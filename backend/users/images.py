@@ -0,0 +1,197 @@
+import io
+import logging
+import os
+import tempfile
+import threading
+from contextlib import contextmanager
+
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.urls import reverse
+from django.utils.encoding import filepath_to_uri
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import tasks
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Image Variants ---------------- #
+# Uploaded covers and profile pictures get resized copies under
+# media/derivatives/<variant>/<original path>, each in the original's
+# family (JPEG, or PNG for PNG/GIF uploads to keep transparency) and WebP.
+# They are built in the background after upload, or on first request for
+# files that predate the pipeline; the files on disk are the cache.
+IMAGE_VARIANTS = {"thumb": 160, "medium": 480, "large": 1024}   # longest edge in px
+DERIVATIVES_DIR = "derivatives"
+IMAGE_PREFIXES = ("song_covers/", "playlist_covers/", "profile_pictures/")
+JPEG_QUALITY = 85
+WEBP_QUALITY = 80
+VARIANT_CACHE_CONTROL = "public, max-age=604800"
+PRIVATE_IMAGE_PREFIXES = ("profile_pictures/",)   # served to signed-in users only
+PRIVATE_VARIANT_CACHE_CONTROL = "private, max-age=604800"
+
+# name -> [lock, holders]; entries are dropped once nobody holds or waits on them
+_locks = {}
+_locks_guard = threading.Lock()
+
+
+def _fallback_ext(name):
+    return ".png" if os.path.splitext(name)[1].lower() in (".png", ".gif") else ".jpg"
+
+
+def variant_name(name, variant, webp=False):
+    """Storage name of one derivative of the original file `name`."""
+    stem = os.path.splitext(name)[0]
+    return f"{DERIVATIVES_DIR}/{variant}/{stem}{'.webp' if webp else _fallback_ext(name)}"
+
+
+def is_variant_source(name):
+    """Only image upload folders may be resized (no traversal, no derivatives)."""
+    return name.startswith(IMAGE_PREFIXES) and ".." not in name.split("/")
+
+
+def _fresh(variant, original):
+    try:
+        return default_storage.get_modified_time(variant) >= default_storage.get_modified_time(original)
+    except (OSError, NotImplementedError):
+        return False
+
+
+def _encode(image, name):
+    buffer = io.BytesIO()
+    ext = os.path.splitext(name)[1]
+    if ext == ".webp":
+        image.save(buffer, "WEBP", quality=WEBP_QUALITY, method=4)
+    elif ext == ".png":
+        image.save(buffer, "PNG", optimize=True)
+    else:
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        image.save(buffer, "JPEG", quality=JPEG_QUALITY, optimize=True, progressive=True)
+    return buffer.getvalue()
+
+
+def _write(name, data):
+    """Replace `name` atomically where the storage is local, so readers never see half a file."""
+    try:
+        path = default_storage.path(name)
+    except NotImplementedError:
+        default_storage.delete(name)
+        default_storage.save(name, ContentFile(data))
+        return
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".tmp")
+    try:
+        with os.fdopen(fd, "wb") as fh:
+            fh.write(data)
+        os.replace(tmp, path)
+    except BaseException:
+        os.unlink(tmp)
+        raise
+
+
+def generate_variants(name, force=False):
+    """
+    Build every size/format of `name` from one decode of the original.
+    Returns the names written (empty when all are already up to date).
+    """
+    targets = [
+        (variant, variant_name(name, variant, webp))
+        for variant in IMAGE_VARIANTS for webp in (False, True)
+    ]
+    if not force and all(_fresh(target, name) for _, target in targets):
+        return []
+    largest = max(IMAGE_VARIANTS.values())
+    with default_storage.open(name, "rb") as fh:
+        original = fh.read()
+    image = Image.open(io.BytesIO(original))
+    source_format = image.format
+    upright = image.getexif().get(0x0112, 1) == 1
+    image.draft("RGB", (largest, largest))   # JPEG: decode at reduced scale
+    image = ImageOps.exif_transpose(image)
+    image.load()
+    if image.mode == "P":
+        image = image.convert("RGBA")
+
+    resized = {}
+    for variant, target in targets:
+        if variant not in resized:
+            copy = image.copy()
+            copy.thumbnail((IMAGE_VARIANTS[variant],) * 2, Image.Resampling.LANCZOS)
+            resized[variant] = copy
+        copy = resized[variant]
+        same_format = {".jpg": "JPEG", ".png": "PNG"}.get(os.path.splitext(target)[1]) == source_format
+        if copy.size == image.size and same_format and upright:
+            # Already small enough: re-encoding would only make it bigger.
+            _write(target, original)
+        else:
+            _write(target, _encode(copy, target))
+    return [target for _, target in targets]
+
+
+@contextmanager
+def _generation_lock(name):
+    """Serialize generation per original without keeping a lock per name forever."""
+    with _locks_guard:
+        entry = _locks.setdefault(name, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _locks_guard:
+            entry[1] -= 1
+            if not entry[1]:
+                del _locks[name]
+
+
+def ensure_variant(name, variant, webp=False, build=True):
+    """
+    Storage name of a derivative, generating it on demand unless build is
+    False; None if it doesn't exist and can't (or may not) be built.
+    """
+    target = variant_name(name, variant, webp)
+    if _fresh(target, name):
+        return target
+    if not build:
+        return None
+    with _generation_lock(name):
+        try:
+            generate_variants(name)
+        except (OSError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.warning("Cannot build image variants for %s", name, exc_info=True)
+            return None
+    return target
+
+
+def _generate_quietly(name):
+    ensure_variant(name, next(iter(IMAGE_VARIANTS)))
+
+
+def queue_variants(name):
+    """Build derivatives of `name` on the worker pool once the upload is committed."""
+    if name and is_variant_source(name):
+        transaction.on_commit(lambda: tasks.submit(_generate_quietly, name))
+
+
+def delete_variants(name):
+    if not name:
+        return
+    for variant in IMAGE_VARIANTS:
+        for webp in (False, True):
+            default_storage.delete(variant_name(name, variant, webp))
+
+
+def variant_base_url(request=None):
+    """URL prefix of the image_variant view, absolute when a request is given."""
+    base = reverse("image_variant", kwargs={"variant": "thumb", "name": "_"})[:-len("thumb/_")]
+    return request.build_absolute_uri(base) if request is not None else base
+
+
+def variant_urls(name, base):
+    """{"thumb": url, "medium": url, "large": url} for an image name, or None."""
+    if not name:
+        return None
+    path = filepath_to_uri(name)
+    return {variant: f"{base}{variant}/{path}" for variant in IMAGE_VARIANTS}
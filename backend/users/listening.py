@@ -0,0 +1,98 @@
+import math
+import time
+
+from django.conf import settings
+
+# ---------------- Decayed Listening Stats ---------------- #
+# UserProfile.listening_stats holds per-dimension play weights that fade
+# with a half-life, so recommendations follow what a user plays now:
+#   {"landmark": <unix ts>, "emotion": {key: score}, "artist": {...}, "language": {...}}
+# Forward decay: a play at time t adds exp(rate * (t - landmark)), so stored
+# scores never need rewriting as time passes; reading multiplies by
+# exp(-rate * (now - landmark)), leaving each play worth 2^(-age / half-life).
+# Each dimension keeps at most CAPACITY keys (Space-Saving): a new key
+# evicts the smallest and inherits its score, so heavy hitters survive and
+# the row size stays fixed however many artists a user has played.
+DIMENSIONS = ("emotion", "artist", "language")
+CAPACITY = {"emotion": 16, "artist": 50, "language": 16}
+ALL_TIME_ARTISTS = 200   # cap for the all-time artist_stats counter (see capped_add)
+MAX_EXPONENT = 64        # rescale to a new landmark before weights leave float range
+
+
+def rate():
+    """Decay per second for PLAYS_HALF_LIFE_DAYS."""
+    return math.log(2) / (getattr(settings, "PLAYS_HALF_LIFE_DAYS", 30) * 86400)
+
+
+def space_saving_add(counters, key, weight, capacity):
+    """Add `weight` to `key`, evicting the smallest key when `counters` is full."""
+    if key in counters or len(counters) < capacity:
+        counters[key] = counters.get(key, 0) + weight
+        return
+    smallest = min(counters, key=counters.get)
+    counters[key] = counters.pop(smallest) + weight
+
+
+def capped_add(counters, key, count, capacity):
+    """
+    Add `count` to `key`, then drop the smallest key if over `capacity`.
+    Unlike space_saving_add nothing is inherited, so exact counts shown to
+    the user stay exact (a new key may itself be the one dropped).
+    """
+    counters[key] = counters.get(key, 0) + count
+    if len(counters) > capacity:
+        del counters[min(counters, key=counters.get)]
+
+
+def _rescale(stats, landmark, new_landmark, decay):
+    factor = math.exp(-decay * (new_landmark - landmark))
+    for dimension in DIMENSIONS:
+        stats[dimension] = {key: score * factor for key, score in stats.get(dimension, {}).items()}
+    stats["landmark"] = new_landmark
+
+
+def add_plays(stats, plays):
+    """Fold (unix ts, {dimension: key}) plays into a listening_stats dict, in place."""
+    decay = rate()
+    for played_at, keys in plays:
+        landmark = stats.setdefault("landmark", played_at)
+        exponent = decay * (played_at - landmark)
+        if exponent > MAX_EXPONENT:
+            _rescale(stats, landmark, played_at, decay)
+            exponent = 0.0
+        weight = math.exp(exponent)
+        for dimension, key in keys.items():
+            if key:
+                space_saving_add(stats.setdefault(dimension, {}), key, weight, CAPACITY[dimension])
+    return stats
+
+
+def decayed(stats, dimension, at=None):
+    """{key: weight} for one dimension as of `at` (default now)."""
+    scores = (stats or {}).get(dimension)
+    if not scores:
+        return {}
+    at = time.time() if at is None else at
+    factor = math.exp(-rate() * (at - stats["landmark"]))
+    return {key: score * factor for key, score in scores.items()}
+
+
+def seed_from_counts(emotion_stats, artist_stats, language_stats, at):
+    """listening_stats treating all-time counters as plays made at `at`."""
+    stats = {"landmark": at}
+    for dimension, counts in zip(DIMENSIONS, (emotion_stats, artist_stats, language_stats)):
+        top = sorted((counts or {}).items(), key=lambda item: item[1], reverse=True)[:CAPACITY[dimension]]
+        stats[dimension] = {key: float(count) for key, count in top}
+    return stats
+
+
+def recommendation_stats(profile):
+    """
+    (emotion, artist, language) weights for the recommender: decayed when
+    the profile has listening_stats, the all-time counters otherwise.
+    """
+    stats = profile.listening_stats
+    if stats and stats.get("landmark") is not None:
+        at = time.time()
+        return tuple(decayed(stats, dimension, at) for dimension in DIMENSIONS)
+    return profile.emotion_stats or {}, profile.artist_stats or {}, profile.language_stats or {}
@@ -0,0 +1,76 @@
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from users.models import Song
+
+# ---------------- Benchmark Helpers ---------------- #
+# Shared by the bench_* management commands. Synthetic rows are created
+# inside a transaction that is always rolled back.
+WORDS = (
+    "dil tum ishq pyaar raat chand sapna saath barsaat yaadein safar "
+    "love night heart fire dream rain light road home dance "
+    "kadhal nilave mazhai kanmani ninaivu pookal kaatru"
+).split()
+
+
+def fake_title(rng):
+    return " ".join(rng.choice(WORDS).capitalize() for _ in range(rng.randint(1, 4)))
+
+
+@contextmanager
+def synthetic_catalog(size, seed=7):
+    """Add `size` fake songs for the duration of the block, then roll back."""
+    rng = random.Random(seed)
+    emotions = [choice for choice, _ in Song.EMOTIONS]
+    languages = [choice for choice, _ in Song.LANGUAGES]
+    artists = [f"{fake_title(rng)} {i}" for i in range(max(size // 20, 1))]
+    with transaction.atomic():
+        Song.objects.bulk_create(
+            [
+                Song(
+                    title=fake_title(rng),
+                    artist=rng.choice(artists),
+                    src=f"songs/synthetic_{i}.mp3",
+                    cover=f"song_covers/synthetic_{i}.jpg" if i % 3 else None,
+                    emotion=rng.choice(emotions),
+                    language=rng.choice(languages),
+                )
+                for i in range(size)
+            ],
+            batch_size=1000,
+        )
+        try:
+            yield rng
+        finally:
+            transaction.set_rollback(True)
+
+
+def measure(fn, repeat):
+    """Run fn() `repeat` times and return per-call wall times in seconds."""
+    samples = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        samples.append(time.perf_counter() - start)
+    return samples
+
+
+def summarize(samples):
+    ordered = sorted(samples)
+    p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+    return {
+        "mean_ms": statistics.fmean(ordered) * 1000,
+        "p50_ms": ordered[len(ordered) // 2] * 1000,
+        "p99_ms": p99 * 1000,
+    }
+
+
+def format_row(label, stats):
+    return (
+        f"{label:<28} mean {stats['mean_ms']:8.3f} ms   "
+        f"p50 {stats['p50_ms']:8.3f} ms   p99 {stats['p99_ms']:8.3f} ms"
+    )
@@ -0,0 +1,50 @@
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from users.audio import analyze_path, store_analysis
+from users.cache import bump_catalog_version
+from users.models import Song
+
+
+class Command(BaseCommand):
+    help = "Compute duration, sample rate, bitrate, loudness and waveform peaks for song audio files."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=os.cpu_count() or 2)
+        parser.add_argument("--force", action="store_true", help="Re-analyze songs that are up to date.")
+        parser.add_argument("--ids", type=int, nargs="*", help="Only these song ids.")
+
+    def handle(self, *args, **options):
+        songs = Song.objects.exclude(src="")
+        if options["ids"]:
+            songs = songs.filter(id__in=options["ids"])
+        if not options["force"]:
+            songs = songs.exclude(analyzed_src=F("src"))
+        storage = Song._meta.get_field("src").storage
+        jobs = [(song_id, src, storage.path(src)) for song_id, src in songs.order_by("id").values_list("id", "src")]
+        if not jobs:
+            self.stdout.write("All songs are analyzed.")
+            return
+
+        start = time.perf_counter()
+        stored = failed = 0
+        # Decoding is CPU-bound NumPy/ffmpeg work: one process per core.
+        # Workers only read files; results are written here, in the parent.
+        with ProcessPoolExecutor(max_workers=options["workers"]) as pool:
+            for song_id, src, result, error in pool.map(analyze_path, jobs, chunksize=4):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"Song {song_id} ({src}): {error}")
+                elif store_analysis(song_id, src, result, bump=False):
+                    stored += 1
+        if stored:
+            bump_catalog_version()
+        elapsed = time.perf_counter() - start
+        self.stdout.write(
+            f"Analyzed {stored} songs, {failed} failed, in {elapsed:.1f}s "
+            f"({len(jobs) / elapsed:.1f} files/s, {options['workers']} workers)"
+        )
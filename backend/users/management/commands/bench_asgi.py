@@ -0,0 +1,137 @@
+import asyncio
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework_simplejwt.tokens import AccessToken
+
+from ._bench import format_row, summarize
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test running servers over keep-alive HTTP/1.1 connections and compare "
+        "concurrent-connection capacity, e.g. the WSGI and ASGI deployments from gunicorn.conf.py."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--target", action="append", metavar="LABEL=URL",
+            help="Server to test (repeatable). Default: asgi=http://127.0.0.1:8000 wsgi=http://127.0.0.1:8001",
+        )
+        parser.add_argument(
+            "--path", action="append",
+            help="Request path, repeatable; connections cycle through them. "
+                 "Default: catalog page, search and artist tile.",
+        )
+        parser.add_argument("--user", help="Username to send a Bearer token for (default: anonymous)")
+        parser.add_argument("--concurrency", type=int, nargs="+", default=[16, 64, 256, 1024])
+        parser.add_argument("--requests", type=int, default=4000, help="Requests per concurrency level")
+        parser.add_argument("--timeout", type=float, default=10.0)
+
+    def handle(self, *args, **options):
+        targets = options["target"] or ["asgi=http://127.0.0.1:8000", "wsgi=http://127.0.0.1:8001"]
+        paths = options["path"] or [
+            "/api/users/songs/?limit=100",
+            "/api/users/songs/search/?q=love",
+            "/api/users/songs/language/hindi/",
+        ]
+        headers = {}
+        if options["user"]:
+            try:
+                user = User.objects.get(username=options["user"])
+            except User.DoesNotExist:
+                raise CommandError(f"No user named {options['user']!r}")
+            headers["Authorization"] = f"Bearer {AccessToken.for_user(user)}"
+        elif not options["path"]:
+            paths = ["/api/users/songs/public/?limit=100"]
+
+        for target in targets:
+            label, _, url = target.partition("=")
+            if not url:
+                raise CommandError(f"--target must look like LABEL=URL, got {target!r}")
+            parts = urlsplit(url)
+            self.stdout.write(f"\n{label}: {url}")
+            for concurrency in options["concurrency"]:
+                latencies, errors, elapsed = asyncio.run(self.run(
+                    parts.hostname, parts.port or 80, paths, headers,
+                    concurrency, options["requests"], options["timeout"],
+                ))
+                row = f"c={concurrency}"
+                if not latencies:
+                    self.stdout.write(f"{row:<28} all {errors} requests failed")
+                    continue
+                self.stdout.write(
+                    f"{format_row(row, summarize(latencies))}   "
+                    f"{len(latencies) / elapsed:8.0f} req/s   {errors:5d} errors"
+                )
+
+    async def run(self, host, port, paths, headers, concurrency, total, timeout):
+        latencies, errors = [], 0
+        remaining = total
+
+        async def connection(index):
+            nonlocal remaining, errors
+            reader = writer = None
+            sent = 0
+            while remaining > 0:
+                remaining -= 1
+                path = paths[(index + sent) % len(paths)]
+                sent += 1
+                start = time.perf_counter()
+                try:
+                    if writer is None:
+                        reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+                    status, keep_alive = await asyncio.wait_for(
+                        self.request(reader, writer, host, path, headers), timeout,
+                    )
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError, ValueError):
+                    errors += 1
+                    if writer is not None:
+                        writer.close()
+                    reader = writer = None
+                    continue
+                if status >= 400:
+                    errors += 1
+                else:
+                    latencies.append(time.perf_counter() - start)
+                if not keep_alive:
+                    writer.close()
+                    reader = writer = None
+            if writer is not None:
+                writer.close()
+
+        start = time.perf_counter()
+        await asyncio.gather(*(connection(i) for i in range(concurrency)))
+        return latencies, errors, time.perf_counter() - start
+
+    @staticmethod
+    async def request(reader, writer, host, path, headers):
+        """Send one GET and read the whole response. Returns (status, keep_alive)."""
+        lines = [f"GET {path} HTTP/1.1", f"Host: {host}", "Accept: application/json"]
+        lines += [f"{name}: {value}" for name, value in headers.items()]
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode())
+        await writer.drain()
+
+        head = await reader.readuntil(b"\r\n\r\n")
+        status_line, *header_lines = head.decode("latin-1").split("\r\n")
+        status = int(status_line.split()[1])
+        fields = {}
+        for line in header_lines:
+            if ":" in line:
+                name, value = line.split(":", 1)
+                fields[name.strip().lower()] = value.strip().lower()
+
+        if fields.get("transfer-encoding") == "chunked":
+            while True:
+                size = int((await reader.readuntil(b"\r\n")).split(b";")[0], 16)
+                await reader.readexactly(size + 2)
+                if size == 0:
+                    break
+        elif "content-length" in fields:
+            await reader.readexactly(int(fields["content-length"]))
+        elif status not in (204, 304):
+            await reader.read()   # body runs until the server closes
+            return status, False
+        return status, fields.get("connection") != "close"
@@ -0,0 +1,52 @@
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models.functions import Lower
+from django.test import RequestFactory, override_settings
+
+from users.views import LoginView
+
+from ._bench import format_row, measure, summarize
+
+
+class Command(BaseCommand):
+    help = "Benchmark logins/sec on one core: email lookup, password hashing cost and the full LoginView."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--users", type=int, default=50000, help="Synthetic auth_user rows for the lookup.")
+        parser.add_argument("--iterations", type=int, nargs="+", default=[1_000_000, 600_000, 260_000])
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        factory = RequestFactory()
+        # Throttles off: this measures the work a login does, not the limiter.
+        login = LoginView.as_view(throttle_classes=[])
+        with transaction.atomic():
+            User.objects.bulk_create(
+                [User(username=f"bench{i}", email=f"bench{i}@example.com", password="!") for i in range(options["users"])],
+                batch_size=2000,
+            )
+            email = f"bench{options['users'] // 2}@example.com"
+            self.stdout.write(f"Email lookup over {User.objects.count()} users")
+            for label, fn in (
+                ("exact email (legacy)", lambda: User.objects.filter(email=email).first()),
+                ("lower(email) index", lambda: User.objects.annotate(email_lower=Lower("email"))
+                    .filter(email_lower=email).order_by("id").first()),
+            ):
+                self.stdout.write(format_row(label, summarize(measure(fn, options["repeat"] * 10))))
+
+            self.stdout.write("\nFull login (lookup + PBKDF2 + token minting), single core")
+            for iterations in options["iterations"]:
+                with override_settings(PASSWORD_HASH_ITERATIONS=iterations):
+                    user = User.objects.create_user(f"login{iterations}", email=f"login{iterations}@example.com",
+                                                    password="bench-password")
+
+                    def attempt():
+                        request = factory.post("/api/users/login/", {"email": user.email, "password": "bench-password"},
+                                               content_type="application/json")
+                        assert login(request).status_code == 200
+
+                    stats = summarize(measure(attempt, options["repeat"]))
+                self.stdout.write(f"{format_row(f'{iterations:,} iterations', stats)}   "
+                                  f"{1000 / stats['mean_ms']:6.1f} logins/s/core")
+            transaction.set_rollback(True)
@@ -0,0 +1,92 @@
+from datetime import timedelta
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.utils.timezone import now
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from users.encoders import SongEncoder
+from users.models import Playlist, PlaylistActivity, PlaylistSong, Song
+from users.ordering import ordered_songs, spread_ranks
+from users.renderers import dumps
+from users.views import recent_playlists, serialize_playlist, split_recent_frequent
+
+from ._bench import format_row, measure, summarize, synthetic_catalog
+
+
+def legacy_recent(request, user):
+    """recent_playlists as it was: two activity queries, each prefetching every song."""
+    activities = PlaylistActivity.objects.filter(user=user)\
+        .select_related("playlist")\
+        .prefetch_related(ordered_songs("playlist__songs"))
+    rows = {}
+    for queryset in (activities.order_by("-last_opened")[:5], activities.order_by("-open_count")[:10]):
+        for activity in queryset:
+            rows.setdefault(activity.playlist_id, activity)
+    recent, frequent = split_recent_frequent(list(rows.values()))
+    encoder = SongEncoder(request)
+    return dumps({
+        "recent_playlists": [serialize_playlist(request, pl, encoder) for pl in recent],
+        "frequent_playlists": [serialize_playlist(request, pl, encoder) for pl in frequent],
+    })
+
+
+class Command(BaseCommand):
+    help = "Benchmark recent/frequent playlists: queries, payload size and latency per response mode."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--playlists", type=int, default=200)
+        parser.add_argument("--songs-per-playlist", type=int, default=100)
+        parser.add_argument("--repeat", type=int, default=50)
+
+    def handle(self, *args, **options):
+        per_playlist = options["songs_per_playlist"]
+        with synthetic_catalog(max(per_playlist * 4, 1000)) as rng:
+            user = User.objects.create_user("bench_recent", password=None)
+            song_ids = list(Song.objects.values_list("id", flat=True))
+            playlists = Playlist.objects.bulk_create(
+                [Playlist(user=user, name=f"Bench {i}") for i in range(options["playlists"])],
+            )
+            ranks = spread_ranks(per_playlist)
+            PlaylistSong.objects.bulk_create(
+                [
+                    PlaylistSong(playlist=playlist, song_id=song_id, rank=rank)
+                    for playlist in playlists
+                    for song_id, rank in zip(rng.sample(song_ids, per_playlist), ranks)
+                ],
+                batch_size=5000,
+            )
+            PlaylistActivity.objects.bulk_create([
+                PlaylistActivity(user=user, playlist=playlist, open_count=rng.randint(1, 500),
+                                 last_opened=now() - timedelta(minutes=rng.randint(0, 100000)))
+                for playlist in playlists
+            ])
+
+            factory = APIRequestFactory()
+
+            def endpoint(query):
+                def call():
+                    request = factory.get(f"/api/users/playlists/recent/{query}")
+                    force_authenticate(request, user)
+                    response = recent_playlists(request)
+                    response.render()
+                    return response.content
+                return call
+
+            cases = [
+                ("legacy (2 queries + songs)", lambda: legacy_recent(factory.get("/"), user)),
+                ("ranked, full", endpoint("")),
+                ("ranked, ?mode=summary", endpoint("?mode=summary")),
+            ]
+            self.stdout.write(
+                f"{options['playlists']} playlists x {per_playlist} songs, recent/frequent for one user"
+            )
+            for label, fn in cases:
+                with CaptureQueriesContext(connection) as queries:
+                    body = fn()
+                stats = summarize(measure(fn, options["repeat"]))
+                self.stdout.write(
+                    f"{format_row(label, stats)}   {len(queries):3d} queries   {len(body) / 1024:8.1f} KiB"
+                )
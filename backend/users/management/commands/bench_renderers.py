@@ -0,0 +1,64 @@
+import io
+import random
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.utils.timezone import now
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from users.encoders import SongEncoder, SongRow
+from users.parsers import FastJSONParser
+from users.renderers import FastJSONRenderer, orjson
+
+from ._bench import fake_title, format_row, measure, summarize
+
+
+class Command(BaseCommand):
+    help = "Compare DRF's JSONRenderer/JSONParser with the orjson-backed ones on catalog-sized payloads."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--songs", type=int, default=10000)
+        parser.add_argument("--playlists", type=int, default=200)
+        parser.add_argument("--repeat", type=int, default=20)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write("orjson is not installed; FastJSONRenderer falls back to DRF's encoder.")
+        rng = random.Random(5)
+        request = RequestFactory().get("/api/users/songs/", HTTP_HOST="127.0.0.1:8000")
+        encoder = SongEncoder(request)
+        rows = [
+            SongRow(i, fake_title(rng), fake_title(rng), f"songs/track_{i}.mp3",
+                    f"song_covers/cover_{i}.jpg", "Love", "Hindi")
+            for i in range(1, options["songs"] + 1)
+        ]
+        catalog = encoder.encode_many(rows)
+        opened = now()
+        playlists = [
+            {"id": i, "name": fake_title(rng), "last_opened": opened - timedelta(minutes=i),
+             "open_count": i, "songs": encoder.tracks(rng.sample(rows, 20))}
+            for i in range(options["playlists"])
+        ]
+
+        for name, payload in (("catalog", catalog), ("recent playlists", playlists)):
+            size = len(JSONRenderer().render(payload))
+            self.stdout.write(f"\n{name}: {size / 1024:.0f} KiB")
+            baseline = None
+            for label, renderer in (("JSONRenderer", JSONRenderer()), ("FastJSONRenderer", FastJSONRenderer())):
+                stats = summarize(measure(lambda: renderer.render(payload), options["repeat"]))
+                baseline = baseline or stats["mean_ms"]
+                mb_s = size / 1e6 / (stats["mean_ms"] / 1000)
+                self.stdout.write(
+                    f"{format_row(label, stats)}   {mb_s:7.1f} MB/s   {baseline / stats['mean_ms']:5.1f}x"
+                )
+
+        body = JSONRenderer().render(catalog)
+        self.stdout.write(f"\nparse catalog: {len(body) / 1024:.0f} KiB")
+        baseline = None
+        for label, parser in (("JSONParser", JSONParser()), ("FastJSONParser", FastJSONParser())):
+            stats = summarize(measure(lambda: parser.parse(io.BytesIO(body)), options["repeat"]))
+            baseline = baseline or stats["mean_ms"]
+            self.stdout.write(f"{format_row(label, stats)}   {baseline / stats['mean_ms']:5.1f}x")
+
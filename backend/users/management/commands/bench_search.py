@@ -0,0 +1,44 @@
+from django.core.management.base import BaseCommand
+
+from users.search_index import SongSearchIndex, search_database, SUGGEST_P99_TARGET_MS
+
+from ._bench import format_row, measure, summarize, synthetic_catalog, WORDS
+
+
+class Command(BaseCommand):
+    help = "Compare the in-memory search index with the database search path."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--songs", type=int, default=10000, help="Synthetic songs to add.")
+        parser.add_argument("--repeat", type=int, default=200, help="Queries per measurement.")
+
+    def handle(self, *args, **options):
+        queries = ["ishq", "dil", "kadhal nil", "raat chand", "dreem", "x"] + WORDS[:6]
+        with synthetic_catalog(options["songs"]):
+            index = SongSearchIndex()
+            build = measure(index.build, 1)[0]
+            self.stdout.write(f"Index build over {len(index.songs)} songs: {build * 1000:.1f} ms")
+
+            def run_index():
+                for q in queries:
+                    index.search(q)
+
+            def run_database():
+                for q in queries:
+                    songs, *_ = search_database(q)
+                    list(songs.values_list("id", flat=True))
+
+            repeat = options["repeat"]
+            index_stats = summarize([t / len(queries) for t in measure(run_index, repeat)])
+            db_stats = summarize([t / len(queries) for t in measure(run_database, max(repeat // 10, 1))])
+            self.stdout.write(format_row("index (per query)", index_stats))
+            self.stdout.write(format_row("database (per query)", db_stats))
+            self.stdout.write(f"Speed-up: {db_stats['mean_ms'] / index_stats['mean_ms']:.1f}x")
+
+            prefixes = [q[:n] for q in queries for n in range(1, len(q) + 1)]
+            suggest_stats = summarize([
+                t for prefix in prefixes for t in measure(lambda: index.suggest(prefix), repeat // 10 or 1)
+            ])
+            self.stdout.write(format_row("suggest (per keystroke)", suggest_stats))
+            verdict = "OK" if suggest_stats["p99_ms"] <= SUGGEST_P99_TARGET_MS else "OVER BUDGET"
+            self.stdout.write(f"Suggest p99 target {SUGGEST_P99_TARGET_MS} ms: {verdict}")
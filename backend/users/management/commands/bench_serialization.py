@@ -0,0 +1,45 @@
+import random
+
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from rest_framework import serializers
+
+from users.encoders import SongEncoder, SongRow
+from users.models import Song
+from users.serializers import SongSerializer
+
+from ._bench import fake_title, format_row, measure, summarize
+
+
+class Command(BaseCommand):
+    help = "Micro-benchmark song serialization: DRF per-field path vs SongEncoder."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--songs", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=10)
+
+    def handle(self, *args, **options):
+        rng = random.Random(3)
+        songs = [
+            Song(id=i, title=fake_title(rng), artist=fake_title(rng), src=f"songs/track {i}.mp3",
+                 cover=f"song_covers/cover_{i}.jpg" if i % 3 else None, emotion="Love", language="Hindi")
+            for i in range(1, options["songs"] + 1)
+        ]
+        rows = [SongRow.from_song(song) for song in songs]
+        request = RequestFactory().get("/api/users/songs/", HTTP_HOST="127.0.0.1:8000")
+        legacy = SongSerializer(context={"request": request})
+
+        cases = [
+            ("DRF per-field (legacy)",
+             lambda: [serializers.ModelSerializer.to_representation(legacy, song) for song in songs]),
+            ("SongSerializer (encoder)",
+             lambda: SongSerializer(songs, many=True, context={"request": request}).data),
+            ("SongEncoder, model rows", lambda: SongEncoder(request).encode_many(songs)),
+            ("SongEncoder, values rows", lambda: SongEncoder(request).encode_many(rows)),
+        ]
+        baseline = None
+        self.stdout.write(f"Serializing {len(songs)} songs with absolute URLs")
+        for label, fn in cases:
+            stats = summarize(measure(fn, options["repeat"]))
+            baseline = baseline or stats["mean_ms"]
+            self.stdout.write(f"{format_row(label, stats)}   {baseline / stats['mean_ms']:5.1f}x")
@@ -0,0 +1,72 @@
+import os
+import random
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import FileSystemStorage
+from django.core.management.base import BaseCommand
+from django.test import RequestFactory
+from django.views.static import serve
+
+from users.streaming import media_response
+
+from ._bench import format_row, summarize
+
+
+class Command(BaseCommand):
+    help = "Benchmark concurrent seeks: ranged streaming vs whole-file static serving."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--size-mb", type=int, default=8)
+        parser.add_argument("--range-kb", type=int, default=256)
+        parser.add_argument("--requests", type=int, default=400)
+        parser.add_argument("--concurrency", type=int, default=16)
+
+    def handle(self, *args, **options):
+        size = options["size_mb"] * 1024 * 1024
+        span = options["range_kb"] * 1024
+        rng = random.Random(11)
+        factory = RequestFactory()
+
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, "songs"))
+            with open(os.path.join(root, "songs", "bench.mp3"), "wb") as fh:
+                fh.write(os.urandom(size))
+            storage = FileSystemStorage(location=root)
+            offsets = [rng.randrange(0, size - span) for _ in range(options["requests"])]
+
+            def ranged(offset):
+                request = factory.get("/", HTTP_RANGE=f"bytes={offset}-{offset + span - 1}")
+                return media_response(request, storage, "songs/bench.mp3")
+
+            def whole_file(offset):
+                # What DEBUG static serving does: every seek re-sends the file.
+                return serve(factory.get("/"), "songs/bench.mp3", document_root=root)
+
+            self.stdout.write(
+                f"{options['requests']} seeks of {options['range_kb']} KiB into a "
+                f"{options['size_mb']} MiB file, {options['concurrency']} concurrent clients"
+            )
+            for label, handler in (("static serve (whole file)", whole_file), ("ranged stream (206)", ranged)):
+                latencies, sent, elapsed = self.run(handler, offsets, options["concurrency"])
+                stats = summarize(latencies)
+                self.stdout.write(
+                    f"{format_row(label, stats)}   {len(offsets) / elapsed:8.0f} seeks/s   "
+                    f"{sent / 1e6:8.1f} MB sent"
+                )
+
+    @staticmethod
+    def run(handler, offsets, concurrency):
+        def one(offset):
+            start = time.perf_counter()
+            response = handler(offset)
+            sent = sum(len(chunk) for chunk in response.streaming_content)
+            response.close()
+            return time.perf_counter() - start, sent
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=concurrency) as pool:
+            results = list(pool.map(one, offsets))
+        elapsed = time.perf_counter() - start
+        return [r[0] for r in results], sum(r[1] for r in results), elapsed
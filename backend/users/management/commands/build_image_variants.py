@@ -0,0 +1,40 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from PIL import Image, UnidentifiedImageError
+
+from users.images import generate_variants
+from users.models import Playlist, Song, UserProfile
+
+
+class Command(BaseCommand):
+    help = "Build thumb/medium/large (+WebP) variants for existing covers and profile pictures."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--workers", type=int, default=4)
+        parser.add_argument("--force", action="store_true", help="Rebuild variants that are up to date.")
+
+    def handle(self, *args, **options):
+        names = set()
+        for model, field in ((Song, "cover"), (Playlist, "cover"), (UserProfile, "profile_picture")):
+            names.update(model.objects.exclude(**{field: ""}).exclude(**{f"{field}__isnull": True})
+                         .values_list(field, flat=True))
+
+        def build(name):
+            try:
+                return name, len(generate_variants(name, force=options["force"])), None
+            except (OSError, UnidentifiedImageError, Image.DecompressionBombError) as exc:
+                return name, 0, exc
+
+        built = skipped = failed = 0
+        # Pillow releases the GIL while decoding/resizing, so threads scale.
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool:
+            for name, written, error in pool.map(build, sorted(names)):
+                if error is not None:
+                    failed += 1
+                    self.stderr.write(f"{name}: {error}")
+                elif written:
+                    built += 1
+                else:
+                    skipped += 1
+        self.stdout.write(f"{built} built, {skipped} up to date, {failed} failed ({len(names)} images)")
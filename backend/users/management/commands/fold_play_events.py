@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from users.plays import fold_play_events, FOLD_BATCH_SIZE
+
+
+class Command(BaseCommand):
+    help = "Fold pending PlayEvent rows into UserProfile listening stats."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=FOLD_BATCH_SIZE)
+
+    def handle(self, *args, **options):
+        folded = fold_play_events(batch_size=options["batch_size"])
+        self.stdout.write(f"Folded {folded} play events.")
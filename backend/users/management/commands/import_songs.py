@@ -0,0 +1,235 @@
+import csv
+import filecmp
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from itertools import islice
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from users.cache import bump_catalog_version, catalog_cache_is_shared
+from users.models import Song
+
+AUDIO_EXTENSIONS = (".mp3", ".wav", ".ogg", ".oga", ".flac", ".m4a", ".aac", ".opus", ".webm")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".webp", ".gif")
+COPY_BUFFER_SIZE = 1024 * 1024
+
+_EMOTIONS = {value.lower(): value for value, _ in Song.EMOTIONS}
+_LANGUAGES = {value.lower(): value for value, _ in Song.LANGUAGES}
+
+
+def read_manifest(path):
+    """Yield manifest rows as dicts from a CSV (with header) or JSONL file."""
+    with open(path, newline="", encoding="utf-8") as fh:
+        if path.endswith((".jsonl", ".ndjson")):
+            for line in fh:
+                if line.strip():
+                    yield json.loads(line)
+        else:
+            yield from csv.DictReader(fh)
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk-import songs from a CSV/JSONL manifest (title, artist, file, cover, emotion, language). "
+        "Paths are relative to --media-dir. Interrupted imports resume from a checkpoint file."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("manifest")
+        parser.add_argument("--media-dir", required=True, help="Directory the manifest's file/cover paths are relative to.")
+        parser.add_argument("--batch-size", type=int, default=1000)
+        parser.add_argument("--workers", type=int, default=8, help="Threads for validation and file copies.")
+        parser.add_argument("--checkpoint", help="Default: <manifest>.checkpoint")
+        parser.add_argument("--restart", action="store_true", help="Ignore an existing checkpoint.")
+        parser.add_argument(
+            "--local-cache", action="store_true",
+            help="Import although the catalog cache is process-local; running servers must then be restarted.",
+        )
+
+    def handle(self, *args, **options):
+        manifest = options["manifest"]
+        if not os.path.isfile(manifest):
+            raise CommandError(f"Manifest {manifest} not found")
+        shared_cache = catalog_cache_is_shared()
+        if not shared_cache and not options["local_cache"]:
+            raise CommandError(
+                "The catalog cache is process-local, so running servers would never see the import. "
+                "Set CATALOG_CACHE_BACKEND=file or redis, or pass --local-cache and restart the servers afterwards."
+            )
+        self.media_dir = os.path.abspath(options["media_dir"])
+        self.storage = Song._meta.get_field("src").storage
+        checkpoint_path = options["checkpoint"] or f"{manifest}.checkpoint"
+        rejects_path = f"{manifest}.rejects.jsonl"
+        stat = os.stat(manifest)
+        fingerprint = {"size": stat.st_size, "mtime_ns": stat.st_mtime_ns}
+
+        done = 0
+        if os.path.exists(checkpoint_path) and not options["restart"]:
+            with open(checkpoint_path) as fh:
+                checkpoint = json.load(fh)
+            if checkpoint.get("manifest") != fingerprint:
+                raise CommandError(f"{manifest} changed since {checkpoint_path} was written; use --restart")
+            done = checkpoint["rows"]
+            self.stdout.write(f"Resuming after row {done}")
+
+        rows = islice(read_manifest(manifest), done, None)
+        imported = skipped = rejected = 0
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=options["workers"]) as pool, \
+                open(rejects_path, "a" if done else "w", encoding="utf-8") as rejects:
+            while True:
+                batch = list(islice(rows, options["batch_size"]))
+                if not batch:
+                    break
+                valid = []
+                for row_number, (clean, error) in enumerate(pool.map(self.validate, batch), start=done + 1):
+                    if error:
+                        rejected += 1
+                        rejects.write(json.dumps({"row": row_number, "error": error, "data": batch[row_number - done - 1]}) + "\n")
+                    else:
+                        valid.append(clean)
+                added, dupes = self.import_batch(pool, valid)
+                imported += added
+                skipped += dupes
+                done += len(batch)
+                self.write_checkpoint(checkpoint_path, fingerprint, done)
+                elapsed = time.perf_counter() - start
+                self.stdout.write(f"{done} rows: {imported} imported, {skipped} existing, {rejected} rejected "
+                                  f"({(imported + skipped + rejected) / elapsed:.0f} rows/s)")
+
+        if imported:
+            # bulk_create sends no post_save signals. Bumping the (shared) catalog
+            # version invalidates cached responses and makes running servers
+            # rebuild their search index and recommender features.
+            bump_catalog_version()
+        elapsed = time.perf_counter() - start
+        total = imported + skipped + rejected
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {imported} imported, {skipped} already present, {rejected} rejected "
+            f"in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.0f} rows/s)."
+        ))
+        if rejected:
+            self.stdout.write(f"Rejected rows: {rejects_path}")
+        if imported and not shared_cache:
+            self.stdout.write(self.style.WARNING("Restart running servers to pick up the imported songs."))
+        if imported:
+            self.stdout.write("Run analyze_songs and build_image_variants to precompute audio metadata and covers.")
+
+    # ---------------- Validation ---------------- #
+    def validate(self, row):
+        """(cleaned row, None) or (None, error message). Runs in worker threads."""
+        title = (row.get("title") or "").strip()
+        artist = (row.get("artist") or "").strip()
+        if not title or not artist:
+            return None, "title and artist are required"
+        if len(title) > 255 or len(artist) > 255:
+            return None, "title/artist longer than 255 characters"
+
+        clean = {"title": title, "artist": artist}
+        for field, choices in (("emotion", _EMOTIONS), ("language", _LANGUAGES)):
+            value = (row.get(field) or "").strip()
+            if value and value.lower() not in choices:
+                return None, f"unknown {field} {value!r}"
+            clean[field] = choices.get(value.lower()) if value else None
+
+        for field, upload_to, extensions, required in (("file", "songs/", AUDIO_EXTENSIONS, True),
+                                                       ("cover", "song_covers/", IMAGE_EXTENSIONS, False)):
+            relative = (row.get(field) or "").strip()
+            if not relative:
+                if required:
+                    return None, f"{field} is required"
+                clean[field] = None
+                continue
+            source = os.path.abspath(os.path.join(self.media_dir, relative))
+            if not source.startswith(self.media_dir + os.sep):
+                return None, f"{field} is outside the media directory"
+            if not source.lower().endswith(extensions):
+                return None, f"unsupported {field} type {os.path.splitext(source)[1]!r}"
+            if not os.path.isfile(source):
+                return None, f"{field} {relative!r} not found"
+            clean[field] = (source, upload_to + os.path.basename(source))
+        return clean, None
+
+    # ---------------- Copy & Insert ---------------- #
+    def copy(self, job):
+        """Copy one file into storage; reuses an identical file left by an earlier run."""
+        source, name = job
+        path = self.storage.path(name)
+        if os.path.exists(path):
+            # Byte-for-byte: a different file from a later batch or run can
+            # share the basename and size of one already stored.
+            if filecmp.cmp(path, source, shallow=False):
+                return name
+            name = self.storage.get_available_name(name)
+            path = self.storage.path(name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), suffix=".part")
+        try:
+            with open(source, "rb") as src, os.fdopen(fd, "wb") as dst:
+                shutil.copyfileobj(src, dst, COPY_BUFFER_SIZE)
+            os.replace(tmp, path)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        return name
+
+    def claim_storage_names(self, rows):
+        """
+        Give every distinct source file in a batch its own storage name, so
+        parallel copies never write the same path. The first file keeps
+        upload_to/<basename>; others get a suffix derived from their manifest
+        path, which stays the same when an interrupted import is resumed.
+        """
+        owners = {}
+        for row in rows:
+            for field in ("file", "cover"):
+                if not row[field]:
+                    continue
+                source, name = row[field]
+                if owners.setdefault(name, source) != source:
+                    stem, ext = os.path.splitext(name)
+                    digest = hashlib.sha1(os.path.relpath(source, self.media_dir).encode()).hexdigest()[:8]
+                    name = f"{stem}_{digest}{ext}"
+                    owners.setdefault(name, source)
+                    row[field] = (source, name)
+
+    def import_batch(self, pool, rows):
+        """Copy files and insert one batch; returns (inserted, already present)."""
+        if not rows:
+            return 0, 0
+        self.claim_storage_names(rows)
+        # Resume safety: rows whose audio is already in the catalog were
+        # committed by a run that died before writing its checkpoint.
+        names = [row["file"][1] for row in rows]
+        existing = set(Song.objects.filter(src__in=names).values_list("src", "title", "artist"))
+        fresh = [row for row in rows if (row["file"][1], row["title"], row["artist"]) not in existing]
+
+        jobs = list(dict.fromkeys(row[field] for row in fresh for field in ("file", "cover") if row[field]))
+        stored = dict(zip(jobs, pool.map(self.copy, jobs)))
+        songs = [
+            Song(
+                title=row["title"],
+                artist=row["artist"],
+                src=stored[row["file"]],
+                cover=stored[row["cover"]] if row["cover"] else None,
+                emotion=row["emotion"],
+                language=row["language"],
+            )
+            for row in fresh
+        ]
+        with transaction.atomic():
+            Song.objects.bulk_create(songs, batch_size=500)
+        return len(songs), len(rows) - len(fresh)
+
+    @staticmethod
+    def write_checkpoint(path, fingerprint, rows):
+        tmp = f"{path}.tmp"
+        with open(tmp, "w") as fh:
+            json.dump({"manifest": fingerprint, "rows": rows}, fh)
+        os.replace(tmp, path)
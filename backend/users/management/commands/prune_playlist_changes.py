@@ -0,0 +1,14 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from users.changelog import prune_changes
+
+
+class Command(BaseCommand):
+    help = "Delete playlist change log entries older than PLAYLIST_CHANGELOG_RETENTION_DAYS (run daily)."
+
+    def handle(self, *args, **options):
+        deleted = prune_changes()
+        self.stdout.write(
+            f"{deleted} change log entries older than {settings.PLAYLIST_CHANGELOG_RETENTION_DAYS} days deleted"
+        )
@@ -0,0 +1,23 @@
+from django.core.management.base import BaseCommand
+
+from users.models import Playlist
+from users.ordering import REBALANCE_LENGTH, playlists_needing_rebalance, rebalance
+
+
+class Command(BaseCommand):
+    help = f"Respace playlist rank keys that grew past {REBALANCE_LENGTH} characters (order is kept)."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--playlist", type=int, action="append", help="Only these playlist ids (repeatable)")
+        parser.add_argument("--all", action="store_true", help="Rebalance every playlist, not just dense ones")
+
+    def handle(self, *args, **options):
+        if options["playlist"]:
+            playlist_ids = options["playlist"]
+        elif options["all"]:
+            playlist_ids = list(Playlist.objects.values_list("id", flat=True))
+        else:
+            playlist_ids = list(playlists_needing_rebalance())
+
+        rows = sum(rebalance(playlist_id) for playlist_id in playlist_ids)
+        self.stdout.write(f"{len(playlist_ids)} playlists rebalanced, {rows} rank keys rewritten")
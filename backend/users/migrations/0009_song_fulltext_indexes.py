@@ -0,0 +1,33 @@
+from django.db import migrations
+
+# FULLTEXT indexes back the database search fallback (users/search_index.py)
+# while the in-memory index is cold. They only exist on MySQL.
+FULLTEXT_INDEXES = {
+    "users_song_title_ft": "title",
+    "users_song_artist_ft": "artist",
+}
+
+
+def add_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    for name, column in FULLTEXT_INDEXES.items():
+        schema_editor.execute(f"CREATE FULLTEXT INDEX {name} ON users_song ({column})")
+
+
+def drop_fulltext_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != "mysql":
+        return
+    for name in FULLTEXT_INDEXES:
+        schema_editor.execute(f"DROP INDEX {name} ON users_song")
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0008_playlist_cover_playlist_updated_at_playlistactivity'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_fulltext_indexes, drop_fulltext_indexes),
+    ]
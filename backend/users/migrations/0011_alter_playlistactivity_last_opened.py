@@ -0,0 +1,19 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:31
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0010_playevent_userprofile_last_played_language'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='playlistactivity',
+            name='last_opened',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+    ]
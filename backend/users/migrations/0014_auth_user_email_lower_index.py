@@ -0,0 +1,26 @@
+from django.db import migrations, models
+from django.db.models.functions import Lower
+
+# auth_user belongs to django.contrib.auth, so the index is created with
+# the schema editor rather than declared on the model.
+INDEX = models.Index(Lower("email"), name="auth_user_email_lower_idx")
+
+
+def add_index(apps, schema_editor):
+    schema_editor.add_index(apps.get_model("auth", "User"), INDEX)
+
+
+def remove_index(apps, schema_editor):
+    schema_editor.remove_index(apps.get_model("auth", "User"), INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auth', '0012_alter_user_first_name_max_length'),
+        ('users', '0013_song_audio_analysis'),
+    ]
+
+    operations = [
+        migrations.RunPython(add_index, remove_index),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.2.5 on 2026-10-16 22:56
+
+import django.db.models.functions.text
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0014_auth_user_email_lower_index'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(django.db.models.functions.text.Lower('artist'), name='song_artist_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(django.db.models.functions.text.Lower('emotion'), name='song_emotion_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(django.db.models.functions.text.Lower('language'), name='song_language_lower_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='song',
+            index=models.Index(fields=['language'], name='song_language_idx'),
+        ),
+    ]
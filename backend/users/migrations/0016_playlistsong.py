@@ -0,0 +1,82 @@
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Playlist.songs keeps its table: the auto-created M2M table becomes the
+# explicit PlaylistSong model (state only), then gains a rank column filled
+# in the order the songs were added (row id).
+
+# Frozen copy of users.ordering.spread_ranks as of this migration, so later
+# changes to the live key scheme can't change what this migration writes.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+STEP_WIDTH = 2
+
+
+def _to_key(value, width):
+    key = ""
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        key = DIGITS[digit] + key
+    return key.rstrip("0")
+
+
+def spread_ranks(count):
+    width = STEP_WIDTH
+    while BASE ** width // 2 < (count + 1) * BASE:
+        width += 1
+    step = BASE ** width // 2 // (count + 1)
+    return [_to_key(step * (i + 1), width) for i in range(count)]
+
+
+def assign_ranks(apps, schema_editor):
+    PlaylistSong = apps.get_model("users", "PlaylistSong")
+    entries = {}
+    for entry in PlaylistSong.objects.order_by("playlist_id", "id").only("id", "playlist_id"):
+        entries.setdefault(entry.playlist_id, []).append(entry)
+    for rows in entries.values():
+        for entry, key in zip(rows, spread_ranks(len(rows))):
+            entry.rank = key
+        PlaylistSong.objects.bulk_update(rows, ["rank"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0015_song_lookup_indexes'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.CreateModel(
+                    name='PlaylistSong',
+                    fields=[
+                        ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                        ('playlist', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='entries', to='users.playlist')),
+                        ('song', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='playlist_entries', to='users.song')),
+                    ],
+                    options={
+                        'db_table': 'users_playlist_songs',
+                        'ordering': ['playlist', 'rank'],
+                        'unique_together': {('playlist', 'song')},
+                    },
+                ),
+                migrations.AlterField(
+                    model_name='playlist',
+                    name='songs',
+                    field=models.ManyToManyField(blank=True, related_name='playlists', through='users.PlaylistSong', to='users.song'),
+                ),
+            ],
+        ),
+        migrations.AddField(
+            model_name='playlistsong',
+            name='rank',
+            field=models.CharField(default='', max_length=64),
+            preserve_default=False,
+        ),
+        migrations.RunPython(assign_ranks, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='playlistsong',
+            index=models.Index(fields=['playlist', 'rank'], name='playlistsong_rank_idx'),
+        ),
+    ]
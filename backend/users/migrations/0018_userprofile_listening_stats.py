@@ -0,0 +1,50 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:14
+
+import time
+
+from django.db import migrations, models
+
+# Existing all-time counters seed the decayed stats as if played now, and
+# artist_stats is cut down to its ALL_TIME_ARTISTS biggest entries.
+# Frozen copies of users.listening as of this migration:
+DIMENSIONS = ("emotion", "artist", "language")
+CAPACITY = {"emotion": 16, "artist": 50, "language": 16}
+ALL_TIME_ARTISTS = 200
+
+
+def seed_from_counts(emotion_stats, artist_stats, language_stats, at):
+    stats = {"landmark": at}
+    for dimension, counts in zip(DIMENSIONS, (emotion_stats, artist_stats, language_stats)):
+        top = sorted((counts or {}).items(), key=lambda item: item[1], reverse=True)[:CAPACITY[dimension]]
+        stats[dimension] = {key: float(count) for key, count in top}
+    return stats
+
+
+def seed_listening_stats(apps, schema_editor):
+    UserProfile = apps.get_model("users", "UserProfile")
+    now = time.time()
+    profiles = list(UserProfile.objects.only("id", "emotion_stats", "artist_stats", "language_stats"))
+    for profile in profiles:
+        artists = profile.artist_stats or {}
+        if len(artists) > ALL_TIME_ARTISTS:
+            profile.artist_stats = dict(sorted(artists.items(), key=lambda item: item[1], reverse=True)[:ALL_TIME_ARTISTS])
+        profile.listening_stats = seed_from_counts(
+            profile.emotion_stats, profile.artist_stats, profile.language_stats, now,
+        )
+    UserProfile.objects.bulk_update(profiles, ["artist_stats", "listening_stats"], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0017_playlistchange'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='userprofile',
+            name='listening_stats',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+        migrations.RunPython(seed_listening_stats, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.5 on 2026-10-16 23:40
+
+from django.db import migrations
+
+
+def drop_folded_events(apps, schema_editor):
+    """Rows already folded into UserProfile stats are spent; remove them."""
+    PlayEvent = apps.get_model("users", "PlayEvent")
+    PlayEvent.objects.filter(folded=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('users', '0018_userprofile_listening_stats'),
+    ]
+
+    operations = [
+        migrations.RunPython(drop_folded_events, migrations.RunPython.noop),
+        migrations.RemoveIndex(
+            model_name='playevent',
+            name='playevent_folded_idx',
+        ),
+        migrations.RemoveField(
+            model_name='playevent',
+            name='folded',
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from django.db.models.functions import Lower
 from django.contrib.auth.models import User
 from django.utils.timezone import now
 
@@ -29,6 +30,24 @@ class Song(models.Model):
     emotion = models.CharField(max_length=20, choices=EMOTIONS, blank=True, null=True)
     language = models.CharField(max_length=20, choices=LANGUAGES, blank=True, null=True)
 
+    # Filled in by the audio analysis pipeline (see audio.py)
+    duration = models.FloatField(blank=True, null=True)        # seconds
+    sample_rate = models.PositiveIntegerField(blank=True, null=True)  # Hz
+    bitrate = models.PositiveIntegerField(blank=True, null=True)      # kbps, file average
+    loudness_db = models.FloatField(blank=True, null=True)     # RMS, dBFS
+    waveform = models.BinaryField(blank=True, null=True)       # one uint8 peak per point
+    analyzed_src = models.CharField(max_length=255, blank=True, default="", editable=False)
+
+    class Meta:
+        # Tile clicks match on the lower-cased columns (see views.songs_by_*),
+        # the recommender filters on the exact language.
+        indexes = [
+            models.Index(Lower("artist"), name="song_artist_lower_idx"),
+            models.Index(Lower("emotion"), name="song_emotion_lower_idx"),
+            models.Index(Lower("language"), name="song_language_lower_idx"),
+            models.Index(fields=["language"], name="song_language_idx"),
+        ]
+
     def __str__(self):
         return f"{self.title} by {self.artist}"
 
@@ -44,7 +63,7 @@ class Song(models.Model):
 class Playlist(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="playlists")
     name = models.CharField(max_length=255)
-    songs = models.ManyToManyField(Song, blank=True, related_name="playlists")
+    songs = models.ManyToManyField(Song, blank=True, related_name="playlists", through="PlaylistSong")
     cover = models.ImageField(upload_to="playlist_covers/", blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)  # Optional: for sorting by last update
@@ -54,17 +73,29 @@ class Playlist(models.Model):
 
     # 🔑 New helper: log an "open" activity
     def log_activity(self, user):
-        """Record that a user opened this playlist."""
-        activity, created = PlaylistActivity.objects.get_or_create(
-            user=user,
-            playlist=self,
-            defaults={"last_opened": now(), "open_count": 1},
-        )
-        if not created:
-            activity.open_count += 1
-            activity.last_opened = now()
-            activity.save()
-        return activity
+        """Record that a user opened this playlist (buffered, see activity_buffer.py)."""
+        from .activity_buffer import open_buffer
+        open_buffer.record(user.id, self.id, now())
+
+
+# ---------------- Playlist Entries ---------------- #
+class PlaylistSong(models.Model):
+    """
+    One song in a playlist. `rank` is a fractional key (see ordering.py):
+    playlists list songs in rank order and a move rewrites a single row.
+    """
+    playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name="entries")
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="playlist_entries")
+    rank = models.CharField(max_length=64)
+
+    class Meta:
+        db_table = "users_playlist_songs"   # the table Django created for the plain M2M
+        unique_together = ("playlist", "song")
+        indexes = [models.Index(fields=["playlist", "rank"], name="playlistsong_rank_idx")]
+        ordering = ["playlist", "rank"]
+
+    def __str__(self):
+        return f"{self.playlist_id}:{self.rank} {self.song_id}"
 
 
 # ---------------- Playlist Activity ---------------- #
@@ -75,7 +106,7 @@ class PlaylistActivity(models.Model):
     """
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="playlist_activities")
     playlist = models.ForeignKey(Playlist, on_delete=models.CASCADE, related_name="activities")
-    last_opened = models.DateTimeField(auto_now=True)
+    last_opened = models.DateTimeField(default=now)  # set explicitly by the open buffer
     open_count = models.PositiveIntegerField(default=0)
 
     class Meta:
@@ -86,6 +117,35 @@ class PlaylistActivity(models.Model):
         return f"{self.user.username} - {self.playlist.name}"
 
 
+# ---------------- Playlist Change Log ---------------- #
+class PlaylistChange(models.Model):
+    """
+    Append-only per-user log of playlist edits, read by the sync endpoint
+    (see changelog.py). playlist_id is a plain column so entries outlive
+    the playlists they describe.
+    """
+    CREATED = "created"
+    UPDATED = "updated"
+    DELETED = "deleted"
+    SONGS_ADDED = "songs_added"
+    SONGS_REMOVED = "songs_removed"
+    SONGS_MOVED = "songs_moved"
+    OPENED = "opened"
+    KINDS = [(kind, kind) for kind in (CREATED, UPDATED, DELETED, SONGS_ADDED, SONGS_REMOVED, SONGS_MOVED, OPENED)]
+
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="playlist_changes")
+    playlist_id = models.BigIntegerField()
+    kind = models.CharField(max_length=16, choices=KINDS)
+    song_ids = models.JSONField(default=list, blank=True)
+    created_at = models.DateTimeField(default=now, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=["user", "id"], name="playlistchange_user_idx")]
+
+    def __str__(self):
+        return f"{self.user_id} {self.kind} {self.playlist_id}"
+
+
 # ---------------- User Profile ---------------- #
 def user_directory_path(instance, filename):
     """
@@ -96,17 +156,34 @@ def user_directory_path(instance, filename):
 
 
 class UserProfile(models.Model):
+    PICTURE_READY = "ready"
+    PICTURE_PENDING = "pending"
+    PICTURE_FAILED = "failed"
+    PICTURE_STATUSES = [
+        (PICTURE_READY, "Ready"),
+        (PICTURE_PENDING, "Pending"),
+        (PICTURE_FAILED, "Failed"),
+    ]
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name="profile")
     profile_picture = models.ImageField(
         upload_to=user_directory_path,
         blank=True,
         null=True
     )
+    # Uploads are processed in the background (see uploads.py); clients poll the status
+    profile_picture_status = models.CharField(max_length=10, choices=PICTURE_STATUSES, default=PICTURE_READY)
+    profile_picture_job = models.CharField(max_length=64, blank=True, default="")  # newest upload wins
 
     # Track plays
     emotion_stats = models.JSONField(default=dict)   # e.g., {"Happiness": 5, "Sadness": 2}
     artist_stats = models.JSONField(default=dict)    # e.g., {"Artist Name": 10}
     language_stats = models.JSONField(default=dict)  # e.g., {"English": 7, "Hindi": 3}
+    # Same plays, fading with a half-life and capped per dimension (see listening.py)
+    listening_stats = models.JSONField(default=dict, blank=True)
+
+    # Most recently played language (strong bias for recommendations)
+    last_played_language = models.CharField(max_length=20, blank=True, null=True)
 
     # ---------------- Harmoura Portrait ---------------- #
     portrait_data = models.JSONField(default=list, blank=True)
@@ -120,3 +197,18 @@ class UserProfile(models.Model):
         if self.profile_picture and hasattr(self.profile_picture, "url"):
             return self.profile_picture.url
         return None
+
+
+# ---------------- Play Events ---------------- #
+class PlayEvent(models.Model):
+    """
+    Append-only log of song plays. play_song only inserts rows here;
+    users/plays.py folds them into UserProfile stats in batches and
+    deletes them in the same transaction.
+    """
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name="play_events")
+    song = models.ForeignKey(Song, on_delete=models.CASCADE, related_name="play_events")
+    played_at = models.DateTimeField(default=now)
+
+    def __str__(self):
+        return f"{self.user.username} played {self.song_id}"
@@ -0,0 +1,255 @@
+import logging
+
+from django.db import transaction
+from django.db.models import Max, Prefetch
+from django.db.models.functions import Length
+from django.utils.timezone import now
+
+from . import tasks
+from .changelog import record_change
+from .models import Playlist, PlaylistChange, PlaylistSong, Song
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Playlist Rank Keys ---------------- #
+# Songs in a playlist are ordered by a string rank key read as a base-36
+# fraction (0.<digits>). A key can always be found between two others, so a
+# move rewrites one row. Digits and lower-case letters only: they sort the
+# same under binary and case-insensitive MySQL collations. Keys never end
+# in "0", which keeps room below every key.
+DIGITS = "0123456789abcdefghijklmnopqrstuvwxyz"
+BASE = len(DIGITS)
+STEP_WIDTH = 2         # appends/prepends step the first two digits: 1296 slots
+REBALANCE_LENGTH = 24  # keys longer than this trigger a rebalance
+
+
+def _to_key(value, width):
+    key = ""
+    for _ in range(width):
+        value, digit = divmod(value, BASE)
+        key = DIGITS[digit] + key
+    return key.rstrip("0")
+
+
+def _midpoint(low, high):
+    """Key strictly between low ("" = 0) and high (None = 1)."""
+    if high is not None:
+        n = 0
+        while n < len(high) and (low[n] if n < len(low) else "0") == high[n]:
+            n += 1
+        if n:
+            return high[:n] + _midpoint(low[n:], high[n:])
+    lo = DIGITS.index(low[0]) if low else 0
+    hi = DIGITS.index(high[0]) if high is not None else BASE
+    if hi - lo > 1:
+        return DIGITS[(lo + hi) // 2]
+    if high is not None and len(high) > 1:
+        return high[0]
+    return DIGITS[lo] + _midpoint(low[1:], None)
+
+
+def rank_between(before=None, after=None):
+    """A key sorting strictly between `before` and `after` (None = open end)."""
+    if before is not None and after is not None and before >= after:
+        raise ValueError(f"{before!r} must sort before {after!r}")
+    if after is None and before:
+        # Appends step by one slot instead of halving, so keys stay short
+        head = int(before[:STEP_WIDTH].ljust(STEP_WIDTH, "0"), BASE) + 1
+        if head < BASE ** STEP_WIDTH:
+            return _to_key(head, STEP_WIDTH)
+    if before is None and after:
+        head = int(after[:STEP_WIDTH].ljust(STEP_WIDTH, "0"), BASE) - 1
+        if head > 0:
+            return _to_key(head, STEP_WIDTH)
+    return _midpoint(before or "", after)
+
+
+def ranks_between(before, after, count):
+    """`count` ascending keys between `before` and `after`, balanced so they stay short."""
+    if count <= 0:
+        return []
+    if before is None and after is None:
+        return spread_ranks(count)
+    if after is None:
+        start = int(before[:STEP_WIDTH].ljust(STEP_WIDTH, "0"), BASE)
+        if start + count < BASE ** STEP_WIDTH:
+            return [_to_key(start + i + 1, STEP_WIDTH) for i in range(count)]
+    middle = rank_between(before, after)
+    left = (count - 1) // 2
+    return [*ranks_between(before, middle, left), middle, *ranks_between(middle, after, count - 1 - left)]
+
+
+def spread_ranks(count):
+    """
+    `count` evenly spaced keys in the lower half of the key space, leaving
+    room to insert between any two and plenty of slots for appends.
+    """
+    width = STEP_WIDTH
+    while BASE ** width // 2 < (count + 1) * BASE:
+        width += 1
+    step = BASE ** width // 2 // (count + 1)
+    return [_to_key(step * (i + 1), width) for i in range(count)]
+
+
+# ---------------- Playlist Reads ---------------- #
+def ordered_songs(lookup="songs"):
+    """Prefetch a playlist's songs in rank order, e.g. prefetch_related(ordered_songs("playlist__songs"))."""
+    return Prefetch(lookup, queryset=Song.objects.order_by("playlist_entries__rank"))
+
+
+# ---------------- Playlist Writes ---------------- #
+def append_songs(playlist, song_ids):
+    """Add songs (in the given order) after the playlist's last song; returns the ids added."""
+    existing = set(PlaylistSong.objects.filter(playlist=playlist, song_id__in=song_ids)
+                   .values_list("song_id", flat=True))
+    new_ids = [song_id for song_id in dict.fromkeys(song_ids) if song_id not in existing]
+    if not new_ids:
+        return []
+    last = PlaylistSong.objects.filter(playlist=playlist).aggregate(last=Max("rank"))["last"]
+    keys = ranks_between(last, None, len(new_ids))
+    PlaylistSong.objects.bulk_create([
+        PlaylistSong(playlist=playlist, song_id=song_id, rank=key) for song_id, key in zip(new_ids, keys)
+    ])
+    touch_playlist(playlist, keys[-1])
+    record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_ADDED, new_ids)
+    return new_ids
+
+
+def remove_songs(playlist, song_ids):
+    """Take songs out of the playlist; returns the ids that were in it."""
+    entries = PlaylistSong.objects.filter(playlist=playlist, song_id__in=song_ids)
+    removed = list(entries.values_list("song_id", flat=True))
+    if not removed:
+        return []
+    entries.delete()
+    touch_playlist(playlist)
+    record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_REMOVED, removed)
+    return removed
+
+
+def set_songs(playlist, song_ids):
+    """Replace the playlist's songs with `song_ids`, in that order."""
+    song_ids = list(dict.fromkeys(song_ids))
+    entries = PlaylistSong.objects.filter(playlist=playlist)
+    removed = set(entries.values_list("song_id", flat=True)) - set(song_ids)
+    entries.delete()
+    PlaylistSong.objects.bulk_create([
+        PlaylistSong(playlist=playlist, song_id=song_id, rank=key)
+        for song_id, key in zip(song_ids, spread_ranks(len(song_ids)))
+    ])
+    touch_playlist(playlist)
+    if removed:
+        record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_REMOVED, sorted(removed))
+    if song_ids:
+        # Kept songs are re-ranked too, so they count as (re-)added
+        record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_ADDED, song_ids)
+
+
+def _place(playlist, song_id, before_id, after_id):
+    """
+    Write one move. Returns (new key, None), or (new key, every song id in
+    playlist order) when the playlist had to be rebalanced first.
+    """
+    ranks = dict(PlaylistSong.objects.filter(
+        playlist=playlist, song_id__in=[i for i in (song_id, before_id, after_id) if i is not None],
+    ).values_list("song_id", "rank"))
+    if song_id not in ranks or any(i is not None and i not in ranks for i in (before_id, after_id)):
+        raise LookupError("Song is not in this playlist")
+
+    entries = PlaylistSong.objects.filter(playlist=playlist).exclude(song_id=song_id)
+    low = ranks[after_id] if after_id is not None else None
+    high = ranks[before_id] if before_id is not None else None
+    # One neighbour given: the other is whatever sits next to it now
+    if low is not None and high is None:
+        high = entries.filter(rank__gt=low).order_by("rank").values_list("rank", flat=True).first()
+    elif high is not None and low is None:
+        low = entries.filter(rank__lt=high).order_by("-rank").values_list("rank", flat=True).first()
+    elif low is None and high is None:
+        high = entries.order_by("rank").values_list("rank", flat=True).first()
+    if low is not None and high is not None and low >= high:
+        raise ValueError("after_id must come before before_id")
+
+    key = rank_between(low, high)
+    if len(key) > REBALANCE_LENGTH:
+        # Respace now, inside the caller's transaction: a batch of moves after
+        # the same anchor grows the key a digit at a time and would outrun
+        # the rank column (64 chars) long before an on-commit rebalance ran.
+        respaced = [entry.song_id for entry in _respace(playlist.id)]
+        return _place(playlist, song_id, before_id, after_id)[0], respaced
+    PlaylistSong.objects.filter(playlist=playlist, song_id=song_id).update(rank=key)
+    return key, None
+
+
+def move_song(playlist, song_id, before_id=None, after_id=None):
+    """
+    Move one song between two neighbours (by song id; None = that end).
+    Only the moved row is written, unless its key would get too long and the
+    whole playlist is rebalanced first. Returns its new rank key.
+    """
+    key, respaced = _place(playlist, song_id, before_id, after_id)
+    touch_playlist(playlist)
+    record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_MOVED, respaced or [song_id])
+    return key
+
+
+def move_songs(playlist, moves):
+    """
+    Apply (song_id, before_id, after_id) moves in order and log them as one
+    change. Returns {song_id: final rank}; errors name the failing song.
+    """
+    ranks = {}
+    respaced = None
+    for song_id, before_id, after_id in moves:
+        try:
+            ranks[song_id], rebalanced = _place(playlist, song_id, before_id, after_id)
+        except (LookupError, ValueError) as exc:
+            raise type(exc)(f"move {song_id}: {exc}") from exc
+        respaced = rebalanced or respaced
+    if not ranks:
+        return ranks
+    if respaced:
+        # Earlier moves' keys were rewritten by the rebalance
+        current = dict(PlaylistSong.objects.filter(playlist=playlist, song_id__in=ranks)
+                       .values_list("song_id", "rank"))
+        ranks = {song_id: current[song_id] for song_id in ranks}
+    touch_playlist(playlist)
+    record_change(playlist.user_id, playlist.id, PlaylistChange.SONGS_MOVED, respaced or list(ranks))
+    return ranks
+
+
+def touch_playlist(playlist, new_key=None):
+    """Bump updated_at (the playlist ETag) and rebalance once keys get long."""
+    playlist.updated_at = now()
+    Playlist.objects.filter(id=playlist.id).update(updated_at=playlist.updated_at)
+    if new_key is not None and len(new_key) > REBALANCE_LENGTH:
+        playlist_id = playlist.id
+        transaction.on_commit(lambda: tasks.submit(rebalance, playlist_id))
+
+
+# ---------------- Rebalancing ---------------- #
+def _respace(playlist_id):
+    """Rewrite a playlist's keys evenly spaced, keeping the order; returns the entries in order."""
+    entries = list(PlaylistSong.objects.select_for_update()
+                   .filter(playlist_id=playlist_id).order_by("rank", "id").only("id", "song_id", "rank"))
+    for entry, key in zip(entries, spread_ranks(len(entries))):
+        entry.rank = key
+    PlaylistSong.objects.bulk_update(entries, ["rank"], batch_size=1000)
+    return entries
+
+
+def rebalance(playlist_id):
+    """Rewrite a playlist's keys evenly spaced, keeping the order. Returns rows written."""
+    with transaction.atomic():
+        entries = _respace(playlist_id)
+        owner = Playlist.objects.filter(id=playlist_id).values_list("user_id", flat=True).first()
+        if entries and owner is not None:
+            # Every key changed: synced clients need the new ranks
+            record_change(owner, playlist_id, PlaylistChange.SONGS_MOVED, [e.song_id for e in entries])
+    logger.info("Rebalanced %d rank keys in playlist %s", len(entries), playlist_id)
+    return len(entries)
+
+
+def playlists_needing_rebalance():
+    return PlaylistSong.objects.annotate(rank_length=Length("rank"))\
+        .filter(rank_length__gt=REBALANCE_LENGTH)\
+        .values_list("playlist_id", flat=True).distinct()
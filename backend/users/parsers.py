@@ -0,0 +1,30 @@
+import io
+import re
+
+from django.conf import settings
+from rest_framework.parsers import JSONParser
+
+from .renderers import fast_json_enabled, orjson
+
+
+# ---------------- Fast JSON Parsing ---------------- #
+# orjson reads integers wider than 64 bits as floats; bodies with a digit
+# run that long go through the stdlib so they stay exact ints.
+_LONG_NUMBER = re.compile(rb"\d{19}")
+
+
+class FastJSONParser(JSONParser):
+    """JSONParser that decodes UTF-8 bodies with orjson when available."""
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        parser_context = parser_context or {}
+        encoding = parser_context.get("encoding", settings.DEFAULT_CHARSET)
+        if not fast_json_enabled() or encoding.lower().replace("_", "-") not in ("utf-8", "utf8"):
+            return super().parse(stream, media_type, parser_context)
+        body = stream.read()
+        if not _LONG_NUMBER.search(body):
+            try:
+                return orjson.loads(body)
+            except orjson.JSONDecodeError:
+                pass  # let JSONParser report it (or accept what orjson can't)
+        return super().parse(io.BytesIO(body), media_type, parser_context)
@@ -0,0 +1,100 @@
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import transaction
+
+from . import tasks
+from .authentication import invalidate_profiles
+from .listening import ALL_TIME_ARTISTS, add_plays, capped_add
+from .models import PlayEvent, UserProfile
+
+# ---------------- Play Event Folding ---------------- #
+FOLD_BATCH_SIZE = 5000
+
+
+def record_play(user, song_id):
+    """Append a play event and schedule a fold shortly after commit."""
+    event = PlayEvent.objects.create(user=user, song_id=song_id)
+    transaction.on_commit(lambda: tasks.schedule(
+        "fold_play_events", fold_play_events, getattr(settings, "PLAY_FOLD_DELAY", 2.0),
+    ))
+    return event
+
+
+def _fold_batch(limit):
+    """Fold up to `limit` pending events in one transaction; return how many."""
+    with transaction.atomic():
+        events = list(
+            PlayEvent.objects.select_for_update(skip_locked=True, of=("self",))
+            .order_by("id")
+            .values_list("id", "user_id", "played_at", "song__emotion", "song__artist", "song__language")[:limit]
+        )
+        if not events:
+            return 0
+
+        deltas = defaultdict(lambda: {"emotion": Counter(), "artist": Counter(), "language": Counter()})
+        last_language = {}
+        plays = defaultdict(list)
+        for _id, user_id, played_at, emotion, artist, language in events:
+            user_deltas = deltas[user_id]
+            plays[user_id].append(
+                (played_at.timestamp(), {"emotion": emotion, "artist": artist, "language": language}),
+            )
+            if emotion:
+                user_deltas["emotion"][emotion] += 1
+            if artist:
+                user_deltas["artist"][artist] += 1
+            if language:
+                user_deltas["language"][language] += 1
+                # events arrive in id order, so the last one wins
+                last_language[user_id] = language
+
+        profiles = {
+            p.user_id: p
+            for p in UserProfile.objects.select_for_update().filter(user_id__in=deltas)
+        }
+        missing = [UserProfile(user_id=uid) for uid in deltas if uid not in profiles]
+        if missing:
+            UserProfile.objects.bulk_create(missing, ignore_conflicts=True)
+            profiles.update({
+                p.user_id: p
+                for p in UserProfile.objects.select_for_update().filter(user_id__in=[m.user_id for m in missing])
+            })
+
+        for user_id, user_deltas in deltas.items():
+            profile = profiles[user_id]
+            for field, delta in (("emotion_stats", user_deltas["emotion"]),
+                                 ("artist_stats", user_deltas["artist"]),
+                                 ("language_stats", user_deltas["language"])):
+                stats = getattr(profile, field) or {}
+                for key, count in delta.items():
+                    if field == "artist_stats":
+                        # Unbounded otherwise: one entry per artist ever played
+                        capped_add(stats, key, count, ALL_TIME_ARTISTS)
+                    else:
+                        stats[key] = stats.get(key, 0) + count
+                setattr(profile, field, stats)
+            profile.listening_stats = add_plays(profile.listening_stats or {}, plays[user_id])
+            if user_id in last_language:
+                profile.last_played_language = last_language[user_id]
+
+        UserProfile.objects.bulk_update(
+            profiles.values(),
+            ["emotion_stats", "artist_stats", "language_stats", "listening_stats", "last_played_language"],
+        )
+        # bulk_update sends no signals
+        user_ids = list(profiles)
+        transaction.on_commit(lambda: invalidate_profiles(*user_ids))
+        # Folded events are spent; deleting them here keeps the log bounded.
+        PlayEvent.objects.filter(id__in=[e[0] for e in events]).delete()
+        return len(events)
+
+
+def fold_play_events(batch_size=FOLD_BATCH_SIZE):
+    """Fold every pending play event into profile stats; return the count."""
+    total = 0
+    while True:
+        folded = _fold_batch(batch_size)
+        total += folded
+        if folded < batch_size:
+            return total
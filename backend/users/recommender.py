@@ -0,0 +1,171 @@
+import threading
+from collections import namedtuple
+
+import numpy as np
+
+from .cache import catalog_version
+from .models import Song
+
+# ---------------- Recommendation Engine ---------------- #
+# Songs are encoded once per catalog version as integer feature columns
+# (emotion, artist, language ids). A user's stats become dense weight
+# vectors over the same vocabularies, so scoring every song is a gather,
+# i.e. the dot product of each song's one-hot features with the weights.
+DEFAULT_K = 6
+MAX_K = 50
+DEFAULT_EMOTION_WEIGHT = 2.0
+DEFAULT_ARTIST_WEIGHT = 1.0
+DEFAULT_LANGUAGE_WEIGHT = 1.0
+LANGUAGE_BIAS_MODES = ("filter", "boost", "none")
+
+_Features = namedtuple("_Features", "version ids emotion artist language vocab")
+
+
+def _encode(values):
+    """Map a column of labels to int ids; None/'' get the last (zero-weight) slot."""
+    vocab = sorted({v for v in values if v})
+    index = {label: i for i, label in enumerate(vocab)}
+    missing = len(vocab)
+    codes = np.fromiter((index.get(v, missing) if v else missing for v in values),
+                        dtype=np.int32, count=len(values))
+    return codes, index
+
+
+def _weights(stats, index):
+    """Dense weight vector for one dimension, with a trailing zero slot."""
+    vec = np.zeros(len(index) + 1, dtype=np.float64)
+    for label, value in (stats or {}).items():
+        pos = index.get(label)
+        if pos is not None:
+            vec[pos] = value
+    return vec
+
+
+def top_language(language_stats, last_played_language=None):
+    """Language the legacy ranking restricts candidates to (None = no restriction)."""
+    if last_played_language:
+        return last_played_language
+    if language_stats:
+        return max(language_stats, key=language_stats.get)
+    return None
+
+
+def top_k(ids, scores, k):
+    """
+    Indices of the k best rows ordered by (score, id) descending, the same
+    order as the legacy full sort, using argpartition instead of a sort.
+    """
+    n = len(scores)
+    if n == 0 or k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if n > k:
+        kth = np.partition(scores, n - k)[n - k]
+        above = np.flatnonzero(scores > kth)
+        ties = np.flatnonzero(scores == kth)
+        need = k - len(above)
+        if len(ties) > need:
+            ties = ties[np.argpartition(-ids[ties], need - 1)[:need]]
+        chosen = np.concatenate((above, ties))
+    else:
+        chosen = np.arange(n)
+    order = np.lexsort((-ids[chosen], -scores[chosen]))
+    return chosen[order]
+
+
+class RecommendationEngine:
+    """Per-process song feature matrix, rebuilt when the catalog version changes."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._features = None
+
+    def current(self, version):
+        """The feature matrix if it was built for `version`, else None."""
+        features = self._features
+        return features if features is not None and features.version == version else None
+
+    def features(self, version=None):
+        version = catalog_version() if version is None else version
+        features = self._features
+        if features is None or features.version != version:
+            with self._lock:
+                features = self._features
+                if features is None or features.version != version:
+                    features = self._features = self._build(version)
+        return features
+
+    @staticmethod
+    def _build(version):
+        rows = list(Song.objects.order_by("id").values_list("id", "emotion", "artist", "language"))
+        ids = np.fromiter((row[0] for row in rows), dtype=np.int64, count=len(rows))
+        emotion, emotion_index = _encode([row[1] for row in rows])
+        artist, artist_index = _encode([row[2] for row in rows])
+        language, language_index = _encode([row[3] for row in rows])
+        return _Features(
+            version, ids, emotion, artist, language,
+            {"emotion": emotion_index, "artist": artist_index, "language": language_index},
+        )
+
+    def recommend(
+        self,
+        emotion_stats,
+        artist_stats,
+        language_stats,
+        last_played_language=None,
+        k=DEFAULT_K,
+        emotion_weight=DEFAULT_EMOTION_WEIGHT,
+        artist_weight=DEFAULT_ARTIST_WEIGHT,
+        language_bias="filter",
+        language_weight=DEFAULT_LANGUAGE_WEIGHT,
+        features=None,
+    ):
+        """
+        Return up to k song ids, best first. `features` skips the catalog
+        version check (async views fetch them first).
+        language_bias:
+        - "filter": only the top language's songs (legacy behaviour)
+        - "boost":  add language_weight * language_stats to every score
+        - "none":   ignore language
+        """
+        f = self.features() if features is None else features
+        vocab = f.vocab
+        scores = (
+            emotion_weight * _weights(emotion_stats, vocab["emotion"])[f.emotion]
+            + artist_weight * _weights(artist_stats, vocab["artist"])[f.artist]
+        )
+        ids = f.ids
+
+        if language_bias == "filter":
+            language = top_language(language_stats, last_played_language)
+            if language is not None:
+                code = vocab["language"].get(language)
+                if code is None:
+                    return []
+                mask = f.language == code
+                ids, scores = ids[mask], scores[mask]
+        elif language_bias == "boost":
+            scores = scores + language_weight * _weights(language_stats, vocab["language"])[f.language]
+
+        return ids[top_k(ids, scores, k)].tolist()
+
+
+engine = RecommendationEngine()
+
+
+def legacy_rank(emotion_stats, artist_stats, language_stats, last_played_language=None, k=DEFAULT_K):
+    """
+    The original per-song Python ranking, kept as the reference
+    implementation for parity tests and benchmarks.
+    """
+    language = top_language(language_stats, last_played_language)
+    candidate_songs = Song.objects.filter(language=language) if language else Song.objects.all()
+
+    song_scores = []
+    for song in candidate_songs:
+        emotion_score = emotion_stats.get(song.emotion, 0) if song.emotion else 0
+        artist_score = artist_stats.get(song.artist, 0) if song.artist else 0
+        total_score = (emotion_score * 2) + artist_score
+        song_scores.append((total_score, song))
+
+    song_scores.sort(key=lambda x: (x[0], x[1].id), reverse=True)
+    return [song.id for _, song in song_scores[:k]]
@@ -0,0 +1,91 @@
+import math
+
+from django.conf import settings
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.settings import api_settings
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional accelerator; DRF's json path is used without it
+    orjson = None
+
+# ---------------- Fast JSON Rendering ---------------- #
+# Datetimes (and anything else orjson doesn't know) go through DRF's own
+# JSONEncoder.default, so values match JSONRenderer: "...Z" timestamps,
+# decimals as floats, querysets as lists, etc. Floats with an exponent are
+# spelled differently (orjson writes 1e16 / 1e-7 where the stdlib writes
+# 1e+16 / 1e-07); both parse to the same number.
+_drf_default = JSONEncoder().default
+_LINE_SEPARATORS = ((b"\xe2\x80\xa8", b"\\u2028"), (b"\xe2\x80\xa9", b"\\u2029"))
+
+
+def fast_json_enabled():
+    return orjson is not None and getattr(settings, "FAST_JSON", True)
+
+
+def _has_non_finite(item):
+    """True if a NaN or infinite float is nested anywhere in item."""
+    kind = type(item)
+    if kind is float:
+        return not math.isfinite(item)
+    if kind is dict:
+        return any(map(_has_non_finite, item.values()))
+    if kind is list or kind is tuple:
+        return any(map(_has_non_finite, item))
+    return False
+
+
+def dumps(data):
+    """
+    Compact UTF-8 JSON bytes with the same values as JSONRenderer's output.
+    Uses orjson when available and falls back to the stdlib otherwise.
+    """
+    if fast_json_enabled():
+        try:
+            out = orjson.dumps(
+                data,
+                default=_drf_default,
+                option=orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_NON_STR_KEYS,
+            )
+        except (orjson.JSONEncodeError, TypeError):
+            pass  # e.g. ints wider than 64 bits: let the stdlib handle it
+        else:
+            # orjson writes NaN/Infinity as null; let JSONRenderer reject them
+            # (STRICT_JSON) or spell them out, as it would have anyway.
+            if b"null" in out and _has_non_finite(data):
+                return JSONRenderer().render(data)
+            # JSONRenderer escapes U+2028/U+2029 so output is valid JavaScript too
+            for raw, escaped in _LINE_SEPARATORS:
+                if raw in out:
+                    out = out.replace(raw, escaped)
+            return out
+    return JSONRenderer().render(data)
+
+
+class FastJSONRenderer(JSONRenderer):
+    """JSONRenderer that encodes with orjson for the common compact case."""
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b""
+        renderer_context = renderer_context or {}
+        indent = self.get_indent(accepted_media_type, renderer_context)
+        compact = api_settings.COMPACT_JSON and self.ensure_ascii is False
+        if indent is None and compact and fast_json_enabled():
+            return dumps(data)
+        return super().render(data, accepted_media_type, renderer_context)
+
+
+class JSONResponse(HttpResponse):
+    """
+    Plain Django response with the same body FastJSONRenderer would produce,
+    for the async views (DRF's Response needs a sync APIView). Keeps the
+    payload as .data like Response does.
+    """
+
+    def __init__(self, data, status=200, **kwargs):
+        kwargs.setdefault("content_type", "application/json")
+        super().__init__(b"" if data is None else dumps(data), status=status, **kwargs)
+        self.data = data
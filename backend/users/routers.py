@@ -0,0 +1,65 @@
+import asyncio
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+
+from django.conf import settings
+
+# ---------------- Database Routing ---------------- #
+# Writes and ordinary reads always use "default". Views wrapped in
+# read_from_replica() send their reads to the "replica" alias when one is
+# configured; auth, profile and playlist reads stay on the primary so users
+# always see their own writes.
+REPLICA_ALIAS = "replica"
+_use_replica = ContextVar("use_replica", default=False)
+
+
+def replica_in_use():
+    """True inside read_from_replica() when a replica is configured."""
+    return _use_replica.get() and REPLICA_ALIAS in settings.DATABASES
+
+
+@contextmanager
+def primary_reads():
+    """Send reads back to the primary, e.g. inside a read_from_replica() view."""
+    token = _use_replica.set(False)
+    try:
+        yield
+    finally:
+        _use_replica.reset(token)
+
+
+class PrimaryReplicaRouter:
+    def db_for_read(self, model, **hints):
+        return REPLICA_ALIAS if replica_in_use() else None
+
+    def db_for_write(self, model, **hints):
+        return "default"
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True   # the replica holds the same rows as the primary
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db != REPLICA_ALIAS
+
+
+def read_from_replica(view):
+    """Run a read-only view (sync or async) with its queries routed to the replica."""
+    if asyncio.iscoroutinefunction(view):
+        @wraps(view)
+        async def async_wrapper(*args, **kwargs):
+            token = _use_replica.set(True)
+            try:
+                return await view(*args, **kwargs)
+            finally:
+                _use_replica.reset(token)
+        return async_wrapper
+
+    @wraps(view)
+    def wrapper(*args, **kwargs):
+        token = _use_replica.set(True)
+        try:
+            return view(*args, **kwargs)
+        finally:
+            _use_replica.reset(token)
+    return wrapper
@@ -0,0 +1,411 @@
+import bisect
+import logging
+import math
+import re
+import threading
+import unicodedata
+from collections import Counter, defaultdict
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+from . import tasks
+from .cache import catalog_version
+from .models import Song
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Search Index ---------------- #
+# In-process trigram index over song titles and artists. Substring matches
+# rank first (title/word prefixes highest), then typo-tolerant matches that
+# share enough trigrams with the query.
+FUZZY_MIN_OVERLAP = 0.5   # share of query trigrams a fuzzy hit must contain
+FUZZY_MIN_GRAMS = 3       # queries shorter than 5 chars are substring-only
+FUZZY_LIMIT = 20          # cap on typo-tolerant hits per result list
+SUGGEST_MAX_RESULTS = 10      # hard cap for /songs/suggest/
+SUGGEST_P99_TARGET_MS = 2.0   # latency budget checked by bench_search
+
+_NON_ALNUM = re.compile(r"[^\w]+")
+
+
+def normalize(text):
+    """Casefold, strip accents and collapse punctuation to single spaces."""
+    if not text:
+        return ""
+    text = unicodedata.normalize("NFKD", text)
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return _NON_ALNUM.sub(" ", text.casefold()).strip()
+
+
+def trigrams(text, pad=True):
+    if pad:
+        text = f" {text} "
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _rank_text(query, text, grams, postings_hits):
+    """Score a candidate: >=2 for substring hits, (0, 1] for fuzzy hits."""
+    pos = text.find(query)
+    if pos == 0:
+        return 3.0
+    if pos > 0:
+        return 2.5 if text[pos - 1] == " " else 2.0
+    if grams:
+        return postings_hits / len(grams)
+    return 0.0
+
+
+class _Field:
+    """Trigram postings for one text field: key -> normalized text."""
+
+    def __init__(self):
+        self.texts = {}
+        self.postings = defaultdict(set)
+
+    def add(self, key, text):
+        self.texts[key] = text
+        for gram in trigrams(text):
+            self.postings[gram].add(key)
+
+    def remove(self, key):
+        text = self.texts.pop(key, None)
+        if text is None:
+            return
+        for gram in trigrams(text):
+            keys = self.postings.get(gram)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self.postings[gram]
+
+    def search(self, query):
+        """Return [(score, key)] best first; ties keep ascending key order."""
+        if len(query) < 3:
+            hits = [(_rank_text(query, text, None, 0), key)
+                    for key, text in self.texts.items() if query in text]
+        else:
+            grams = trigrams(query, pad=False)
+            counts = Counter()
+            for gram in grams:
+                counts.update(self.postings.get(gram, ()))
+            fuzzy_ok = len(grams) >= FUZZY_MIN_GRAMS
+            needed = math.ceil(len(grams) * FUZZY_MIN_OVERLAP)
+            hits, fuzzy = [], []
+            for key, count in counts.items():
+                text = self.texts[key]
+                if count == len(grams) and query in text:
+                    hits.append((_rank_text(query, text, grams, count), key))
+                elif fuzzy_ok and count >= needed:
+                    fuzzy.append((count / len(grams), key))
+            fuzzy.sort(key=lambda hit: (-hit[0], hit[1]))
+            hits.extend(fuzzy[:FUZZY_LIMIT])
+        hits.sort(key=lambda hit: (-hit[0], hit[1]))
+        return hits
+
+
+class _Suggestions:
+    """
+    Sorted array of (word-suffix key, ...) entries for prefix lookups.
+    "tum hi ho" is stored under "tum hi ho", "hi ho" and "ho", so typing
+    any word of a label finds it with one bisect.
+    """
+
+    KIND_ORDER = {"song": 0, "artist": 1, "emotion": 2, "language": 3}
+
+    def __init__(self):
+        self.entries = []   # (key, offset, kind, ref, label)
+
+    @staticmethod
+    def _keys(text):
+        yield 0, text
+        for pos, ch in enumerate(text):
+            if ch == " ":
+                yield pos + 1, text[pos + 1:]
+
+    def add(self, kind, ref, label):
+        for offset, key in self._keys(normalize(label)):
+            bisect.insort(self.entries, (key, offset, kind, ref, label))
+
+    def extend_unsorted(self, kind, ref, label):
+        """Bulk-load path used by build(); call finish_bulk() afterwards."""
+        for offset, key in self._keys(normalize(label)):
+            self.entries.append((key, offset, kind, ref, label))
+
+    def finish_bulk(self):
+        self.entries.sort()
+
+    def remove(self, kind, ref, label):
+        for offset, key in self._keys(normalize(label)):
+            entry = (key, offset, kind, ref, label)
+            pos = bisect.bisect_left(self.entries, entry)
+            if pos < len(self.entries) and self.entries[pos] == entry:
+                del self.entries[pos]
+
+    def lookup(self, prefix, limit):
+        """Best `limit` labels with a word starting with `prefix`."""
+        entries = self.entries
+        start = bisect.bisect_left(entries, (prefix,))
+        seen, found = set(), []
+        # Scan a bounded window so very common prefixes stay cheap.
+        for key, offset, kind, ref, label in entries[start:start + limit * 8]:
+            if not key.startswith(prefix):
+                break
+            if (kind, ref) in seen:
+                continue
+            seen.add((kind, ref))
+            found.append((offset > 0, self.KIND_ORDER[kind], len(label), kind, ref, label))
+        found.sort()
+        return [(kind, ref, label) for *_, kind, ref, label in found[:limit]]
+
+
+class SongSearchIndex:
+    """
+    Thread-safe search index over the Song catalog.
+    build() loads a full snapshot; upsert()/remove() keep it current from
+    Song signals. Changes that arrive mid-build are replayed after the swap.
+    Changes made by other processes (bulk imports, other workers) are
+    noticed through the catalog version and trigger a background rebuild.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()
+        self._building = False
+        self._pending = []
+        self._reset()
+        self.ready = False
+        self.version = None
+
+    def _reset(self):
+        self.songs = {}                  # id -> (title, artist, emotion, language)
+        self.titles = _Field()           # song id -> normalized title
+        self.artists = _Field()          # normalized artist -> normalized artist
+        self.artist_labels = {}          # normalized artist -> display name
+        self.artist_counts = Counter()   # normalized artist -> songs
+        self.emotions = Counter()
+        self.languages = Counter()
+        self.suggestions = _Suggestions()
+        self._bulk = False
+
+    # -------- maintenance -------- #
+    def build(self):
+        version = catalog_version()
+        rows = Song.objects.values_list("id", "title", "artist", "emotion", "language")
+        fresh = SongSearchIndex.__new__(SongSearchIndex)
+        fresh._reset()
+        fresh._bulk = True
+        for row in rows.iterator(chunk_size=2000):
+            fresh._add(*row)
+        fresh.suggestions.finish_bulk()
+        with self._lock:
+            for name in ("songs", "titles", "artists", "artist_labels",
+                         "artist_counts", "emotions", "languages", "suggestions"):
+                setattr(self, name, getattr(fresh, name))
+            pending, self._pending = self._pending, []
+            self._building = False
+            for op, args in pending:
+                getattr(self, op)(*args)
+            self.version = version
+            self.ready = True
+        logger.info("Song search index built with %d songs", len(self.songs))
+
+    def warm_async(self):
+        """Build in a daemon thread; searches use the DB until it finishes."""
+        if not self.ready:
+            self._start_build()
+
+    def ensure_fresh(self):
+        """
+        True when the index can answer queries. A cold index starts warming
+        (callers fall back to the DB); a stale one keeps answering while it
+        is rebuilt in the background.
+        """
+        if not self.ready:
+            self._start_build()
+            return self.ready   # an eager build has already finished
+        if self.version != catalog_version():
+            self._start_build()
+        return True
+
+    def _start_build(self):
+        with self._lock:
+            if self._building:
+                return
+            self._building = True
+        if tasks.is_eager():
+            # Tests and management commands: build inline on this connection
+            self._build_or_reset()
+            return
+        thread = threading.Thread(target=self._safe_build, name="song-search-index", daemon=True)
+        thread.start()
+
+    def _build_or_reset(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception("Song search index build failed")
+            with self._lock:
+                self._building = False
+
+    def _safe_build(self):
+        try:
+            self._build_or_reset()
+        finally:
+            connection.close()
+
+    def upsert(self, song):
+        self._apply("_upsert", song.id, song.title, song.artist, song.emotion, song.language)
+
+    def remove(self, song_id):
+        self._apply("_remove", song_id)
+
+    def _apply(self, op, *args):
+        with self._lock:
+            if self._building:
+                self._pending.append((op, args))
+            if self.ready or not self._building:
+                getattr(self, op)(*args)
+            # Our own Song signal bumped the version by exactly one: still in sync.
+            if self.version is not None and catalog_version() == self.version + 1:
+                self.version += 1
+
+    def _upsert(self, song_id, title, artist, emotion, language):
+        self._remove(song_id)
+        self._add(song_id, title, artist, emotion, language)
+
+    def _suggest(self, kind, ref, label):
+        if self._bulk:
+            self.suggestions.extend_unsorted(kind, ref, label)
+        else:
+            self.suggestions.add(kind, ref, label)
+
+    def _add(self, song_id, title, artist, emotion, language):
+        self.songs[song_id] = (title, artist, emotion, language)
+        self.titles.add(song_id, normalize(title))
+        self._suggest("song", song_id, title)
+        if artist:
+            key = normalize(artist)
+            if not self.artist_counts[key]:
+                self.artists.add(key, key)
+                self.artist_labels[key] = artist
+                self._suggest("artist", key, artist)
+            self.artist_counts[key] += 1
+        for kind, counter, value in (("emotion", self.emotions, emotion),
+                                     ("language", self.languages, language)):
+            if value:
+                if not counter[value]:
+                    self._suggest(kind, value, value)
+                counter[value] += 1
+
+    def _remove(self, song_id):
+        old = self.songs.pop(song_id, None)
+        if old is None:
+            return
+        title, artist, emotion, language = old
+        self.titles.remove(song_id)
+        self.suggestions.remove("song", song_id, title)
+        if artist:
+            key = normalize(artist)
+            self.artist_counts[key] -= 1
+            if self.artist_counts[key] <= 0:
+                del self.artist_counts[key]
+                self.artists.remove(key)
+                self.suggestions.remove("artist", key, self.artist_labels.pop(key, artist))
+        for kind, counter, value in (("emotion", self.emotions, emotion),
+                                     ("language", self.languages, language)):
+            if value:
+                counter[value] -= 1
+                if counter[value] <= 0:
+                    del counter[value]
+                    self.suggestions.remove(kind, value, value)
+
+    # -------- queries -------- #
+    def search(self, query):
+        """
+        Return {"song_ids", "artists", "emotions", "languages"} for a raw query,
+        each list ranked best first.
+        """
+        q = normalize(query)
+        if not q:
+            return {"song_ids": [], "artists": [], "emotions": [], "languages": []}
+        with self._lock:
+            song_ids = [song_id for _, song_id in self.titles.search(q)]
+            artists = [self.artist_labels[key] for _, key in self.artists.search(q)]
+            emotions = sorted(e for e in self.emotions if q in normalize(e))
+            languages = sorted(lang for lang in self.languages if q in normalize(lang))
+        return {"song_ids": song_ids, "artists": artists, "emotions": emotions, "languages": languages}
+
+    def suggest(self, query, limit=SUGGEST_MAX_RESULTS):
+        """
+        Prefix suggestions for search-as-you-type:
+        [{"type": "song", "id": 9, "label": "Ishq Wala Love"}, {"type": "artist", ...}]
+        """
+        q = normalize(query)
+        if not q:
+            return []
+        limit = max(1, min(limit, SUGGEST_MAX_RESULTS))
+        with self._lock:
+            hits = self.suggestions.lookup(q, limit)
+        return [
+            {"type": kind, "id": ref, "label": label} if kind == "song" else {"type": kind, "label": label}
+            for kind, ref, label in hits
+        ]
+
+
+song_index = SongSearchIndex()
+
+
+# ---------------- Database Fallbacks ---------------- #
+_BOOLEAN_OPERATORS = re.compile(r'[+\-<>()~*"@]+')
+
+
+def _fulltext_terms(query):
+    """'tum hi' -> '+tum* +hi*' for MySQL boolean-mode prefix matching."""
+    words = _BOOLEAN_OPERATORS.sub(" ", query).split()
+    return " ".join(f"+{word}*" for word in words)
+
+
+def fulltext_filter(column, query):
+    """Song id subquery using the MySQL FULLTEXT index on `column`."""
+    return RawSQL(
+        f"SELECT id FROM {Song._meta.db_table} WHERE MATCH({column}) AGAINST (%s IN BOOLEAN MODE)",
+        [_fulltext_terms(query)],
+    )
+
+
+def search_database(query):
+    """
+    Search straight from the database while the index is cold.
+    Uses the FULLTEXT indexes on MySQL, plain icontains elsewhere.
+    Returns (songs queryset, artists, emotions, languages).
+    """
+    use_fulltext = connection.vendor == "mysql" and len(query) >= 3 and _fulltext_terms(query)
+    if use_fulltext:
+        songs = Song.objects.filter(id__in=fulltext_filter("title", query))
+        artist_songs = Song.objects.filter(id__in=fulltext_filter("artist", query))
+    else:
+        songs = Song.objects.filter(title__icontains=query)
+        artist_songs = Song.objects.filter(artist__icontains=query)
+    artists = artist_songs.values_list("artist", flat=True).distinct()
+    emotions = Song.objects.filter(emotion__icontains=query).values_list("emotion", flat=True).distinct()
+    languages = Song.objects.filter(language__icontains=query).values_list("language", flat=True).distinct()
+    return (
+        songs,
+        [artist for artist in artists if artist],
+        [emotion for emotion in emotions if emotion],
+        [lang for lang in languages if lang],
+    )
+
+
+def search_catalog(query):
+    """
+    Search the catalog, preferring the in-memory index.
+    Returns (songs list, artists, emotions, languages).
+    """
+    if not song_index.ensure_fresh():
+        songs, artists, emotions, languages = search_database(query)
+        return list(songs), artists, emotions, languages
+
+    result = song_index.search(query)
+    by_id = Song.objects.in_bulk(result["song_ids"])
+    songs = [by_id[song_id] for song_id in result["song_ids"] if song_id in by_id]
+    return songs, result["artists"], result["emotions"], result["languages"]
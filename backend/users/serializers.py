@@ -1,6 +1,8 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
 from .models import Song, Playlist, UserProfile
+from .encoders import SongEncoder
+from .ordering import set_songs
 
 # ---------------- Register Serializer ---------------- #
 class RegisterSerializer(serializers.ModelSerializer):
@@ -23,26 +25,33 @@ class RegisterSerializer(serializers.ModelSerializer):
 
 # ---------------- Song Serializer with cover & src URL ---------------- #
 class SongSerializer(serializers.ModelSerializer):
-    cover_url = serializers.SerializerMethodField()
-    src_url = serializers.SerializerMethodField()
+    # Computed by SongEncoder in to_representation()
+    cover_url = serializers.CharField(read_only=True)
+    cover_variants = serializers.DictField(read_only=True)
+    src_url = serializers.CharField(read_only=True)
 
     class Meta:
         model = Song
-        fields = ("id", "title", "artist", "src", "src_url", "cover_url", "emotion", "language")
+        fields = (
+            "id", "title", "artist", "src", "src_url", "cover_url", "cover_variants", "emotion", "language",
+            "duration", "sample_rate", "bitrate", "loudness_db",
+        )
+        read_only_fields = ("duration", "sample_rate", "bitrate", "loudness_db")
 
-    def get_cover_url(self, obj):
-        request = self.context.get("request")
-        if obj.cover:
-            url = obj.cover.url
-            return request.build_absolute_uri(url) if request else url
-        return None
+    def __init__(self, *args, fields=None, **kwargs):
+        """Optionally restrict output to a subset of fields (e.g. ?fields=id,title)."""
+        super().__init__(*args, **kwargs)
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
 
-    def get_src_url(self, obj):
-        request = self.context.get("request")
-        if obj.src:
-            url = obj.src.url
-            return request.build_absolute_uri(url) if request else url
-        return None
+    def to_representation(self, instance):
+        """Render through the shared SongEncoder (same output, far less overhead)."""
+        encoder = getattr(self, "_encoder", None)
+        if encoder is None:
+            encoder = self._encoder = SongEncoder(self.context.get("request"))
+            self._output_fields = tuple(field.field_name for field in self._readable_fields)
+        return encoder.encode(instance, self._output_fields)
 
 
 # ---------------- Playlist Serializer ---------------- #
@@ -61,7 +70,7 @@ class PlaylistSerializer(serializers.ModelSerializer):
     def create(self, validated_data):
         song_ids = validated_data.pop("song_ids", [])
         playlist = Playlist.objects.create(**validated_data)
-        playlist.songs.set(song_ids)
+        set_songs(playlist, [song.id for song in song_ids])
         return playlist
 
     def update(self, instance, validated_data):
@@ -69,10 +78,42 @@ class PlaylistSerializer(serializers.ModelSerializer):
         instance.name = validated_data.get("name", instance.name)
         instance.save()
         if song_ids is not None:
-            instance.songs.set(song_ids)
+            set_songs(instance, [song.id for song in song_ids])
         return instance
 
 
+# ---------------- Fast Playlist Serialization ---------------- #
+_datetime_field = serializers.DateTimeField()
+
+
+def _datetime(value):
+    return _datetime_field.to_representation(value) if value else None
+
+
+def serialize_playlists(playlists, request=None):
+    """
+    Same output as PlaylistSerializer(playlists, many=True).data, built with
+    plain dicts (song_ids is write-only in practice and never rendered).
+    Expects playlists with prefetched songs; last_opened / open_count are
+    included only when annotated (see views.playlists_with_activity), just
+    like the DRF serializer skips them otherwise.
+    """
+    encoder = SongEncoder(request)
+    result = []
+    for playlist in playlists:
+        data = {
+            "id": playlist.id,
+            "name": playlist.name,
+            "songs": encoder.encode_many(playlist.songs.all()),
+            "created_at": _datetime(playlist.created_at),
+        }
+        if hasattr(playlist, "open_count"):
+            data["last_opened"] = _datetime(playlist.last_opened)
+            data["open_count"] = playlist.open_count
+        result.append(data)
+    return result
+
+
 # ---------------- User Profile Serializer ---------------- #
 class UserProfileSerializer(serializers.ModelSerializer):
     username = serializers.CharField(source="user.username", read_only=True)
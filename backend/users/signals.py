@@ -0,0 +1,126 @@
+from django.db import transaction
+from django.db.models.signals import m2m_changed, post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from django.contrib.auth.models import User
+from django.utils.timezone import now
+
+from .audio import queue_analysis
+from .authentication import invalidate_profiles, invalidate_user
+from .cache import bump_catalog_version
+from .changelog import record_change, record_changes
+from .images import delete_variants, queue_variants
+from .models import Playlist, PlaylistChange, Song, UserProfile
+from .search_index import song_index
+
+
+# ---------------- Song Catalog Changes ---------------- #
+@receiver(post_save, sender=Song)
+def song_saved(sender, instance, **kwargs):
+    """Any Song write (API, Django admin, shell) invalidates catalog caches."""
+    bump_catalog_version()
+    song_index.upsert(instance)
+    queue_analysis(instance)
+
+
+@receiver(post_delete, sender=Song)
+def song_deleted(sender, instance, **kwargs):
+    bump_catalog_version()
+    song_index.remove(instance.pk)
+
+
+# ---------------- Playlist Contents ---------------- #
+@receiver(m2m_changed, sender=Playlist.songs.through)
+def playlist_songs_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    """
+    Song list edits made through the related managers bump updated_at
+    (the playlist ETag) and are logged for sync; ordering.py logs its own.
+    """
+    if action == "pre_clear" and not reverse:
+        # The ids are gone by post_clear
+        instance._cleared_song_ids = list(instance.songs.values_list("id", flat=True))
+        return
+    if action not in ("post_add", "post_remove", "post_clear"):
+        return
+    playlist_ids = pk_set if reverse else [instance.pk]
+    if not playlist_ids:
+        return
+    Playlist.objects.filter(pk__in=playlist_ids).update(updated_at=now())
+    kind = PlaylistChange.SONGS_ADDED if action == "post_add" else PlaylistChange.SONGS_REMOVED
+    if reverse:
+        song_ids = [instance.pk]
+    elif action == "post_clear":
+        song_ids = getattr(instance, "_cleared_song_ids", [])
+    else:
+        song_ids = sorted(pk_set)
+    owners = Playlist.objects.filter(pk__in=playlist_ids).values_list("id", "user_id")
+    record_changes([(user_id, playlist_id, kind, song_ids) for playlist_id, user_id in owners])
+
+
+@receiver(post_save, sender=Playlist)
+def playlist_saved(sender, instance, created, **kwargs):
+    kind = PlaylistChange.CREATED if created else PlaylistChange.UPDATED
+    record_change(instance.user_id, instance.pk, kind)
+
+
+@receiver(post_delete, sender=Playlist)
+def playlist_deleted(sender, instance, origin=None, **kwargs):
+    if isinstance(origin, User) or getattr(origin, "model", None) is User:
+        return  # deleting the account takes its change log with it
+    record_change(instance.user_id, instance.pk, PlaylistChange.DELETED)
+
+
+# ---------------- Image Uploads ---------------- #
+_IMAGE_FIELDS = {Song: "cover", Playlist: "cover", UserProfile: "profile_picture"}
+
+
+@receiver(pre_save, sender=Song)
+@receiver(pre_save, sender=Playlist)
+@receiver(pre_save, sender=UserProfile)
+def image_saving(sender, instance, update_fields=None, **kwargs):
+    """Remember the stored image name so a replaced image's variants can be dropped."""
+    field = _IMAGE_FIELDS[sender]
+    if instance.pk is None or (update_fields is not None and field not in update_fields):
+        return
+    instance._previous_image = sender.objects.filter(pk=instance.pk).values_list(field, flat=True).first()
+
+
+def _drop_replaced_variants(model, field, name):
+    # Imported songs can share a cover file; keep variants someone still shows.
+    if not model.objects.filter(**{field: name}).exists():
+        delete_variants(name)
+
+
+@receiver(post_save, sender=Song)
+@receiver(post_save, sender=Playlist)
+@receiver(post_save, sender=UserProfile)
+def image_saved(sender, instance, **kwargs):
+    """Pre-build resized variants of a newly saved image (no-op when up to date)."""
+    field = _IMAGE_FIELDS[sender]
+    name = getattr(instance, field).name
+    previous = instance.__dict__.pop("_previous_image", None)
+    if previous and previous != name:
+        # Registered before queue_variants, so it runs before the new variants are built.
+        transaction.on_commit(lambda: _drop_replaced_variants(sender, field, previous))
+    queue_variants(name)
+
+
+@receiver(post_delete, sender=Song)
+@receiver(post_delete, sender=Playlist)
+@receiver(post_delete, sender=UserProfile)
+def image_deleted(sender, instance, **kwargs):
+    delete_variants(getattr(instance, _IMAGE_FIELDS[sender]).name)
+
+
+# ---------------- Auth Caches ---------------- #
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def user_changed(sender, instance, **kwargs):
+    # A recreated row can reuse the id, so its profile entry goes too.
+    invalidate_user(instance.pk)
+
+
+@receiver(post_save, sender=UserProfile)
+@receiver(post_delete, sender=UserProfile)
+def profile_changed(sender, instance, **kwargs):
+    invalidate_profiles(instance.user_id)
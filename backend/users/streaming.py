@@ -0,0 +1,163 @@
+import mimetypes
+import os
+import re
+
+from django.conf import settings
+from django.http import FileResponse, HttpResponse, HttpResponseRedirect
+from django.utils.encoding import filepath_to_uri
+from django.utils.http import http_date, parse_http_date_safe
+
+from .cache import etag_matches
+
+# ---------------- Media Streaming ---------------- #
+# Single byte ranges are answered with 206 Partial Content. Multi-range and
+# malformed headers get the whole file, which RFC 9110 allows. The response
+# body is the open file itself (see _RangeFile), so WSGI servers with
+# wsgi.file_wrapper (gunicorn) can sendfile() it without copying it through
+# Python; MEDIA_OFFLOAD_HEADER hands the whole transfer to nginx/Apache.
+MEDIA_CACHE_MAX_AGE = 24 * 60 * 60
+_RANGE_RE = re.compile(r"^bytes=(\d*)-(\d*)$")
+
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+
+def parse_range(header, size):
+    """
+    Inclusive (start, end) for a single byte range, or None to send the
+    whole file. Raises RangeNotSatisfiable for ranges past the end.
+    """
+    if not header:
+        return None
+    match = _RANGE_RE.match(header.strip())
+    if not match:
+        return None
+    first, last = match.groups()
+    if not first:
+        if not last:
+            return None
+        suffix = int(last)
+        if suffix == 0 or size == 0:
+            raise RangeNotSatisfiable
+        return max(size - suffix, 0), size - 1
+    start = int(first)
+    if last and int(last) < start:
+        return None
+    if start >= size:
+        raise RangeNotSatisfiable
+    end = int(last) if last else size - 1
+    return start, min(end, size - 1)
+
+
+def file_etag(stat):
+    """Strong validator: changes whenever the file's size or mtime does."""
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def _if_range_allows(request, etag, mtime):
+    """Whether a Range header may be honoured given If-Range (if any)."""
+    value = request.headers.get("If-Range")
+    if not value:
+        return True
+    if value.startswith(('"', "W/")):
+        # If-Range requires strong comparison, so weak tags never match.
+        return value == etag
+    return parse_http_date_safe(value) == int(mtime)
+
+
+class _RangeFile:
+    """
+    File-like view of bytes [offset, offset + length) of an open file.
+    read() stops at the range end; fileno() is exposed so a server's
+    sendfile path starts at the current offset and sends Content-Length bytes.
+    """
+
+    def __init__(self, file, offset, length):
+        file.seek(offset)
+        self._file = file
+        self._remaining = length
+
+    def read(self, size=-1):
+        if self._remaining <= 0:
+            return b""
+        size = self._remaining if size is None or size < 0 else min(size, self._remaining)
+        data = self._file.read(size)
+        self._remaining -= len(data)
+        return data
+
+    def fileno(self):
+        return self._file.fileno()
+
+    def close(self):
+        self._file.close()
+
+
+def _offload_response(name, path, headers):
+    """Let the front-end server send the file (it handles Range itself)."""
+    header = settings.MEDIA_OFFLOAD_HEADER
+    response = HttpResponse(content_type=headers.pop("Content-Type"))
+    if header.lower() == "x-accel-redirect":
+        response[header] = settings.MEDIA_OFFLOAD_PREFIX.rstrip("/") + "/" + filepath_to_uri(name)
+    else:
+        response[header] = path
+    for key, value in headers.items():
+        response[key] = value
+    return response
+
+
+def media_response(request, storage, name, cache_control=f"private, max-age={MEDIA_CACHE_MAX_AGE}"):
+    """Serve a stored media file with Range, conditional and cache headers."""
+    try:
+        path = storage.path(name)
+    except NotImplementedError:
+        # Remote storage: the storage's own URL serves ranges.
+        return HttpResponseRedirect(storage.url(name))
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return HttpResponse(status=404)
+
+    size = stat.st_size
+    etag = file_etag(stat)
+    content_type = mimetypes.guess_type(name)[0] or "application/octet-stream"
+    headers = {
+        "Content-Type": content_type,
+        "ETag": etag,
+        "Last-Modified": http_date(stat.st_mtime),
+        "Cache-Control": cache_control,
+        "Accept-Ranges": "bytes",
+    }
+    if etag_matches(request, etag):
+        response = HttpResponse(status=304)
+        for key in ("ETag", "Last-Modified", "Cache-Control"):
+            response[key] = headers[key]
+        return response
+
+    if getattr(settings, "MEDIA_OFFLOAD_HEADER", ""):
+        return _offload_response(name, path, headers)
+
+    byte_range = None
+    if _if_range_allows(request, etag, stat.st_mtime):
+        try:
+            byte_range = parse_range(request.headers.get("Range"), size)
+        except RangeNotSatisfiable:
+            response = HttpResponse(status=416)
+            response["Content-Range"] = f"bytes */{size}"
+            response["Accept-Ranges"] = "bytes"
+            return response
+
+    start, end = byte_range or (0, size - 1)
+    length = end - start + 1 if size else 0
+    status = 206 if byte_range else 200
+
+    if request.method == "HEAD":
+        response = HttpResponse(status=status)
+    else:
+        response = FileResponse(_RangeFile(open(path, "rb"), start, length), status=status)
+    for key, value in headers.items():
+        response[key] = value
+    response["Content-Length"] = str(length)
+    if byte_range:
+        response["Content-Range"] = f"bytes {start}-{end}/{size}"
+    return response
@@ -0,0 +1,75 @@
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Background Tasks ---------------- #
+# A small in-process worker pool for work that must not block a request
+# (stat folding, buffered writes, file processing). With
+# BACKGROUND_TASKS_EAGER = True (tests, management commands) tasks run inline.
+_executor = None
+_executor_lock = threading.Lock()
+_scheduled = {}
+_scheduled_lock = threading.Lock()
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = ThreadPoolExecutor(
+                    max_workers=getattr(settings, "BACKGROUND_WORKERS", 4),
+                    thread_name_prefix="harmoura-task",
+                )
+    return _executor
+
+
+def is_eager():
+    """True when background work runs inline (BACKGROUND_TASKS_EAGER)."""
+    return getattr(settings, "BACKGROUND_TASKS_EAGER", False)
+
+
+def _run(fn, args, kwargs):
+    close_old_connections()
+    try:
+        return fn(*args, **kwargs)
+    except Exception:
+        logger.exception("Background task %s failed", getattr(fn, "__name__", fn))
+        raise
+    finally:
+        close_old_connections()
+
+
+def submit(fn, *args, **kwargs):
+    """Run fn(*args, **kwargs) on the worker pool (inline when eager)."""
+    if is_eager():
+        return fn(*args, **kwargs)
+    return _get_executor().submit(_run, fn, args, kwargs)
+
+
+def schedule(key, fn, delay, *args, **kwargs):
+    """
+    Debounced submit: run fn once, `delay` seconds from the first call for
+    `key`. Calls made while one is already pending are coalesced into it.
+    """
+    if is_eager():
+        return fn(*args, **kwargs)
+    with _scheduled_lock:
+        if key in _scheduled:
+            return None
+        timer = threading.Timer(delay, _fire, (key, fn, args, kwargs))
+        timer.daemon = True
+        _scheduled[key] = timer
+    timer.start()
+    return timer
+
+
+def _fire(key, fn, args, kwargs):
+    with _scheduled_lock:
+        _scheduled.pop(key, None)
+    submit(fn, *args, **kwargs)
@@ -1,3 +1,1457 @@
-from django.test import TestCase
+import asyncio
+import io
+import json
+import os
+import random
+import sys
+import tempfile
+import threading
+import wave
+import unittest
+from datetime import datetime, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadhandler import SkipFile
+from django.core.management import CommandError, call_command
+from django.test import AsyncRequestFactory, RequestFactory, TestCase, override_settings
+from django.utils.encoding import filepath_to_uri
+from PIL import Image
+from rest_framework import serializers
+from rest_framework.exceptions import ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.response import Response
+from rest_framework.test import APIClient
+from rest_framework_simplejwt.tokens import AccessToken
+
+from . import async_views, images
+from .activity_buffer import open_buffer
+from .models import Playlist, PlaylistActivity, PlaylistChange, PlaylistSong, PlayEvent, Song, UserProfile
+from .ordering import REBALANCE_LENGTH, append_songs, rank_between, spread_ranks
+from .plays import fold_play_events
+from .listening import CAPACITY, add_plays, capped_add, decayed
+from .encoders import SongEncoder, song_rows
+from .serializers import PlaylistSerializer, SongSerializer, serialize_playlists
+from .views import playlists_with_activity, songs_matching
+from .catalog import MAX_PAGE_SIZE, encode_cursor
+from .recommender import RecommendationEngine, legacy_rank
+from .cache import bump_catalog_version, cached_catalog_view, catalog_version, require_shared_catalog_cache
+from .audio import AudioAnalysisError, analyze_file, analyze_song, waveform_peaks
+from .images import generate_variants, variant_base_url, variant_name, variant_urls
+from .authentication import make_stream_token, profile_cache, user_cache
+from .parsers import FastJSONParser
+from .throttles import LoginAccountThrottle, LoginIPThrottle
+from .renderers import FastJSONRenderer, orjson
+from .routers import PrimaryReplicaRouter, read_from_replica
+from .search_index import SongSearchIndex, search_catalog, song_index
+from .uploads import StagedUploadHandler
+
+
+# ---------------- Recommendation Parity ---------------- #
+class RecommendationParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        rng = random.Random(42)
+        emotions = [choice for choice, _ in Song.EMOTIONS] + [None]
+        languages = [choice for choice, _ in Song.LANGUAGES] + [None]
+        artists = [f"Artist {i}" for i in range(12)]
+        for i in range(150):
+            Song.objects.create(
+                title=f"Song {i}",
+                artist=rng.choice(artists),
+                src=f"songs/{i}.mp3",
+                emotion=rng.choice(emotions),
+                language=rng.choice(languages),
+            )
+        cls.artists = artists
+
+    def test_matches_legacy_ranking(self):
+        rng = random.Random(7)
+        engine = RecommendationEngine()
+        for _ in range(40):
+            emotion_stats = {e: rng.randint(0, 5) for e, _ in Song.EMOTIONS if rng.random() < 0.6}
+            artist_stats = {a: rng.randint(0, 9) for a in self.artists if rng.random() < 0.4}
+            language_stats = {lang: rng.randint(1, 4) for lang, _ in Song.LANGUAGES if rng.random() < 0.3}
+            last_language = rng.choice([None, None, "Hindi", "Tamil"])
+            k = rng.choice([1, 6, 20])
+            self.assertEqual(
+                engine.recommend(emotion_stats, artist_stats, language_stats, last_language, k=k),
+                legacy_rank(emotion_stats, artist_stats, language_stats, last_language, k=k),
+            )
+
+    def test_new_user_gets_highest_ids(self):
+        engine = RecommendationEngine()
+        expected = list(Song.objects.order_by("-id").values_list("id", flat=True)[:6])
+        self.assertEqual(engine.recommend({}, {}, {}), expected)
+
+    def test_refreshes_after_catalog_change(self):
+        engine = RecommendationEngine()
+        engine.recommend({}, {}, {})
+        song = Song.objects.create(title="New", artist="Someone", src="songs/new.mp3", emotion="Love")
+        self.assertEqual(engine.recommend({"Love": 1}, {"Someone": 100}, {})[0], song.id)
+
+
+# ---------------- Play Event Ingestion ---------------- #
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class PlayEventTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("listener", "listener@example.com", "pw12345!")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.song = Song.objects.create(
+            title="Tum Hi Ho", artist="Arijit Singh", src="songs/a.mp3", emotion="Love", language="Hindi",
+        )
+        self.other = Song.objects.create(
+            title="Monica", artist="Anirudh", src="songs/b.mp3", emotion="Excitement", language="Tamil",
+        )
+
+    def test_play_song_only_appends_an_event(self):
+        with self.assertNumQueries(2):  # song lookup + INSERT
+            response = self.client.post("/api/users/play_song/", {"song_id": self.song.id}, format="json")
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(PlayEvent.objects.filter(user=self.user).count(), 1)
+
+    def test_unknown_song(self):
+        response = self.client.post("/api/users/play_song/", {"song_id": 999}, format="json")
+        self.assertEqual(response.status_code, 404)
+
+    def test_fold_counts_every_event_once(self):
+        UserProfile.objects.create(user=self.user, artist_stats={"Arijit Singh": 3})
+        PlayEvent.objects.bulk_create(
+            [PlayEvent(user=self.user, song=self.song) for _ in range(5)]
+            + [PlayEvent(user=self.user, song=self.other) for _ in range(2)]
+        )
+        self.assertEqual(fold_play_events(batch_size=3), 7)
+        self.assertEqual(fold_play_events(), 0)
+
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.emotion_stats, {"Love": 5, "Excitement": 2})
+        self.assertEqual(profile.artist_stats, {"Arijit Singh": 8, "Anirudh": 2})
+        self.assertEqual(profile.language_stats, {"Hindi": 5, "Tamil": 2})
+        self.assertEqual(profile.last_played_language, "Tamil")
+        self.assertFalse(PlayEvent.objects.exists())
+
+
+class ListeningStatsTests(TestCase):
+    DAY = 86400
+
+    def test_plays_fade_with_half_life(self):
+        stats = add_plays({}, [(0, {"artist": "Old"}), (30 * self.DAY, {"artist": "New"})])
+        weights = decayed(stats, "artist", at=30 * self.DAY)
+        self.assertAlmostEqual(weights["Old"], 0.5)
+        self.assertAlmostEqual(weights["New"], 1.0)
+        # Far-apart plays move the landmark instead of overflowing
+        add_plays(stats, [(10000 * self.DAY, {"artist": "New"})])
+        self.assertEqual(stats["landmark"], 10000 * self.DAY)
+        self.assertAlmostEqual(decayed(stats, "artist", at=10000 * self.DAY)["New"], 1.0)
+
+    def test_heavy_hitters_survive_the_cap(self):
+        stats = add_plays({}, [(0, {"artist": "Favourite"})] * 20)
+        add_plays(stats, [(0, {"artist": f"One-off {i}"}) for i in range(500)])
+        self.assertEqual(len(stats["artist"]), CAPACITY["artist"])
+        self.assertEqual(max(stats["artist"], key=stats["artist"].get), "Favourite")
+
+    def test_all_time_artist_cap_keeps_exact_counts(self):
+        stats = {f"Artist {i}": 5 for i in range(3)}
+        stats["Rare"] = 1
+        capped_add(stats, "Newcomer", 2, 4)
+        self.assertEqual(stats, {"Artist 0": 5, "Artist 1": 5, "Artist 2": 5, "Newcomer": 2})
+        capped_add(stats, "One-off", 1, 4)   # smaller than everything kept: dropped, nothing inherited
+        self.assertEqual(stats, {"Artist 0": 5, "Artist 1": 5, "Artist 2": 5, "Newcomer": 2})
+
+    @override_settings(BACKGROUND_TASKS_EAGER=True)
+    def test_recommendations_follow_recent_plays(self):
+        user = User.objects.create_user("shifter", "shifter@example.com", "pw12345!")
+        old = Song.objects.create(title="Then", artist="Old Flame", src="songs/o.mp3", emotion="Love", language="Hindi")
+        new = Song.objects.create(title="Now", artist="New Crush", src="songs/n.mp3", emotion="Love", language="Hindi")
+        long_ago = datetime.now(dt_timezone.utc) - timedelta(days=365)
+        PlayEvent.objects.bulk_create(
+            [PlayEvent(user=user, song=old, played_at=long_ago) for _ in range(10)]
+            + [PlayEvent(user=user, song=new) for _ in range(2)]
+        )
+        fold_play_events()
+        profile = UserProfile.objects.get(user=user)
+        self.assertEqual(profile.artist_stats, {"Old Flame": 10, "New Crush": 2})   # all-time counts unchanged
+
+        client = APIClient()
+        client.force_authenticate(user)
+        response = client.get("/api/users/songs/recommended/?k=1")
+        self.assertEqual([song["id"] for song in response.data], [new.id])
+
+
+# ---------------- Playlist Open Buffer ---------------- #
+@mock.patch("users.activity_buffer.tasks.schedule")
+class PlaylistOpenBufferTests(TestCase):
+    def setUp(self):
+        open_buffer.flush()
+        self.user = User.objects.create_user("opener", "opener@example.com", "pw12345!")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.playlist = Playlist.objects.create(user=self.user, name="Road trip")
+
+    def open(self):
+        return self.client.post(f"/api/users/playlists/{self.playlist.id}/open/")
+
+    def test_opens_are_coalesced_and_upserted(self, _schedule):
+        for _ in range(3):
+            response = self.open()
+        self.assertEqual(response.data["open_count"], 3)
+        self.assertFalse(PlaylistActivity.objects.exists())
+
+        self.assertEqual(open_buffer.flush(), 1)
+        self.assertEqual(PlaylistActivity.objects.get().open_count, 3)
+
+        self.open()
+        open_buffer.flush()
+        self.assertEqual(PlaylistActivity.objects.get().open_count, 4)
+
+    def test_recent_playlists_reads_unflushed_opens(self, _schedule):
+        PlaylistActivity.objects.create(user=self.user, playlist=self.playlist, open_count=2)
+        self.open()
+        response = self.client.get("/api/users/playlists/recent/")
+        self.assertEqual(response.data["recent_playlists"][0]["open_count"], 3)
+
+        other = Playlist.objects.create(user=self.user, name="Focus")
+        self.client.post(f"/api/users/playlists/{other.id}/open/")
+        response = self.client.get("/api/users/playlists/recent/")
+        self.assertEqual([p["id"] for p in response.data["recent_playlists"]], [other.id, self.playlist.id])
+
+    def test_deleted_playlists_are_dropped(self, _schedule):
+        self.open()
+        self.playlist.delete()
+        self.assertEqual(open_buffer.flush(), 0)
+        self.assertFalse(PlaylistActivity.objects.exists())
+
+
+# ---------------- Playlist Serialization ---------------- #
+class UserPlaylistsQueryTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user("collector", "collector@example.com", "pw12345!")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.songs = [
+            Song.objects.create(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3",
+                                cover=f"song_covers/{i}.jpg" if i % 2 else None)
+            for i in range(6)
+        ]
+
+    def add_playlists(self, count):
+        for i in range(count):
+            playlist = Playlist.objects.create(user=self.user, name=f"Mix {i}")
+            playlist.songs.set(self.songs[i % 3:])
+            if i % 2:
+                PlaylistActivity.objects.create(user=self.user, playlist=playlist, open_count=i)
+
+    def test_constant_query_count(self):
+        self.add_playlists(1)
+        with self.assertNumQueries(2):  # playlists (+ activity subqueries) and songs
+            self.client.get("/api/users/playlists/")
+        self.add_playlists(10)
+        with self.assertNumQueries(2):
+            response = self.client.get("/api/users/playlists/")
+        self.assertEqual(len(response.data), 11)
+
+    def test_fast_serializer_matches_drf(self):
+        self.add_playlists(4)
+        playlists = list(playlists_with_activity(self.user))
+        self.assertEqual(
+            serialize_playlists(playlists),
+            [dict(row) for row in PlaylistSerializer(playlists, many=True).data],
+        )
+
+
+class RecentPlaylistsQueryTests(TestCase):
+    def setUp(self):
+        open_buffer.flush()
+        self.user = User.objects.create_user("regular", "regular@example.com", "pw12345!")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.songs = [
+            Song.objects.create(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3",
+                                cover=f"song_covers/{i}.jpg" if i % 2 else None)
+            for i in range(8)
+        ]
+        for i in range(12):
+            playlist = Playlist.objects.create(user=self.user, name=f"Mix {i}")
+            append_songs(playlist, [song.id for song in self.songs[i % 4:]])
+            PlaylistActivity.objects.create(user=self.user, playlist=playlist, open_count=(i * 7) % 12)
+
+    def test_one_ranked_query_per_list_shape(self):
+        with self.assertNumQueries(2):   # ranked activities + songs
+            full = self.client.get("/api/users/playlists/recent/").data
+        with self.assertNumQueries(2):   # ranked activities + windowed summaries
+            summary = self.client.get("/api/users/playlists/recent/?mode=summary&covers=2").data
+
+        recent = sorted(PlaylistActivity.objects.all(), key=lambda a: a.last_opened, reverse=True)[:5]
+        self.assertEqual([p["id"] for p in full["recent_playlists"]], [a.playlist_id for a in recent])
+        for key in ("recent_playlists", "frequent_playlists"):
+            self.assertEqual([p["id"] for p in summary[key]], [p["id"] for p in full[key]])
+            for short, long in zip(summary[key], full[key]):
+                self.assertNotIn("songs", short)
+                self.assertEqual(short["song_count"], len(long["songs"]))
+                self.assertEqual(short["song_covers"], [s["cover_url"] for s in long["songs"] if s["cover_url"]][:2])
+        self.assertEqual(len(full["frequent_playlists"]), 5)
+        self.assertTrue(all(p["open_count"] >= q["open_count"]
+                            for p, q in zip(full["frequent_playlists"], full["frequent_playlists"][1:])))
+
+    def test_bad_mode(self):
+        response = self.client.get("/api/users/playlists/recent/?mode=tiny")
+        self.assertEqual(response.status_code, 400)
+
+
+# ---------------- Catalog Cache ---------------- #
+class CatalogCacheTests(TestCase):
+    url = "/api/users/songs/public/"
+
+    @classmethod
+    def setUpTestData(cls):
+        Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/a.mp3", emotion="Love")
+
+    def test_song_writes_invalidate_cached_responses(self):
+        first = self.client.get(self.url)
+        with self.assertNumQueries(0):   # served from the catalog cache
+            self.assertEqual(self.client.get(self.url).json(), first.json())
+
+        Song.objects.create(title="Monica", artist="Anirudh", src="songs/b.mp3")
+        second = self.client.get(self.url)
+        self.assertEqual([song["title"] for song in second.json()], ["Tum Hi Ho", "Monica"])
+        self.assertNotEqual(second["ETag"], first["ETag"])
+
+        Song.objects.get(title="Monica").delete()
+        self.assertEqual(len(self.client.get(self.url).json()), 1)
+
+    def test_if_none_match_returns_304_until_the_catalog_changes(self):
+        etag = self.client.get(self.url)["ETag"]
+        with self.assertNumQueries(0):
+            response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["ETag"], etag)
+
+        song = Song.objects.get()
+        song.title = "Tum Hi Ho (Live)"
+        song.save()
+        response = self.client.get(self.url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()[0]["title"], "Tum Hi Ho (Live)")
+
+    def test_several_workers_need_a_shared_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            require_shared_catalog_cache("WEB_CONCURRENCY=4")
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            **settings.CACHES,
+            "catalog": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+        }):
+            require_shared_catalog_cache("WEB_CONCURRENCY=4")
+            version = catalog_version()
+            bump_catalog_version()
+            self.assertEqual(catalog_version(), version + 1)
+
+    def test_file_cache_bumps_are_not_lost(self):
+        with tempfile.TemporaryDirectory() as location, override_settings(CACHES={
+            **settings.CACHES,
+            "catalog": {"BACKEND": "django.core.cache.backends.filebased.FileBasedCache", "LOCATION": location},
+        }):
+            version = catalog_version()
+            threads = [threading.Thread(target=lambda: [bump_catalog_version() for _ in range(25)]) for _ in range(8)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(catalog_version(), version + 200)
+
+
+# ---------------- Search Index ---------------- #
+class SongSearchIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.silver = Song.objects.create(title="Hi Ho Silver", artist="The Riders", src="songs/1.mp3")
+        cls.tum = Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/2.mp3",
+                                      emotion="Love", language="Hindi")
+        cls.shiver = Song.objects.create(title="Shiver", artist="Coldplay", src="songs/3.mp3")
+        cls.channa = Song.objects.create(title="Channa Mereya", artist="Arijit Singh", src="songs/4.mp3",
+                                         emotion="Sadness", language="Hindi")
+
+    def built(self):
+        index = SongSearchIndex()
+        index.build()
+        return index
+
+    def test_substring_then_fuzzy_ranking(self):
+        index = self.built()
+        # title prefix, then word prefix, then inside a word
+        self.assertEqual(index.search("hi")["song_ids"], [self.silver.id, self.tum.id, self.shiver.id])
+        self.assertEqual(index.search("Chana Mereya")["song_ids"], [self.channa.id])   # typo
+        self.assertEqual(index.search("arijit")["artists"], ["Arijit Singh"])
+        self.assertEqual(index.search("HINDI")["languages"], ["Hindi"])
+        self.assertEqual(index.search("  ")["song_ids"], [])
+
+    def test_upsert_and_remove_keep_the_index_current(self):
+        index = self.built()
+        song = Song(id=self.channa.id, title="Channa Mereya (Unplugged)", artist="Arijit Singh",
+                    emotion="Sadness", language="Hindi")
+        index.upsert(song)
+        self.assertEqual(index.search("unplugged")["song_ids"], [self.channa.id])
+        index.remove(self.tum.id)
+        self.assertEqual(index.search("tum")["song_ids"], [])
+        self.assertEqual(index.search("hindi")["languages"], ["Hindi"])   # Channa still counts
+        index.remove(self.channa.id)
+        self.assertEqual(index.search("arijit")["artists"], [])
+        self.assertEqual(index.suggest("ari"), [])
+
+    def test_changes_during_a_build_are_replayed_after_the_swap(self):
+        snapshot = list(Song.objects.values_list("id", "title", "artist", "emotion", "language"))
+        index = SongSearchIndex()
+        index._building = True   # a build has read `snapshot` and is still running
+        saved = Song.objects.create(title="Kesariya", artist="Arijit Singh", src="songs/5.mp3")
+        index.upsert(saved)
+        index.remove(self.shiver.id)
+        self.shiver.delete()
+
+        rows = mock.Mock()
+        rows.iterator.return_value = iter(snapshot)
+        with mock.patch.object(Song.objects, "values_list", return_value=rows):
+            index.build()
+        self.assertTrue(index.ready)
+        self.assertEqual(index.search("kesariya")["song_ids"], [saved.id])
+        self.assertEqual(index.search("shiver")["song_ids"], [])
+        self.assertEqual(index.version, catalog_version())
+
+    def test_cold_index_falls_back_to_the_database(self):
+        with mock.patch.object(song_index, "ensure_fresh", return_value=False), \
+                mock.patch.object(song_index, "search") as index_search:
+            songs, artists, emotions, languages = search_catalog("arijit")
+            self.assertEqual((songs, artists), ([], ["Arijit Singh"]))
+            songs, artists, emotions, languages = search_catalog("mereya")
+            self.assertEqual((songs, artists), ([self.channa], []))
+            index_search.assert_not_called()
+
+class SuggestSongsTests(TestCase):
+    url = "/api/users/songs/suggest/"
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("typist", password="pw")
+        cls.tum = Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/1.mp3")
+        for i in range(15):
+            Song.objects.create(title=f"Tune {i}", artist="Various", src=f"songs/t{i}.mp3")
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.index = SongSearchIndex()
+        self.index.build()
+        patcher = mock.patch("users.views.song_index", self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_word_prefixes_match(self):
+        response = self.client.get(self.url, {"q": "ho"})
+        self.assertEqual(response.data["suggestions"], [{"type": "song", "id": self.tum.id, "label": "Tum Hi Ho"}])
+        labels = [s["label"] for s in self.client.get(self.url, {"q": "ARI"}).data["suggestions"]]
+        self.assertEqual(labels, ["Arijit Singh"])
+
+    def test_limit_is_clamped(self):
+        self.assertEqual(len(self.client.get(self.url, {"q": "tu", "limit": 100}).data["suggestions"]), 10)
+        self.assertEqual(len(self.client.get(self.url, {"q": "tu", "limit": 0}).data["suggestions"]), 1)
+        self.assertEqual(self.client.get(self.url, {"q": "tu", "limit": "x"}).status_code, 400)
+
+    def test_etag_covers_the_echoed_query(self):
+        first = self.client.get(self.url, {"q": "Tum"})
+        response = self.client.get(self.url, {"q": "Tum"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual(response.status_code, 304)
+        other = self.client.get(self.url, {"q": "tum"}, HTTP_IF_NONE_MATCH=first["ETag"])
+        self.assertEqual((other.status_code, other.data["query"]), (200, "tum"))
+        self.assertNotEqual(other["ETag"], first["ETag"])
+
+    def test_cold_index_uses_a_title_prefix_query(self):
+        with mock.patch.object(self.index, "ensure_fresh", return_value=False):
+            response = self.client.get(self.url, {"q": "tum", "limit": 3})
+        self.assertEqual(response.data["suggestions"], [{"type": "song", "id": self.tum.id, "label": "Tum Hi Ho"}])
+        self.assertIn("no-store", response["Cache-Control"])
+        self.assertFalse(response.has_header("ETag"))
+
+
+# ---------------- Song Encoding ---------------- #
+class SongEncoderParityTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/Tum Hi Ho.mp3",
+                            cover="song_covers/Tum_Hi_Ho (1).jpg", emotion="Love", language="Hindi")
+        Song.objects.create(title="Ullaallaa", artist="Anirudh", src="songs/உல்லாலா.mp3")
+        Song.objects.create(title="Empty", artist="Nobody", src="")
+
+    class ReferenceSerializer(serializers.ModelSerializer):
+        """SongSerializer as it was before SongEncoder: DRF fields and per-row methods."""
+        cover_url = serializers.SerializerMethodField()
+        cover_variants = serializers.SerializerMethodField()
+        src_url = serializers.SerializerMethodField()
+
+        class Meta:
+            model = Song
+            fields = SongSerializer.Meta.fields
+
+        def absolute(self, field):
+            request = self.context.get("request")
+            if not field:
+                return None
+            return request.build_absolute_uri(field.url) if request else field.url
+
+        def get_cover_url(self, obj):
+            return self.absolute(obj.cover)
+
+        def get_cover_variants(self, obj):
+            if obj.cover:
+                return variant_urls(obj.cover.name, variant_base_url(self.context.get("request")))
+            return None
+
+        def get_src_url(self, obj):
+            return self.absolute(obj.src)
+
+    def drf_output(self, songs, request=None):
+        serializer = self.ReferenceSerializer(context={"request": request} if request else {})
+        return [serializer.to_representation(song) for song in songs]
+
+    def assert_same_bytes(self, ours, theirs):
+        renderer = JSONRenderer()
+        self.assertEqual(renderer.render(ours), renderer.render(theirs))
+
+    @override_settings(ALLOWED_HOSTS=["harmoura.test"])
+    def test_matches_serializer_with_and_without_request(self):
+        songs = list(Song.objects.order_by("id"))
+        request = RequestFactory().get("/api/users/songs/search/", HTTP_HOST="harmoura.test:8000")
+        for req in (None, request):
+            expected = self.drf_output(songs, req)
+            self.assert_same_bytes(SongEncoder(req).encode_many(songs), expected)
+            self.assert_same_bytes(SongEncoder(req).encode_many(song_rows(Song.objects.order_by("id"))), expected)
+            self.assert_same_bytes(
+                SongSerializer(songs, many=True, context={"request": req} if req else {}).data, expected,
+            )
+
+    def test_tracks_match_recommendation_shape(self):
+        request = RequestFactory().get("/")
+        songs = list(Song.objects.order_by("id"))
+
+        def absolute(field):
+            return request.build_absolute_uri(field.url) if field else None
+
+        def variants(field):
+            if not field:
+                return None
+            return {size: request.build_absolute_uri(f"/api/users/images/{size}/{filepath_to_uri(field.name)}")
+                    for size in ("thumb", "medium", "large")}
+
+        expected = [
+            {"id": s.id, "title": s.title, "artist": s.artist, "src": absolute(s.src),
+             "cover_url": absolute(s.cover), "cover_variants": variants(s.cover),
+             "emotion": s.emotion, "language": s.language, "duration": s.duration}
+            for s in songs
+        ]
+        self.assert_same_bytes(SongEncoder(request).tracks(songs), expected)
+
+
+@unittest.skipUnless(orjson, "orjson not installed")
+class FastJSONTests(TestCase):
+    payload = {
+        "results": [
+            {"id": 1, "title": "உல்லாலா \u2028 line\u2029sep", "cover_url": None, "score": 2.5,
+             "created_at": datetime(2025, 8, 1, 12, 30, 5, 123456, tzinfo=dt_timezone.utc)},
+            {"id": 2, "title": "Tum Hi Ho", "tags": ("a", "b"), "price": Decimal("1.50"),
+             "big": 2 ** 70, "naive": datetime(2025, 8, 1, 12, 30)},
+        ],
+        "next_cursor": None,
+    }
+
+    def test_renderer_matches_drf_bytes(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_renderer_falls_back_for_indent(self):
+        context = {"indent": 2}
+        self.assertEqual(
+            FastJSONRenderer().render(self.payload, "application/json", context),
+            JSONRenderer().render(self.payload, "application/json", context),
+        )
+
+    @override_settings(FAST_JSON=False)
+    def test_disabled_uses_drf(self):
+        self.assertEqual(FastJSONRenderer().render(self.payload), JSONRenderer().render(self.payload))
+
+    def test_parser_matches_drf(self):
+        body = '{"name": "Chill \u00e9", "song_ids": [1, 2, 3], "nested": {"x": null}}'.encode()
+        self.assertEqual(
+            FastJSONParser().parse(io.BytesIO(body)), JSONParser().parse(io.BytesIO(body)),
+        )
+        with self.assertRaises(ParseError):
+            FastJSONParser().parse(io.BytesIO(b"{bad"))
+
+    def test_parser_keeps_wide_integers(self):
+        body = b'{"id": 1180591620717411303424, "small": 7}'
+        self.assertEqual(FastJSONParser().parse(io.BytesIO(body)), {"id": 2 ** 70, "small": 7})
+
+    def test_renderer_handles_non_finite_floats_like_drf(self):
+        payload = {"cover_url": None, "loudness_db": float("nan")}
+        with self.assertRaisesMessage(ValueError, "Out of range float values"):
+            FastJSONRenderer().render(payload)
+        with mock.patch.object(JSONRenderer, "strict", False):
+            self.assertEqual(FastJSONRenderer().render(payload), JSONRenderer().render(payload))
+
+
+class SongStreamTests(TestCase):
+    data = bytes(range(256)) * 40   # 10 KiB
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("listener", password="pw")
+        cls.song = Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/tum_hi_ho.mp3")
+
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        os.makedirs(os.path.join(media.name, "songs"))
+        with open(os.path.join(media.name, "songs", "tum_hi_ho.mp3"), "wb") as fh:
+            fh.write(self.data)
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        self.url = f"/api/users/songs/{self.song.id}/stream/"
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b"".join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_body(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.data)
+        self.assertEqual(response["Content-Length"], str(len(self.data)))
+        self.assertEqual(response["Accept-Ranges"], "bytes")
+        self.assertEqual(response["Content-Type"], "audio/mpeg")
+
+    def test_ranges(self):
+        size = len(self.data)
+        for header, start, end in (("bytes=100-199", 100, 199), ("bytes=10000-", 10000, size - 1),
+                                   ("bytes=-50", size - 50, size - 1), ("bytes=0-999999", 0, size - 1)):
+            response, body = self.get(Range=header)
+            self.assertEqual(response.status_code, 206, header)
+            self.assertEqual(body, self.data[start:end + 1], header)
+            self.assertEqual(response["Content-Range"], f"bytes {start}-{end}/{size}")
+            self.assertEqual(response["Content-Length"], str(end - start + 1))
+
+    def test_unsatisfiable_and_ignored_ranges(self):
+        response, _ = self.get(Range=f"bytes={len(self.data)}-")
+        self.assertEqual(response.status_code, 416)
+        self.assertEqual(response["Content-Range"], f"bytes */{len(self.data)}")
+        for header in ("bytes=0-1,5-9", "items=0-1", "bytes=9-1"):
+            response, body = self.get(Range=header)
+            self.assertEqual((response.status_code, body), (200, self.data), header)
+
+    def test_conditional_requests(self):
+        etag = self.get()[0]["ETag"]
+        self.assertEqual(self.get(**{"If-None-Match": etag})[0].status_code, 304)
+        self.assertEqual(self.get(Range="bytes=0-9", **{"If-Range": etag})[0].status_code, 206)
+        response, body = self.get(Range="bytes=0-9", **{"If-Range": '"stale"'})
+        self.assertEqual((response.status_code, body), (200, self.data))
+
+    def test_signed_stream_url_and_auth_required(self):
+        client = APIClient()
+        self.assertEqual(client.get(self.url).status_code, 401)
+        # The access token itself is not accepted in the query string
+        self.assertEqual(client.get(self.url, {"token": str(AccessToken.for_user(self.user))}).status_code, 401)
+
+        data = self.client.get(f"/api/users/songs/{self.song.id}/stream-url/").json()
+        self.assertEqual(data["expires_in"], 300)
+        response = client.get(data["url"], headers={"Range": "bytes=0-3"})
+        self.assertEqual(response.status_code, 206)
+
+        other = Song.objects.create(title="Kesariya", artist="Arijit Singh", src="songs/tum_hi_ho.mp3")
+        token = make_stream_token(self.user, self.song.id)
+        self.assertEqual(client.get(f"/api/users/songs/{other.id}/stream/", {"token": token}).status_code, 401)
+        with override_settings(STREAM_TOKEN_MAX_AGE=-1):
+            self.assertEqual(client.get(self.url, {"token": token}).status_code, 401)
+        self.assertEqual(self.client.get("/api/users/songs/999999/stream/").status_code, 404)
+        self.assertEqual(self.client.get("/api/users/songs/999999/stream-url/").status_code, 404)
+
+    @override_settings(MEDIA_OFFLOAD_HEADER="X-Accel-Redirect", MEDIA_OFFLOAD_PREFIX="/protected-media/")
+    def test_offload_header(self):
+        response, body = self.get(Range="bytes=0-9")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["X-Accel-Redirect"], "/protected-media/songs/tum_hi_ho.mp3")
+        self.assertEqual(body, b"")
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)   # no index/analysis threads on the test DB
+class ImageVariantTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(media.name, "song_covers"))
+        Image.new("RGB", (2000, 1000), "orange").save(os.path.join(media.name, "song_covers", "big cover.jpg"))
+        self.name = "song_covers/big cover.jpg"
+        self.client = APIClient()
+
+    def open_variant(self, variant, webp=False):
+        return Image.open(os.path.join(self.media, variant_name(self.name, variant, webp)))
+
+    def test_generate_all_sizes_once(self):
+        written = generate_variants(self.name)
+        self.assertEqual(len(written), 6)
+        self.assertEqual(self.open_variant("thumb").size, (160, 80))
+        self.assertEqual(self.open_variant("large", webp=True).size, (1024, 512))
+        self.assertEqual(self.open_variant("medium", webp=True).format, "WEBP")
+        self.assertEqual(generate_variants(self.name), [])   # up to date, nothing rebuilt
+
+    def test_view_generates_lazily_and_negotiates_webp(self):
+        url = f"/api/users/images/medium/{filepath_to_uri(self.name)}"
+        self.assertEqual(self.client.get(url).status_code, 404)   # anonymous callers never trigger a build
+        self.client.force_authenticate(User.objects.create_user("viewer", password="pw"))
+        response = self.client.get(url, headers={"Accept": "image/avif,image/webp,*/*"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/webp")
+        self.assertIn("Accept", response["Vary"])
+        response.close()
+        self.assertEqual(images._locks, {})
+        self.client.force_authenticate(None)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], "image/jpeg")
+        response.close()
+        self.assertEqual(self.client.get("/api/users/images/medium/../settings.py").status_code, 404)
+        self.assertEqual(self.client.get("/api/users/images/huge/song_covers/big%20cover.jpg").status_code, 404)
+        self.assertEqual(self.client.get("/api/users/images/thumb/song_covers/missing.jpg").status_code, 404)
+
+    def test_profile_pictures_need_a_signed_in_user(self):
+        os.makedirs(os.path.join(self.media, "profile_pictures"))
+        Image.new("RGB", (400, 400), "teal").save(os.path.join(self.media, "profile_pictures", "me.jpg"))
+        generate_variants("profile_pictures/me.jpg")
+        url = "/api/users/images/thumb/profile_pictures/me.jpg"
+        self.assertEqual(self.client.get(url).status_code, 401)
+        self.client.force_authenticate(User.objects.create_user("viewer", password="pw"))
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response["Cache-Control"].startswith("private"))
+        response.close()
+
+    def test_replacing_a_cover_deletes_its_variants(self):
+        song = Song.objects.create(title="Kesariya", artist="Arijit Singh", src="songs/k.mp3", cover=self.name)
+        generate_variants(self.name)
+        Image.new("RGB", (300, 300), "blue").save(os.path.join(self.media, "song_covers", "new.png"))
+        song.cover = "song_covers/new.png"
+        with self.captureOnCommitCallbacks(execute=True), mock.patch("users.signals.queue_analysis"):
+            song.save()
+        self.assertFalse(os.path.exists(os.path.join(self.media, variant_name(self.name, "thumb"))))
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)
+class ProfilePictureUploadTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        settings_override = override_settings(MEDIA_ROOT=media.name, UPLOAD_STAGING_DIR=os.path.join(media.name, "staging"))
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        self.user = User.objects.create_user("uploader", password="pw")
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def upload(self, data, name="me.png"):
+        fh = io.BytesIO(data)
+        fh.name = name
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put("/api/users/profile/", {"first_name": "Asha", "profile_picture": fh},
+                                       format="multipart")
+        return response
+
+    @staticmethod
+    def image_bytes(size, fmt="PNG", color="teal"):
+        buffer = io.BytesIO()
+        Image.new("RGB", size, color).save(buffer, fmt)
+        return buffer.getvalue()
+
+    def test_upload_is_processed_in_background(self):
+        response = self.upload(self.image_bytes((3000, 1500)))
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(response.data["profile_picture_status"], "pending")
+        self.assertEqual(response.data["first_name"], "Asha")
+
+        profile = self.client.get("/api/users/profile/").data
+        self.assertEqual(profile["profile_picture_status"], "ready")
+        stored = UserProfile.objects.get(user=self.user).profile_picture
+        self.assertEqual(Image.open(stored.path).size, (1024, 512))
+        first = stored.path
+
+        self.upload(self.image_bytes((200, 200), "JPEG", "red"), name="second.jpg")
+        stored = UserProfile.objects.get(user=self.user).profile_picture
+        self.assertTrue(stored.name.endswith("second.jpg"))
+        self.assertFalse(os.path.exists(first))   # old picture cleaned up
+        self.assertEqual(os.listdir(os.path.join(self.media, "staging")), [])
+
+    def test_only_one_profile_picture_is_staged(self):
+        first, second, other = (io.BytesIO(self.image_bytes((40, 40))) for _ in range(3))
+        first.name, second.name, other.name = "a.png", "b.png", "notes.png"
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.put("/api/users/profile/",
+                                       {"profile_picture": [first, second], "attachment": other},
+                                       format="multipart")
+        self.assertEqual(response.status_code, 202)
+        stored = UserProfile.objects.get(user=self.user).profile_picture.name
+        self.assertEqual(os.path.splitext(os.path.basename(stored))[0], "b")   # the last part wins
+        self.assertEqual(os.listdir(os.path.join(self.media, "staging")), [])
+
+    def test_interrupted_upload_leaves_no_staged_file(self):
+        request = RequestFactory().put("/")
+        handler = StagedUploadHandler(request)
+        handler.new_file("profile_picture", "me.png", "image/png", None)
+        handler.receive_data_chunk(b"partial", 0)
+        handler.upload_interrupted()
+        self.assertEqual(os.listdir(os.path.join(self.media, "staging")), [])
+        with self.assertRaises(SkipFile):
+            handler.new_file("attachment", "notes.txt", "text/plain", None)
+
+    def test_invalid_upload_fails_and_keeps_old_picture(self):
+        self.upload(self.image_bytes((50, 50)))
+        before = UserProfile.objects.get(user=self.user).profile_picture.name
+        with self.assertLogs("users.uploads", "WARNING"):
+            self.assertEqual(self.upload(b"not an image", name="evil.png").status_code, 202)
+        profile = UserProfile.objects.get(user=self.user)
+        self.assertEqual(profile.profile_picture_status, "failed")
+        self.assertEqual(profile.profile_picture.name, before)
+
+
+class AudioAnalysisTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.media = media.name
+        os.makedirs(os.path.join(media.name, "songs"))
+
+    def write_wav(self, name, seconds=2.0, rate=8000, channels=2):
+        t = np.arange(int(seconds * rate)) / rate
+        tone = 0.5 * np.sin(2 * np.pi * 440 * t) * (t < seconds / 2)   # tone, then silence
+        frames = np.repeat((tone * 32767).astype("<i2")[:, None], channels, axis=1)
+        path = os.path.join(self.media, "songs", name)
+        with wave.open(path, "wb") as out:
+            out.setnchannels(channels)
+            out.setsampwidth(2)
+            out.setframerate(rate)
+            out.writeframes(frames.tobytes())
+        return path
+
+    def test_wav_analysis(self):
+        result = analyze_file(self.write_wav("tone.wav"))
+        self.assertEqual(result["duration"], 2.0)
+        self.assertEqual(result["sample_rate"], 8000)
+        self.assertEqual(result["bitrate"], 256)    # 8 kHz * 16 bit * 2 ch
+        self.assertAlmostEqual(result["loudness_db"], 20 * np.log10(0.5 / np.sqrt(2) / np.sqrt(2)), delta=0.1)
+        peaks = waveform_peaks(result["waveform"])
+        self.assertEqual(len(peaks), 256)
+        self.assertAlmostEqual(max(peaks[:120]), 0.5, delta=0.01)
+        self.assertEqual(max(peaks[136:]), 0)
+
+    def test_mp3_header_fallback(self):
+        # MPEG-1 Layer III, 128 kbps, 44.1 kHz frames of 417 bytes, behind an ID3v2 tag
+        frame = bytes([0xFF, 0xFB, 0x90, 0x64]) + bytes(413)
+        path = os.path.join(self.media, "songs", "cbr.mp3")
+        with open(path, "wb") as fh:
+            fh.write(b"ID3\x04\x00\x00\x00\x00\x00\x0a" + bytes(10) + frame * 100)
+        with mock.patch("users.audio.shutil.which", return_value=None):
+            result = analyze_file(path)
+        self.assertEqual((result["sample_rate"], result["waveform"]), (44100, None))
+        self.assertAlmostEqual(result["duration"], 100 * 1152 / 44100, delta=0.05)
+
+    def test_stuck_ffmpeg_is_killed(self):
+        # A decoder that floods stderr and never exits: must time out, not hang.
+        bin_dir = tempfile.TemporaryDirectory()
+        self.addCleanup(bin_dir.cleanup)
+        fake = os.path.join(bin_dir.name, "ffmpeg")
+        with open(fake, "w") as fh:
+            fh.write(f"#!{sys.executable}\nimport sys, time\nsys.stderr.write('x' * (1 << 20))\ntime.sleep(60)\n")
+        os.chmod(fake, 0o755)
+        path = os.path.join(self.media, "songs", "corrupt.mp3")
+        with open(path, "wb") as fh:
+            fh.write(bytes(64))
+        env = {"PATH": bin_dir.name + os.pathsep + os.environ.get("PATH", "")}
+        with mock.patch.dict(os.environ, env), mock.patch("users.audio.FFMPEG_TIMEOUT", 1):
+            with self.assertRaisesMessage(AudioAnalysisError, "did not finish"):
+                analyze_file(path)
+
+    def test_song_analysis_is_stored_and_served(self):
+        self.write_wav("stored.wav", seconds=1.0)
+        with override_settings(MEDIA_ROOT=self.media, BACKGROUND_TASKS_EAGER=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                song = Song.objects.create(title="Tone", artist="Lab", src="songs/stored.wav")
+            song.refresh_from_db()
+            self.assertEqual((song.duration, song.sample_rate, song.analyzed_src), (1.0, 8000, "songs/stored.wav"))
+            with self.captureOnCommitCallbacks(execute=True):
+                song.title = "Tone (renamed)"
+                song.save()   # same file: not analyzed again
+            self.assertFalse(analyze_song(999999))
+
+            client = APIClient()
+            client.force_authenticate(User.objects.create_user("viewer"))
+            data = client.get(f"/api/users/songs/{song.id}/waveform/").json()
+            self.assertEqual((data["duration"], data["points"]), (1.0, 256))
+            self.assertEqual(client.get("/api/users/songs/").json()[0]["duration"], 1.0)
+
+
+class ImportSongsTests(TestCase):
+    def setUp(self):
+        media = tempfile.TemporaryDirectory()
+        source = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        self.addCleanup(source.cleanup)
+        self.media, self.source = media.name, source.name
+        settings_override = override_settings(MEDIA_ROOT=media.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        os.makedirs(os.path.join(source.name, "audio"))
+        for name in ("one.mp3", "two.mp3", "three.wav"):
+            with open(os.path.join(source.name, "audio", name), "wb") as fh:
+                fh.write(name.encode() * 100)
+        Image.new("RGB", (10, 10)).save(os.path.join(source.name, "cover.jpg"))
+        self.manifest = os.path.join(source.name, "songs.csv")
+        with open(self.manifest, "w") as fh:
+            fh.write("title,artist,file,cover,emotion,language\n"
+                     "One,Alpha,audio/one.mp3,cover.jpg,love,hindi\n"
+                     "Bad,Beta,audio/missing.mp3,,,\n"
+                     "Two,Alpha,audio/two.mp3,cover.jpg,Sadness,\n"
+                     "Three,Gamma,audio/three.wav,,Joy,\n"
+                     "Escape,Delta,../../etc/passwd.mp3,,,\n")
+
+    def run_import(self, *args):
+        call_command("import_songs", self.manifest, "--media-dir", self.source, "--batch-size", "2",
+                     "--local-cache", *args, stdout=io.StringIO())
+
+    def test_import_resume_and_rejects(self):
+        version = catalog_version()
+        self.run_import()
+        songs = list(Song.objects.order_by("id").values_list("title", "src", "cover", "emotion", "language"))
+        self.assertEqual(songs, [
+            ("One", "songs/one.mp3", "song_covers/cover.jpg", "Love", "Hindi"),
+            ("Two", "songs/two.mp3", "song_covers/cover.jpg", "Sadness", None),
+        ])
+        self.assertTrue(os.path.isfile(os.path.join(self.media, "songs", "one.mp3")))
+        self.assertNotEqual(catalog_version(), version)
+        with open(self.manifest + ".rejects.jsonl") as fh:
+            self.assertEqual([json.loads(line)["row"] for line in fh], [2, 4, 5])
+
+        self.run_import()   # checkpoint: nothing left to read
+        os.remove(self.manifest + ".checkpoint")
+        self.run_import()   # no checkpoint: committed rows are recognised
+        self.assertEqual(Song.objects.count(), 2)
+
+    def test_refuses_process_local_cache(self):
+        with self.assertRaisesMessage(CommandError, "process-local"):
+            call_command("import_songs", self.manifest, "--media-dir", self.source, stdout=io.StringIO())
+        self.assertFalse(Song.objects.exists())
+
+    def test_same_basename_files_get_separate_storage_names(self):
+        os.makedirs(os.path.join(self.source, "live"))
+        with open(os.path.join(self.source, "live", "one.mp3"), "wb") as fh:
+            fh.write(b"live" * 100)
+        with open(self.manifest, "w") as fh:
+            fh.write("title,artist,file\nOne,Alpha,audio/one.mp3\nOne (Live),Alpha,live/one.mp3\n")
+        self.run_import()
+        stored = dict(Song.objects.values_list("title", "src"))
+        self.assertEqual(stored["One"], "songs/one.mp3")
+        self.assertNotEqual(stored["One (Live)"], "songs/one.mp3")
+        with open(os.path.join(self.media, stored["One (Live)"]), "rb") as fh:
+            self.assertEqual(fh.read(), b"live" * 100)
+
+    def test_same_basename_and_size_in_a_later_run_is_not_reused(self):
+        self.run_import()
+        os.makedirs(os.path.join(self.source, "remaster"))
+        with open(os.path.join(self.source, "remaster", "one.mp3"), "wb") as fh:
+            fh.write(b"ONE.MP3" * 100)   # same size as audio/one.mp3, different bytes
+        with open(self.manifest, "w") as fh:
+            fh.write("title,artist,file\nOne (Remaster),Alpha,remaster/one.mp3\n")
+        self.run_import("--restart")
+        src = Song.objects.get(title="One (Remaster)").src.name
+        self.assertNotEqual(src, "songs/one.mp3")
+        with open(os.path.join(self.media, src), "rb") as fh:
+            self.assertEqual(fh.read(), b"ONE.MP3" * 100)
+        with open(os.path.join(self.media, "songs", "one.mp3"), "rb") as fh:
+            self.assertEqual(fh.read(), b"one.mp3" * 100)
+
+
+@override_settings(PASSWORD_HASH_ITERATIONS=1000)
+class LoginTests(TestCase):
+    def setUp(self):
+        cache.clear()   # throttle history
+        self.user = User.objects.create_user("asha", email="Asha@Example.com", password="s3cret-pass")
+
+    def login(self, email, password="s3cret-pass", **extra):
+        return self.client.post("/api/users/login/", {"email": email, "password": password},
+                                content_type="application/json", **extra)
+
+    def test_email_lookup_is_case_insensitive(self):
+        response = self.login("  asha@example.COM")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["username"], "asha")
+        self.assertEqual(self.login("asha@example.com", "wrong").status_code, 401)
+        self.assertEqual(self.login("nobody@example.com").status_code, 401)
+
+    def test_exact_email_wins_over_case_variant(self):
+        # Legacy accounts whose emails differ only by case must both stay reachable.
+        User.objects.create_user("asha2", email="asha@example.com", password="other-pass")
+        self.assertEqual(self.login("Asha@Example.com").json()["username"], "asha")
+        self.assertEqual(self.login("asha@example.com", "other-pass").json()["username"], "asha2")
+        self.assertEqual(self.login("ASHA@EXAMPLE.COM").json()["username"], "asha")   # no exact match: oldest
+
+    def test_login_rehashes_to_configured_cost(self):
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$1000$"))
+        with override_settings(PASSWORD_HASH_ITERATIONS=2000):
+            self.assertEqual(self.login("asha@example.com").status_code, 200)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith("pbkdf2_sha256$2000$"))
+        self.assertTrue(self.user.check_password("s3cret-pass"))
+
+    def test_floods_are_throttled_before_hashing(self):
+        with mock.patch.object(LoginAccountThrottle, "THROTTLE_RATES", {"login_account": "3/min"}), \
+                mock.patch.object(LoginIPThrottle, "THROTTLE_RATES", {"login_ip": "5/min"}):
+            codes = [self.login("asha@example.com", "guess").status_code for _ in range(3)]
+            with mock.patch("django.contrib.auth.base_user.AbstractBaseUser.check_password") as check:
+                codes.append(self.login("ASHA@example.com", "guess").status_code)
+                check.assert_not_called()
+            codes.append(self.login("other@example.com").status_code)
+            codes.append(self.login("third@example.com").status_code)   # 6th from this IP
+        self.assertEqual(codes, [401, 401, 401, 429, 401, 429])
+
+
+class CachedAuthenticationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("cached", password="pw")
+        UserProfile.objects.create(user=cls.user, emotion_stats={"Love": 3}, language_stats={"Hindi": 2})
+        Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/a.mp3", emotion="Love", language="Hindi")
+
+    def setUp(self):
+        user_cache.clear()
+        profile_cache.clear()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+
+    def test_warm_requests_skip_user_and_profile_queries(self):
+        self.assertEqual(self.client.get("/api/users/songs/recommended/").status_code, 200)
+        with self.assertNumQueries(1):   # only the recommended songs themselves
+            response = self.client.get("/api/users/songs/recommended/")
+        self.assertEqual([song["title"] for song in response.json()], ["Tum Hi Ho"])
+
+    def test_saves_invalidate(self):
+        self.client.get("/api/users/songs/recommended/")
+        User.objects.filter(pk=self.user.pk).update(is_active=False)
+        self.assertEqual(self.client.get("/api/users/songs/recommended/").status_code, 200)   # cached
+        self.user.is_active = False
+        self.user.save()
+        self.assertEqual(self.client.get("/api/users/songs/recommended/").status_code, 401)
+
+    def test_profile_cache_follows_folds(self):
+        self.client.get("/api/users/profile/")
+        with self.captureOnCommitCallbacks(execute=True):
+            PlayEvent.objects.create(user=self.user, song=Song.objects.get())
+            fold_play_events()
+        self.assertEqual(self.client.get("/api/users/profile/").json()["emotion_stats"], {"Love": 4})
+
+
+class ReplicaRouterTests(TestCase):
+    def setUp(self):
+        self.router = PrimaryReplicaRouter()
+        replica = {**settings.DATABASES["default"], "TEST": {"MIRROR": "default"}}
+        patcher = mock.patch.dict(settings.DATABASES, {"replica": replica})
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_only_wrapped_reads_use_replica(self):
+        self.assertIsNone(self.router.db_for_read(Song))
+        seen = read_from_replica(lambda: (self.router.db_for_read(Song), self.router.db_for_write(Song)))()
+        self.assertEqual(seen, ("replica", "default"))
+        self.assertIsNone(self.router.db_for_read(Song))
+        self.assertFalse(self.router.allow_migrate("replica", "users"))
+
+    def test_flag_reset_after_errors_and_in_async_views(self):
+        async def view():
+            return self.router.db_for_read(Song)
+
+        @read_from_replica
+        def failing():
+            raise ValueError
+
+        with self.assertRaises(ValueError):
+            failing()
+        self.assertIsNone(self.router.db_for_read(Song))
+        self.assertEqual(asyncio.run(read_from_replica(view)()), "replica")
+
+    def test_no_replica_configured(self):
+        del settings.DATABASES["replica"]
+        self.assertIsNone(read_from_replica(lambda: self.router.db_for_read(Song))())
+
+    def test_catalog_fills_skip_a_lagging_replica_after_writes(self):
+        @read_from_replica
+        @cached_catalog_view
+        def view(request):
+            # Stands in for a replica that has not replayed the write yet.
+            return Response({"db": self.router.db_for_read(Song) or "default"})
+
+        request = RequestFactory().get("/replica-lag/")
+        Song.objects.create(title="Monica", artist="Anirudh", src="songs/b.mp3")   # bumps the version
+        response = view(request)
+        self.assertEqual(response.data, {"db": "default"})
+        self.assertFalse(response.has_header("ETag"))
+
+        with override_settings(REPLICA_LAG_SECONDS=0):   # replica caught up
+            response = view(request)
+            self.assertEqual(response.data, {"db": "replica"})   # the primary read was not cached
+            self.assertTrue(response.has_header("ETag"))
+        self.assertEqual(view(request).data, {"db": "replica"})
+
+
+class SongLookupIndexTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("tiles", password="pw")
+        Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/a.mp3", emotion="Love", language="Hindi")
+        Song.objects.create(title="Perfect", artist="Ed Sheeran", src="songs/b.mp3", emotion="Love", language="English")
+
+    def test_tile_lookups_use_lower_indexes(self):
+        for field, value in (("artist", "arijit singh"), ("emotion", "LOVE"), ("language", "hindi")):
+            plan = songs_matching(field, value).explain()
+            self.assertIn(f"song_{field}_lower_idx", plan)
+        self.assertIn("song_language_idx", Song.objects.filter(language="Hindi").explain())
+
+    def test_tiles_still_match_case_insensitively(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        response = self.client.get("/api/users/songs/artist/ARIJIT SINGH/")
+        self.assertEqual([song["title"] for song in response.json()["songs"]], ["Tum Hi Ho"])
+        response = self.client.get("/api/users/songs/emotion/love/")
+        self.assertEqual(len(response.json()["songs"]), 2)
+
+
+class CatalogResponseTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        Song.objects.bulk_create([
+            Song(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3", language="Hindi") for i in range(7)
+        ])
+        cls.ids = list(Song.objects.order_by("id").values_list("id", flat=True))
+
+    def get(self, **params):
+        return self.client.get("/api/users/songs/public/", params)
+
+    def test_keyset_pages_cover_the_catalog_once(self):
+        seen, cursor = [], None
+        while True:
+            data = self.get(limit=3, fields="id", **({"cursor": cursor} if cursor else {})).json()
+            seen += [row["id"] for row in data["results"]]
+            cursor = data["next_cursor"]
+            if cursor is None:
+                break
+        self.assertEqual(seen, self.ids)
+        self.assertEqual(len(self.get(limit=7).json()["results"]), 7)
+        self.assertIsNone(self.get(limit=7).json()["next_cursor"])
+
+    def test_limit_is_clamped(self):
+        Song.objects.bulk_create([Song(title=f"Extra {i}", artist="B", src=f"songs/x{i}.mp3") for i in range(MAX_PAGE_SIZE)])
+        bump_catalog_version()   # bulk_create sends no signals
+        data = self.get(limit=100000, fields="id").json()
+        self.assertEqual(len(data["results"]), MAX_PAGE_SIZE)
+        self.assertIsNotNone(data["next_cursor"])
+
+    def test_bad_queries_are_400(self):
+        for params in ({"cursor": "%%%"}, {"cursor": "bm9wZQ"}, {"fields": "id,secret"},
+                       {"limit": "0"}, {"limit": "ten"}, {"stream": "xml"}):
+            response = self.get(**params)
+            self.assertEqual(response.status_code, 400, params)
+            self.assertIn("error", response.json())
+
+    def test_streams_ndjson_and_json(self):
+        response = self.get(stream="ndjson", fields="id,title")
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).splitlines()
+        self.assertEqual([json.loads(line) for line in lines],
+                         [{"id": song_id, "title": f"Song {i}"} for i, song_id in enumerate(self.ids)])
+
+        response = self.get(stream="json", fields="id", limit=2, cursor=encode_cursor(self.ids[2]))
+        self.assertEqual(response["Content-Type"], "application/json")
+        self.assertEqual(json.loads(b"".join(response.streaming_content)),
+                         [{"id": self.ids[3]}, {"id": self.ids[4]}])
+
+
+@override_settings(BACKGROUND_TASKS_EAGER=True)   # no index/analysis threads on the test DB
+class AsyncReadViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("async", password="pw")
+        UserProfile.objects.create(user=cls.user, emotion_stats={"Love": 2}, language_stats={"Hindi": 1})
+        songs = [
+            Song.objects.create(title="Tum Hi Ho", artist="Arijit Singh", src="songs/a.mp3",
+                                cover="song_covers/a.jpg", emotion="Love", language="Hindi"),
+            Song.objects.create(title="Perfect", artist="Ed Sheeran", src="songs/b.mp3", emotion="Love", language="English"),
+        ]
+        playlist = Playlist.objects.create(user=cls.user, name="Mix")
+        playlist.songs.set(songs)
+        PlaylistActivity.objects.create(user=cls.user, playlist=playlist, open_count=3)
+
+    def setUp(self):
+        cache.clear()
+        self.token = f"Bearer {AccessToken.for_user(self.user)}"
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=self.token)
+
+    async def call(self, view, path, token=True, **kwargs):
+        headers = {"Authorization": self.token} if token else {}
+        return await view(AsyncRequestFactory().get(path, headers=headers), **kwargs)
+
+    async def test_bodies_match_drf_views(self):
+        cases = [
+            (async_views.all_songs, "/api/users/songs/", {}),
+            (async_views.all_songs, "/api/users/songs/?limit=1&fields=id,title", {}),
+            (async_views.public_songs, "/api/users/songs/public/", {}),
+            (async_views.search_songs_artists_emotions, "/api/users/songs/search/?q=perfect", {}),
+            (async_views.songs_by_artist, "/api/users/songs/artist/arijit singh/", {"artist_name": "arijit singh"}),
+            (async_views.recommended_songs, "/api/users/songs/recommended/?k=2", {}),
+            (async_views.recent_playlists, "/api/users/playlists/recent/", {}),
+        ]
+        for view, path, kwargs in cases:
+            with self.subTest(path=path):
+                expected = await sync_to_async(self.client.get)(path)
+                response = await self.call(view, path, **kwargs)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(json.loads(response.content), expected.json())
+
+    async def test_auth_errors_and_conditional_requests(self):
+        response = await self.call(async_views.all_songs, "/api/users/songs/", token=False)
+        self.assertEqual(response.status_code, 401)
+        self.assertIn("Bearer", response["WWW-Authenticate"])
+        response = await self.call(async_views.public_songs, "/api/users/songs/public/", token=False)
+        self.assertEqual(response.status_code, 200)
+        response = await self.call(async_views.all_songs, "/api/users/songs/?limit=oops")
+        self.assertEqual(json.loads(response.content), {"error": "limit must be an integer"})
+
+        etag = (await self.call(async_views.all_songs, "/api/users/songs/"))["ETag"]
+        request = AsyncRequestFactory().get(
+            "/api/users/songs/", headers={"Authorization": self.token, "If-None-Match": etag},
+        )
+        self.assertEqual((await async_views.all_songs(request)).status_code, 304)
+
+    @mock.patch("users.catalog.STREAM_CHUNK_SIZE", 1)
+    async def test_stream_pages_through_chunks(self):
+        response = await self.call(async_views.all_songs, "/api/users/songs/?stream=json&fields=title")
+        body = b"".join([chunk async for chunk in response.streaming_content])
+        self.assertEqual(json.loads(body), [{"title": "Tum Hi Ho"}, {"title": "Perfect"}])
+        response = await self.call(async_views.all_songs, "/api/users/songs/?stream=ndjson&limit=1&fields=id")
+        self.assertEqual(len([chunk async for chunk in response.streaming_content]), 1)
+
+
+class PlaylistBatchEditTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("batcher", password="pw")
+        cls.songs = [Song.objects.create(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3") for i in range(6)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.playlist = Playlist.objects.create(user=self.user, name="Batch")
+        self.playlist.songs.set(self.songs[:2])
+        self.url = f"/api/users/playlists/{self.playlist.id}/songs/batch/"
+
+    def ids(self, *indexes):
+        return [self.songs[i].id for i in indexes]
+
+    def test_applies_set_difference(self):
+        response = self.client.post(self.url, {"add": self.ids(1, 2, 3, 2), "remove": self.ids(0, 5)}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.data["added"], self.ids(2, 3))
+        self.assertEqual(response.data["removed"], self.ids(0))
+        self.assertEqual(response.data["song_count"], 3)
+        self.assertEqual(response["ETag"], response.data["etag"])
+        self.assertEqual(set(self.playlist.songs.values_list("id", flat=True)), set(self.ids(1, 2, 3)))
+
+    def test_if_match_rejects_stale_edits(self):
+        etag = self.client.post(self.url, {"add": self.ids(2)}, format="json")["ETag"]
+        self.playlist.songs.add(self.songs[4])   # edited elsewhere: updated_at moves
+        response = self.client.post(self.url, {"remove": self.ids(2)}, format="json", HTTP_IF_MATCH=etag)
+        self.assertEqual(response.status_code, 412)
+        self.assertIn(self.songs[2], self.playlist.songs.all())
+
+    def test_rejects_bad_input_without_writing(self):
+        missing = max(self.ids(*range(6))) + 1
+        response = self.client.post(self.url, {"add": [self.songs[3].id, missing]}, format="json")
+        self.assertEqual(response.status_code, 404)
+        self.assertEqual(self.client.post(self.url, {"add": "1"}, format="json").status_code, 400)
+        self.assertEqual(self.client.post(self.url, {"add": self.ids(3), "remove": self.ids(3)}, format="json").status_code, 400)
+        self.assertEqual(self.playlist.songs.count(), 2)
+
+
+class PlaylistOrderingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("orderer", password="pw")
+        cls.songs = [Song.objects.create(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3") for i in range(5)]
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.playlist = Playlist.objects.create(user=self.user, name="Ordered")
+        append_songs(self.playlist, [song.id for song in self.songs])
+
+    def order(self):
+        return list(PlaylistSong.objects.filter(playlist=self.playlist).order_by("rank").values_list("song_id", flat=True))
+
+    def test_rank_keys_always_fit_between(self):
+        rng = random.Random(3)
+        keys = spread_ranks(20)
+        for _ in range(2000):
+            i = rng.randrange(len(keys) + 1)
+            low, high = (keys[i - 1] if i else None), (keys[i] if i < len(keys) else None)
+            key = rank_between(low, high)
+            self.assertTrue((low is None or low < key) and (high is None or key < high), (low, key, high))
+            keys.insert(i, key)
+        self.assertLess(max(map(len, keys)), 12)
+
+    def test_move_rewrites_one_row(self):
+        ids = [song.id for song in self.songs]
+        before = dict(PlaylistSong.objects.values_list("song_id", "rank"))
+        response = self.client.post(
+            f"/api/users/playlists/{self.playlist.id}/songs/move/", {"song_id": ids[4], "after_id": ids[0]}, format="json",
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(), [ids[0], ids[4], ids[1], ids[2], ids[3]])
+        after = dict(PlaylistSong.objects.values_list("song_id", "rank"))
+        self.assertEqual({song_id for song_id in ids if before[song_id] != after[song_id]}, {ids[4]})
+
+        self.client.post(f"/api/users/playlists/{self.playlist.id}/songs/batch/",
+                         {"move": [{"song_id": ids[3]}]}, format="json")   # no neighbours: to the top
+        playlists = self.client.get("/api/users/playlists/").json()
+        self.assertEqual([song["id"] for song in playlists[0]["songs"]], [ids[3], ids[0], ids[4], ids[1], ids[2]])
+
+    def test_long_move_batches_keep_keys_short(self):
+        ids = [song.id for song in self.songs]
+        # Ping-pong two songs right after the first one: each move halves the same gap
+        moves = [{"song_id": ids[3 + i % 2], "after_id": ids[0]} for i in range(400)]
+        response = self.client.post(f"/api/users/playlists/{self.playlist.id}/songs/batch/",
+                                    {"move": moves}, format="json")
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(self.order(), [ids[0], ids[4], ids[3], ids[1], ids[2]])
+        ranks = dict(PlaylistSong.objects.values_list("song_id", "rank"))
+        self.assertLessEqual(max(map(len, ranks.values())), REBALANCE_LENGTH)
+        self.assertEqual({entry["song_id"]: entry["rank"] for entry in response.data["moved"]},
+                         {song_id: ranks[song_id] for song_id in ids[3:]})
+
+    def test_offset_limit_window(self):
+        response = self.client.get(f"/api/users/playlists/{self.playlist.id}/songs/?offset=1&limit=2")
+        self.assertEqual(response.data["count"], 5)
+        self.assertEqual([song["id"] for song in response.data["songs"]], [self.songs[1].id, self.songs[2].id])
+        plan = Song.objects.filter(playlist_entries__playlist=self.playlist).order_by("playlist_entries__rank").explain()
+        self.assertIn("playlistsong_rank_idx", plan)
+
+    def test_rebalance_keeps_order(self):
+        ids = self.order()
+        for i, song_id in enumerate(ids):   # keys as long as repeated squeezing leaves them
+            PlaylistSong.objects.filter(song_id=song_id).update(rank="1" * 30 + str(i + 1))
+        call_command("rebalance_playlists", stdout=io.StringIO())
+        self.assertEqual(self.order(), ids)
+        self.assertTrue(all(len(rank) <= 2 for rank in PlaylistSong.objects.values_list("rank", flat=True)))
+
+
+@override_settings(PLAYLIST_SYNC_SETTLE_SECONDS=0)
+class PlaylistSyncTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = User.objects.create_user("syncer", password="pw")
+        cls.other = User.objects.create_user("bystander", password="pw")
+        cls.songs = [Song.objects.create(title=f"Song {i}", artist="A", src=f"songs/{i}.mp3") for i in range(4)]
+
+    def setUp(self):
+        open_buffer.flush()
+        self.client = APIClient()
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {AccessToken.for_user(self.user)}")
+        self.playlist = Playlist.objects.create(user=self.user, name="Synced")
+        append_songs(self.playlist, [self.songs[0].id, self.songs[1].id])
+
+    def sync(self, token=None):
+        response = self.client.get("/api/users/playlists/sync/", {"since": token} if token else {})
+        self.assertEqual(response.status_code, 200)
+        return response.data
+
+    def test_snapshot_then_deltas(self):
+        snapshot = self.sync()
+        self.assertTrue(snapshot["reset"])
+        self.assertEqual([song["id"] for song in snapshot["playlists"][0]["songs"]],
+                         [self.songs[0].id, self.songs[1].id])
+        self.assertEqual(self.sync(snapshot["token"])["playlists"], [])
+
+        ids = [song.id for song in self.songs]
+        self.client.post(f"/api/users/playlists/{self.playlist.id}/songs/batch/",
+                         {"add": [ids[2]], "remove": [ids[0]], "move": [{"song_id": ids[2]}]}, format="json")
+        gone = Playlist.objects.create(user=self.user, name="Short-lived")
+        self.client.delete(f"/api/users/playlists/delete/{gone.id}/")
+        Playlist.objects.create(user=self.other, name="Not mine")
+
+        delta = self.sync(snapshot["token"])
+        self.assertFalse(delta["reset"])
+        self.assertEqual(delta["deleted"], [gone.id])
+        [playlist] = delta["playlists"]
+        self.assertEqual(playlist["id"], self.playlist.id)
+        self.assertEqual([song["id"] for song in playlist["songs"]], [ids[2]])   # only what changed
+        self.assertEqual(playlist["removed_song_ids"], [ids[0]])
+        self.assertEqual(playlist["songs"][0]["rank"],
+                         PlaylistSong.objects.get(playlist=self.playlist, song_id=ids[2]).rank)
+        self.assertEqual(self.sync(delta["token"])["playlists"], [])
+
+    @mock.patch("users.activity_buffer.tasks.schedule")
+    def test_owner_opens_are_logged(self, _schedule):
+        token = self.sync()["token"]
+        self.client.post(f"/api/users/playlists/{self.playlist.id}/open/")
+        [playlist] = self.sync(token)["playlists"]   # still buffered
+        self.assertEqual(playlist["open_count"], 1)
+        open_buffer.flush()
+        [playlist] = self.sync(token)["playlists"]
+        self.assertEqual((playlist["open_count"], playlist["songs"]), (1, []))
+
+    def test_batch_moves_log_one_change(self):
+        ids = [song.id for song in self.songs[:2]]
+        before = PlaylistChange.objects.count()
+        moves = [{"song_id": ids[i % 2], "after_id": ids[(i + 1) % 2]} for i in range(50)]
+        self.client.post(f"/api/users/playlists/{self.playlist.id}/songs/batch/", {"move": moves}, format="json")
+        self.assertEqual(
+            list(PlaylistChange.objects.order_by("id")[before:].values_list("kind", "song_ids")),
+            [(PlaylistChange.SONGS_MOVED, ids)],
+        )
+
+    def test_changes_committed_late_are_not_skipped(self):
+        token = self.sync()["token"]
+        with override_settings(PLAYLIST_SYNC_SETTLE_SECONDS=30):
+            append_songs(self.playlist, [self.songs[2].id])
+            slow = PlaylistChange.objects.latest("id")
+            append_songs(self.playlist, [self.songs[3].id])
+            # The first write's transaction hasn't committed when the client syncs
+            slow.delete()
+            delta = self.sync(token)
+            self.assertEqual([song["id"] for song in delta["playlists"][0]["songs"]], [self.songs[3].id])
+            slow.save()
+            delta = self.sync(delta["token"])
+        self.assertEqual([song["id"] for song in delta["playlists"][0]["songs"]],
+                         [self.songs[2].id, self.songs[3].id])
+
+    def test_stale_or_bad_tokens(self):
+        with mock.patch("time.time", return_value=0):   # issued in 1970
+            token = self.sync()["token"]
+        self.assertTrue(self.sync(token)["reset"])
+        response = self.client.get("/api/users/playlists/sync/", {"since": "not-a-token"})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,24 @@
+from rest_framework.throttling import SimpleRateThrottle
+
+
+# ---------------- Login Throttling ---------------- #
+# Checked before the user lookup and password hash, so a flood is turned
+# away with a cache hit instead of a PBKDF2 run. Rates live in
+# REST_FRAMEWORK["DEFAULT_THROTTLE_RATES"] under the scopes below.
+class LoginIPThrottle(SimpleRateThrottle):
+    scope = "login_ip"
+
+    def get_cache_key(self, request, view):
+        return self.cache_format % {"scope": self.scope, "ident": self.get_ident(request)}
+
+
+class LoginAccountThrottle(SimpleRateThrottle):
+    """Limits attempts per email, whichever addresses they come from."""
+
+    scope = "login_account"
+
+    def get_cache_key(self, request, view):
+        email = request.data.get("email")
+        if not isinstance(email, str) or not email.strip():
+            return None
+        return self.cache_format % {"scope": self.scope, "ident": email.strip().lower()}
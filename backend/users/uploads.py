@@ -0,0 +1,174 @@
+import io
+import logging
+import os
+import tempfile
+import uuid
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import UploadedFile
+from django.core.files.uploadhandler import FileUploadHandler, SkipFile, StopUpload
+from django.db import transaction
+from PIL import Image, ImageOps, UnidentifiedImageError
+
+from . import tasks
+from .authentication import invalidate_profiles
+from .images import delete_variants
+from .models import UserProfile, user_directory_path
+
+logger = logging.getLogger(__name__)
+
+# ---------------- Profile Picture Uploads ---------------- #
+# The request only streams the upload to a staging file and marks the
+# profile "pending"; decoding, validation, resizing, the storage write and
+# removal of the previous picture all happen on the background pool.
+PROFILE_PICTURE_MAX_BYTES = 10 * 1024 * 1024
+PROFILE_PICTURE_MAX_PX = 1024
+PROFILE_PICTURE_FORMATS = ("JPEG", "PNG", "WEBP", "GIF")
+
+
+def staging_dir():
+    path = getattr(settings, "UPLOAD_STAGING_DIR", None) or os.path.join(tempfile.gettempdir(), "harmoura-uploads")
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+class StagedUploadedFile(UploadedFile):
+    """An upload already written to a staging file that outlives the request."""
+
+    @property
+    def staged_path(self):
+        return self.file.name
+
+
+class StagedUploadHandler(FileUploadHandler):
+    """
+    Writes each chunk of the profile_picture part straight to the staging
+    directory (nothing is held in memory) and drops uploads over
+    PROFILE_PICTURE_MAX_BYTES mid-stream, flagging the request with
+    upload_too_large. Other file parts are skipped unread. The view calls
+    discard_staged() when it is done so no staged file outlives a request
+    that didn't hand it to the background pool.
+    """
+
+    def __init__(self, request=None):
+        super().__init__(request)
+        self.staged_paths = []
+
+    def new_file(self, field_name, *args, **kwargs):
+        if field_name != "profile_picture":
+            raise SkipFile
+        super().new_file(field_name, *args, **kwargs)
+        self.size = 0
+        self.file = tempfile.NamedTemporaryFile(dir=staging_dir(), suffix=".upload", delete=False)
+        self.staged_paths.append(self.file.name)
+
+    def receive_data_chunk(self, raw_data, start):
+        self.size += len(raw_data)
+        if self.size > PROFILE_PICTURE_MAX_BYTES:
+            self.file.close()
+            _remove_staged(self.file.name)
+            self.request.upload_too_large = True
+            raise StopUpload
+        self.file.write(raw_data)
+        return None
+
+    def file_complete(self, file_size):
+        self.file.close()
+        return StagedUploadedFile(
+            open(self.file.name, "rb"), self.file_name, self.content_type,
+            file_size, self.charset, self.content_type_extra,
+        )
+
+    def upload_interrupted(self):
+        """The body ended mid-file: drop the partial staging file (completed ones are closed)."""
+        if hasattr(self, "file") and not self.file.closed:
+            self.file.close()
+            _remove_staged(self.file.name)
+
+    def discard_staged(self, keep=None):
+        """Remove every file staged for this request except `keep`."""
+        for path in self.staged_paths:
+            if path != keep:
+                _remove_staged(path)
+
+
+def _remove_staged(path):
+    try:
+        os.unlink(path)
+    except FileNotFoundError:
+        pass
+
+
+def _delete_media(name):
+    default_storage.delete(name)
+    delete_variants(name)
+
+
+def _render_picture(path):
+    """Decode, validate and downscale; returns (bytes, extension)."""
+    with Image.open(path) as probe:
+        if probe.format not in PROFILE_PICTURE_FORMATS:
+            raise ValueError(f"Unsupported image format {probe.format}")
+        probe.verify()
+    with Image.open(path) as image:
+        image.draft("RGB", (PROFILE_PICTURE_MAX_PX,) * 2)
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((PROFILE_PICTURE_MAX_PX,) * 2, Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        if image.mode in ("RGBA", "LA", "P"):
+            image.save(buffer, "PNG", optimize=True)
+            return buffer.getvalue(), ".png"
+        image.convert("RGB").save(buffer, "JPEG", quality=88, optimize=True, progressive=True)
+        return buffer.getvalue(), ".jpg"
+
+
+def process_profile_picture(profile_id, job, staged_path, filename):
+    """Background step: store the processed picture unless a newer upload superseded it."""
+    try:
+        try:
+            data, ext = _render_picture(staged_path)
+        except (OSError, ValueError, UnidentifiedImageError, Image.DecompressionBombError):
+            logger.warning("Rejected profile picture upload for profile %s", profile_id, exc_info=True)
+            UserProfile.objects.filter(pk=profile_id, profile_picture_job=job).update(
+                profile_picture_status=UserProfile.PICTURE_FAILED, profile_picture_job="",
+            )
+            invalidate_profiles(*UserProfile.objects.filter(pk=profile_id).values_list("user_id", flat=True))
+            return None
+
+        profile = UserProfile.objects.select_related("user").get(pk=profile_id)
+        stem = os.path.splitext(os.path.basename(filename))[0] or "picture"
+        saved = default_storage.save(user_directory_path(profile, stem + ext), ContentFile(data))
+        with transaction.atomic():
+            profile = UserProfile.objects.select_for_update().get(pk=profile_id)
+            if profile.profile_picture_job != job:
+                transaction.on_commit(lambda: tasks.submit(_delete_media, saved))
+                return None
+            old = profile.profile_picture.name
+            profile.profile_picture = saved
+            profile.profile_picture_status = UserProfile.PICTURE_READY
+            profile.profile_picture_job = ""
+            profile.save(update_fields=["profile_picture", "profile_picture_status", "profile_picture_job"])
+            if old and old != saved:
+                transaction.on_commit(lambda: tasks.submit(_delete_media, old))
+        return saved
+    finally:
+        _remove_staged(staged_path)
+
+
+def accept_profile_picture(profile, upload):
+    """Mark the profile pending and queue processing of a staged upload."""
+    job = uuid.uuid4().hex
+    staged_path = upload.staged_path
+    upload.close()
+    UserProfile.objects.filter(pk=profile.pk).update(
+        profile_picture_status=UserProfile.PICTURE_PENDING, profile_picture_job=job,
+    )
+    profile.profile_picture_status = UserProfile.PICTURE_PENDING
+    profile.profile_picture_job = job
+    transaction.on_commit(lambda: invalidate_profiles(profile.user_id))
+    transaction.on_commit(lambda: tasks.submit(
+        process_profile_picture, profile.pk, job, staged_path, upload.name,
+    ))
+    return job
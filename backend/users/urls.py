@@ -1,15 +1,24 @@
+from django.conf import settings
 from django.urls import path
 from .views import (
     RegisterView, LoginView,
     user_playlists, create_playlist, add_song_to_playlist,
-    remove_song_from_playlist, delete_playlist,
+    remove_song_from_playlist, delete_playlist, batch_edit_playlist,
+    move_playlist_song, playlist_songs, sync_playlists,
     all_songs, public_songs, play_song, recommended_songs,
     recent_playlists, frequent_playlists, playlist_open,  # ✅ added playlist_open
-    search_songs_artists_emotions,
+    search_songs_artists_emotions, suggest_songs,
     songs_by_artist, songs_by_emotion, songs_by_language,
-    user_profile
+    user_profile, SongStreamView, song_stream_url, ImageVariantView, song_waveform
 )
 
+# Async-native versions of the hot read endpoints for ASGI deployments
+if settings.ASYNC_READ_VIEWS:
+    from .async_views import (  # noqa: F811
+        all_songs, public_songs, recommended_songs, recent_playlists,
+        search_songs_artists_emotions, songs_by_artist, songs_by_emotion, songs_by_language,
+    )
+
 urlpatterns = [
     # ---------------- Auth ---------------- #
     path("register/", RegisterView.as_view(), name="register"),
@@ -18,9 +27,13 @@ urlpatterns = [
     # ---------------- Playlists ---------------- #
     path("playlists/", user_playlists, name="user_playlists"),
     path("playlists/create/", create_playlist, name="create_playlist"),
+    path("playlists/sync/", sync_playlists, name="sync_playlists"),
     path("playlists/<int:playlist_id>/add-song/", add_song_to_playlist, name="add_song_to_playlist"),
     path("playlists/<int:playlist_id>/remove-song/", remove_song_from_playlist, name="remove_song_from_playlist"),
     path("playlists/delete/<int:playlist_id>/", delete_playlist, name="delete_playlist"),
+    path("playlists/<int:playlist_id>/songs/", playlist_songs, name="playlist_songs"),
+    path("playlists/<int:playlist_id>/songs/batch/", batch_edit_playlist, name="batch_edit_playlist"),
+    path("playlists/<int:playlist_id>/songs/move/", move_playlist_song, name="move_playlist_song"),
 
     # ---------------- Recent & Frequent Playlists ---------------- #
     path("playlists/recent/", recent_playlists, name="recent_playlists"),
@@ -31,13 +44,20 @@ urlpatterns = [
     path("songs/", all_songs, name="all_songs"),
     path("songs/public/", public_songs, name="public_songs"),
     path("songs/recommended/", recommended_songs, name="recommended_songs"),
+    path("songs/<int:song_id>/stream/", SongStreamView.as_view(), name="stream_song"),
+    path("songs/<int:song_id>/stream-url/", song_stream_url, name="song_stream_url"),
+    path("songs/<int:song_id>/waveform/", song_waveform, name="song_waveform"),
 
     # ---------------- Search & Filter ---------------- #
     path("songs/search/", search_songs_artists_emotions, name="search_songs_artists_emotions"),
+    path("songs/suggest/", suggest_songs, name="suggest_songs"),
     path("songs/artist/<str:artist_name>/", songs_by_artist, name="songs_by_artist"),
     path("songs/emotion/<str:emotion_name>/", songs_by_emotion, name="songs_by_emotion"),
     path("songs/language/<str:language_name>/", songs_by_language, name="songs_by_language"),
 
+    # ---------------- Images ---------------- #
+    path("images/<str:variant>/<path:name>", ImageVariantView.as_view(), name="image_variant"),
+
     # ---------------- User Profile ---------------- #
     path("profile/", user_profile, name="user_profile"),
 
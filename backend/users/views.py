@@ -2,9 +2,14 @@ from rest_framework import generics, status
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from django.contrib.auth.models import User
-from django.contrib.auth.hashers import check_password
-from .serializers import RegisterSerializer, SongSerializer, PlaylistSerializer
-from .models import Song, Playlist
+from .serializers import RegisterSerializer, SongSerializer, serialize_playlists
+from .models import Song, Playlist, PlaylistActivity
+from django.db.models import OuterRef, Subquery, prefetch_related_objects
+from .catalog import CatalogQueryError, catalog_response, parse_limit
+from .encoders import SongEncoder, song_rows
+from .cache import cached_catalog_view
+from .routers import read_from_replica
+from .ordering import append_songs, move_song, move_songs, ordered_songs, remove_songs, set_songs
 from rest_framework_simplejwt.tokens import RefreshToken
 from datetime import timedelta
 from rest_framework.permissions import IsAuthenticated
@@ -24,7 +29,10 @@ def get_tokens_for_user(user, remember_me: bool = False):
 
 # ---------------- User Authentication ---------------- #
 
+from django.db.models import Case, When
+from django.db.models.functions import Lower
 from rest_framework.permissions import AllowAny
+from .throttles import LoginAccountThrottle, LoginIPThrottle
 
 class RegisterView(generics.CreateAPIView):
     queryset = User.objects.all()
@@ -45,18 +53,27 @@ class RegisterView(generics.CreateAPIView):
 
 class LoginView(APIView):
     permission_classes = [AllowAny]  # allow anyone to login
+    throttle_classes = [LoginIPThrottle, LoginAccountThrottle]
 
     def post(self, request):
         email = request.data.get("email")
         password = request.data.get("password")
         remember_me = bool(request.data.get("remember_me", False))
 
-        try:
-            user = User.objects.get(email=email)
-        except User.DoesNotExist:
+        if not isinstance(email, str) or not isinstance(password, str):
+            return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
+
+        # Case-insensitive match served by the auth_user_email_lower_idx index.
+        # Legacy accounts may differ only by case, so an exact match wins.
+        email = email.strip()
+        user = User.objects.annotate(email_lower=Lower("email"))\
+            .filter(email_lower=email.lower())\
+            .order_by(Case(When(email=email, then=0), default=1), "id").first()
+        if user is None:
             return Response({"error": "Invalid credentials"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        if check_password(password, user.password):
+        # check_password() rehashes to the configured cost when it differs
+        if user.check_password(password):
             tokens = get_tokens_for_user(user, remember_me)
             return Response({
                 "message": "Login successful",
@@ -71,18 +88,44 @@ class LoginView(APIView):
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
 def all_songs(request):
-    songs = Song.objects.all()
-    serializer = SongSerializer(songs, many=True)
-    return Response(serializer.data)
+    """
+    Full song catalog. Supports ?limit=&cursor= paging, ?stream=ndjson|json
+    and ?fields= (see catalog_response).
+    """
+    return catalog_response(request, Song.objects.all())
+
+
+def playlists_with_activity(user):
+    """
+    The user's playlists with songs prefetched and their open activity
+    annotated, so serializing any number of playlists costs two queries.
+    """
+    activity = PlaylistActivity.objects.filter(user=user, playlist=OuterRef("pk"))
+    return Playlist.objects.filter(user=user)\
+        .prefetch_related(ordered_songs())\
+        .annotate(
+            last_opened=Subquery(activity.values("last_opened")[:1]),
+            open_count=Subquery(activity.values("open_count")[:1]),
+        )
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def user_playlists(request):
-    playlists = Playlist.objects.filter(user=request.user)
-    serializer = PlaylistSerializer(playlists, many=True)
-    return Response(serializer.data)
+    playlists = list(playlists_with_activity(request.user))
+
+    # Include opens still waiting in the write-behind buffer
+    pending = open_buffer.pending_for_user(request.user.id)
+    for playlist in playlists:
+        if playlist.id in pending:
+            count, opened = pending[playlist.id]
+            playlist.open_count = (playlist.open_count or 0) + count
+            playlist.last_opened = max(filter(None, (playlist.last_opened, opened)))
+
+    return Response(serialize_playlists(playlists))
 
 
 @api_view(["POST"])
@@ -96,11 +139,12 @@ def create_playlist(request):
 
     playlist = Playlist.objects.create(user=request.user, name=name)
     if song_ids:
-        songs = Song.objects.filter(id__in=song_ids)
-        playlist.songs.set(songs)
+        order = {str(song_id): i for i, song_id in reversed(list(enumerate(song_ids)))}
+        found = Song.objects.filter(id__in=song_ids).values_list("id", flat=True)
+        set_songs(playlist, sorted(found, key=lambda song_id: order[str(song_id)]))
 
-    serializer = PlaylistSerializer(playlist)
-    return Response(serializer.data, status=status.HTTP_201_CREATED)
+    prefetch_related_objects([playlist], ordered_songs())
+    return Response(serialize_playlists([playlist])[0], status=status.HTTP_201_CREATED)
 
 
 @api_view(["POST"])
@@ -116,9 +160,9 @@ def add_song_to_playlist(request, playlist_id):
     except Song.DoesNotExist:
         return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    playlist.songs.add(song)
-    serializer = PlaylistSerializer(playlist)
-    return Response(serializer.data)
+    append_songs(playlist, [song.id])
+    prefetch_related_objects([playlist], ordered_songs())
+    return Response(serialize_playlists([playlist])[0])
 
 
 @api_view(["POST"])
@@ -134,9 +178,203 @@ def remove_song_from_playlist(request, playlist_id):
     except Song.DoesNotExist:
         return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
 
-    playlist.songs.remove(song)
-    serializer = PlaylistSerializer(playlist)
-    return Response(serializer.data)
+    remove_songs(playlist, [song.id])
+    prefetch_related_objects([playlist], ordered_songs())
+    return Response(serialize_playlists([playlist])[0])
+
+
+# ---------------- Batch Playlist Edits ---------------- #
+from django.db import transaction
+from .cache import etag_matches
+from .models import PlaylistSong
+
+PLAYLIST_BATCH_MAX = 1000   # song ids per request
+
+
+def playlist_etag(playlist):
+    """Validator for a playlist's song list; updated_at moves on every edit."""
+    return f'"p{playlist.id}-{int(playlist.updated_at.timestamp() * 1_000_000)}"'
+
+
+def _is_id(value):
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _song_id_list(value, name):
+    if value is None:
+        return []
+    if not isinstance(value, list) or not all(_is_id(i) for i in value):
+        raise ValueError(f"{name} must be a list of song ids")
+    return list(dict.fromkeys(value))
+
+
+def _op_list(value):
+    if value is None:
+        return []
+    if not isinstance(value, list):
+        raise ValueError("move must be a list")
+    return value
+
+
+def _move_op(op):
+    """(song_id, before_id, after_id) from {"song_id", "before_id"?, "after_id"?}."""
+    if not isinstance(op, dict) or not _is_id(op.get("song_id")):
+        raise ValueError("Each move needs a song_id")
+    neighbours = (op.get("before_id"), op.get("after_id"))
+    if not all(i is None or _is_id(i) for i in neighbours):
+        raise ValueError("before_id and after_id must be song ids")
+    return (op["song_id"], *neighbours)
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def batch_edit_playlist(request, playlist_id):
+    """
+    Add, remove and move many songs in one transaction.
+    Expects JSON: { "add": [<song id>, ...], "remove": [<song id>, ...],
+                    "move": [{"song_id": .., "after_id": .., "before_id": ..}, ...] }
+    Added songs are appended in the given order; moves apply afterwards
+    (see move_playlist_song). Only the difference against the stored list
+    is written. Returns the delta plus the new ETag; send it back as
+    If-Match to reject edits made against a stale copy (412).
+    """
+    try:
+        add = _song_id_list(request.data.get("add"), "add")
+        remove = _song_id_list(request.data.get("remove"), "remove")
+        moves = [_move_op(op) for op in _op_list(request.data.get("move"))]
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+    if len(add) + len(remove) + len(moves) > PLAYLIST_BATCH_MAX:
+        return Response({"error": f"At most {PLAYLIST_BATCH_MAX} song ids per batch"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if set(add) & set(remove):
+        return Response({"error": "A song can't be both added and removed"}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        playlist = Playlist.objects.select_for_update()\
+            .filter(id=playlist_id, user=request.user).only("id", "user_id", "updated_at").first()
+        if playlist is None:
+            return Response({"error": "Playlist not found"}, status=status.HTTP_404_NOT_FOUND)
+        if "If-Match" in request.headers and not etag_matches(request, playlist_etag(playlist), "If-Match"):
+            return Response({"error": "Playlist was modified"}, status=status.HTTP_412_PRECONDITION_FAILED)
+
+        current = set(PlaylistSong.objects.filter(playlist=playlist).values_list("song_id", flat=True))
+        added = [song_id for song_id in add if song_id not in current]
+        removed = [song_id for song_id in remove if song_id in current]
+        if added:
+            found = set(Song.objects.filter(id__in=added).values_list("id", flat=True))
+            missing = [song_id for song_id in added if song_id not in found]
+            if missing:
+                return Response({"error": f"Songs not found: {', '.join(map(str, missing))}"},
+                                status=status.HTTP_404_NOT_FOUND)
+        if removed:
+            remove_songs(playlist, removed)
+        if added:
+            append_songs(playlist, added)
+        try:
+            moved = move_songs(playlist, moves)
+        except (LookupError, ValueError) as exc:
+            transaction.set_rollback(True)
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = playlist_etag(playlist)
+    response = Response({
+        "id": playlist.id,
+        "added": added,
+        "removed": removed,
+        "moved": [{"song_id": song_id, "rank": rank} for song_id, rank in moved.items()],
+        "song_count": len(current) + len(added) - len(removed),
+        "etag": etag,
+    })
+    response["ETag"] = etag
+    return response
+
+
+@api_view(["POST"])
+@permission_classes([IsAuthenticated])
+def move_playlist_song(request, playlist_id):
+    """
+    Reorder one song; only its row is written.
+    Expects JSON: { "song_id": <id>, "after_id": <id>?, "before_id": <id>? }
+    The song lands right after after_id / right before before_id; with
+    neither it moves to the top.
+    """
+    try:
+        song_id, before_id, after_id = _move_op(request.data)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    with transaction.atomic():
+        playlist = Playlist.objects.select_for_update()\
+            .filter(id=playlist_id, user=request.user).only("id", "user_id", "updated_at").first()
+        if playlist is None:
+            return Response({"error": "Playlist not found"}, status=status.HTTP_404_NOT_FOUND)
+        if "If-Match" in request.headers and not etag_matches(request, playlist_etag(playlist), "If-Match"):
+            return Response({"error": "Playlist was modified"}, status=status.HTTP_412_PRECONDITION_FAILED)
+        try:
+            rank = move_song(playlist, song_id, before_id=before_id, after_id=after_id)
+        except LookupError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_404_NOT_FOUND)
+        except ValueError as exc:
+            return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
+
+    etag = playlist_etag(playlist)
+    response = Response({"id": playlist.id, "song_id": song_id, "rank": rank, "etag": etag})
+    response["ETag"] = etag
+    return response
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def playlist_songs(request, playlist_id):
+    """
+    A window of a playlist's songs in order: ?offset=&limit= (limit capped
+    at MAX_PAGE_SIZE). Served from the (playlist, rank) index.
+    """
+    try:
+        offset = int(request.query_params.get("offset", 0))
+        limit = parse_limit(request.query_params.get("limit"))
+    except (ValueError, CatalogQueryError):
+        return Response({"error": "offset and limit must be non-negative integers"},
+                        status=status.HTTP_400_BAD_REQUEST)
+    if offset < 0:
+        return Response({"error": "offset and limit must be non-negative integers"},
+                        status=status.HTTP_400_BAD_REQUEST)
+
+    playlist = Playlist.objects.filter(id=playlist_id, user=request.user).only("id", "updated_at").first()
+    if playlist is None:
+        return Response({"error": "Playlist not found"}, status=status.HTTP_404_NOT_FOUND)
+    rows = song_rows(Song.objects.filter(playlist_entries__playlist=playlist)
+                     .order_by("playlist_entries__rank")[offset:offset + limit])
+    response = Response({
+        "id": playlist.id,
+        "offset": offset,
+        "count": PlaylistSong.objects.filter(playlist=playlist).count(),
+        "songs": SongEncoder(request).encode_many(rows),
+    })
+    response["ETag"] = playlist_etag(playlist)
+    return response
+
+
+# ---------------- Playlist Sync ---------------- #
+from .changelog import sync_payload
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def sync_playlists(request):
+    """
+    Incremental playlist sync. Call without ?since= for a full snapshot,
+    then pass back the returned token to get only what changed:
+    { "token", "reset", "playlists": [..., "songs": [... "rank"], "removed_song_ids"],
+      "deleted": [<playlist id>, ...] }
+    "reset": true means the token was too old and the payload is a full
+    snapshot to replace local state with.
+    """
+    try:
+        return Response(sync_payload(request, request.user, request.query_params.get("since") or None))
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
 
 
 @api_view(["DELETE"])
@@ -152,14 +390,14 @@ def delete_playlist(request, playlist_id):
     # ---------------- Central Song Library (Admin Managed) ---------------- #
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
 def central_song_library(request):
     """
     Fetch all songs from the central admin-managed library.
     Users can only read; admin can add/remove songs via Django admin.
     """
-    songs = Song.objects.all()
-    serializer = SongSerializer(songs, many=True)
-    return Response(serializer.data)
+    return catalog_response(request, Song.objects.all())
 
 
 @api_view(["POST"])
@@ -188,14 +426,32 @@ def admin_delete_song(request, song_id):
     except Song.DoesNotExist:
         return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
 # ---------------- User Profile ---------------- #
-import os
-from django.conf import settings
 from rest_framework.parsers import MultiPartParser, FormParser
 from rest_framework.decorators import api_view, permission_classes, parser_classes
 from rest_framework.permissions import IsAuthenticated, AllowAny
 from rest_framework.response import Response
 from .models import UserProfile, Song
 from .serializers import SongSerializer
+from .authentication import get_profile
+from .uploads import PROFILE_PICTURE_MAX_BYTES, StagedUploadHandler, accept_profile_picture
+
+def _profile_payload(request, user, profile):
+    profile_url = profile.profile_picture.url if profile.profile_picture else ""
+    return {
+        "id": user.id,
+        "username": user.username,
+        "email": user.email,
+        "first_name": user.first_name or "",
+        "last_name": user.last_name or "",
+        "profile_picture": profile_url,
+        "profile_picture_variants": SongEncoder(request).variants(profile.profile_picture.name),
+        "profile_picture_status": profile.profile_picture_status,
+        "profile_exists": bool(profile.profile_picture),
+        "emotion_stats": profile.emotion_stats or {},
+        "artist_stats": profile.artist_stats or {},
+        "language_stats": profile.language_stats or {}  # ✅ Added
+    }
+
 
 @api_view(["GET", "PUT"])
 @permission_classes([IsAuthenticated])
@@ -204,67 +460,55 @@ def user_profile(request):
     """
     Fetch or update the profile of the currently logged-in user.
     Includes emotion, artist, and language stats in the GET response.
+    A new profile picture is processed in the background: PUT answers 202
+    with profile_picture_status "pending" and GET reports when it is ready.
     """
     user = request.user
     # Ensure profile exists
-    profile, created = UserProfile.objects.get_or_create(user=user)
+    profile = get_profile(user)
+    if profile.profile_picture_status == UserProfile.PICTURE_PENDING:
+        # Being polled: the upload may have finished in another worker
+        profile = get_profile(user, refresh=True)
 
     if request.method == "GET":
-        profile_url = profile.profile_picture.url if profile.profile_picture else ""
-        return Response({
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name or "",
-            "last_name": user.last_name or "",
-            "profile_picture": profile_url,
-            "profile_exists": bool(profile.profile_picture),
-            "emotion_stats": profile.emotion_stats or {},
-            "artist_stats": profile.artist_stats or {},
-            "language_stats": profile.language_stats or {}  # ✅ Added
-        })
+        return Response(_profile_payload(request, user, profile))
 
     elif request.method == "PUT":
-        first_name = request.data.get("first_name", user.first_name)
-        last_name = request.data.get("last_name", user.last_name)
-
-        user.first_name = first_name
-        user.last_name = last_name
-        user.save()
-
-        # Only update profile picture if a new file is uploaded
-        if "profile_picture" in request.FILES:
-            # Delete old file if exists
-            if profile.profile_picture:
-                old_file_path = profile.profile_picture.path
-                if os.path.isfile(old_file_path):
-                    os.remove(old_file_path)
-
-            # Save new profile picture
-            profile.profile_picture = request.FILES["profile_picture"]
-            profile.save()
-
-        profile_url = profile.profile_picture.url if profile.profile_picture else ""
-        return Response({
-            "id": user.id,
-            "username": user.username,
-            "email": user.email,
-            "first_name": user.first_name or "",
-            "last_name": user.last_name or "",
-            "profile_picture": profile_url,
-            "profile_exists": bool(profile.profile_picture),
-            "emotion_stats": profile.emotion_stats or {},
-            "artist_stats": profile.artist_stats or {},
-            "language_stats": profile.language_stats or {}  # ✅ Added
-        })
+        # Stream file parts to the staging area instead of memory/default temp files
+        handler = StagedUploadHandler(request._request)
+        request._request.upload_handlers = [handler]
+        accepted = None
+        try:
+            data, files = request.data, request.FILES
+            if getattr(request._request, "upload_too_large", False):
+                return Response(
+                    {"error": f"Profile picture must be under {PROFILE_PICTURE_MAX_BYTES // (1024 * 1024)} MB"},
+                    status=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+                )
+
+            user.first_name = data.get("first_name", user.first_name)
+            user.last_name = data.get("last_name", user.last_name)
+            user.save(update_fields=["first_name", "last_name"])
+
+            # Only update profile picture if a new file is uploaded
+            if "profile_picture" in files:
+                upload = files["profile_picture"]
+                accepted = upload.staged_path
+                accept_profile_picture(profile, upload)
+                return Response(_profile_payload(request, user, profile), status=status.HTTP_202_ACCEPTED)
+
+            return Response(_profile_payload(request, user, profile))
+        finally:
+            # Duplicate parts, failed parses etc. leave files nobody will process
+            handler.discard_staged(keep=accepted)
 
 # Public endpoint for all songs (no auth required)
 @api_view(["GET"])
 @permission_classes([AllowAny])
+@read_from_replica
+@cached_catalog_view
 def public_songs(request):
-    songs = Song.objects.all()
-    serializer = SongSerializer(songs, many=True)
-    return Response(serializer.data)
+    return catalog_response(request, Song.objects.all())
 
 # ---------------- emo, artist and language mapping---------------- #
 from django.db.models import F
@@ -272,6 +516,12 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import Song, UserProfile
+from .plays import record_play
+from .listening import recommendation_stats
+from .recommender import (
+    engine, DEFAULT_K, MAX_K, DEFAULT_EMOTION_WEIGHT, DEFAULT_ARTIST_WEIGHT,
+    DEFAULT_LANGUAGE_WEIGHT, LANGUAGE_BIAS_MODES,
+)
 
 
 @api_view(["POST"])
@@ -279,52 +529,37 @@ from .models import Song, UserProfile
 def play_song(request):
     """
     Endpoint to mark a song as played by the user.
-    Updates emotion, artist, and language stats in the user's profile.
-    Also tracks the most recently played language (for bias).
+    Appends a PlayEvent; emotion, artist and language stats (and the most
+    recently played language, used for bias) are folded into the profile
+    in the background by users/plays.py.
     Expects JSON: { "song_id": <id> }
     """
-    user = request.user
     song_id = request.data.get("song_id")
 
-    try:
-        song = Song.objects.get(id=song_id)
-    except Song.DoesNotExist:
+    title = Song.objects.filter(id=song_id).values_list("title", flat=True).first() if song_id else None
+    if title is None:
         return Response({"error": "Song not found"}, status=404)
 
-    # Ensure user profile exists
-    profile, created = UserProfile.objects.get_or_create(user=user)
-
-    # Ensure stats dictionaries exist
-    if not profile.emotion_stats:
-        profile.emotion_stats = {}
-    if not profile.artist_stats:
-        profile.artist_stats = {}
-    if not profile.language_stats:
-        profile.language_stats = {}
-
-    # Update emotion stats
-    if song.emotion:
-        profile.emotion_stats[song.emotion] = profile.emotion_stats.get(song.emotion, 0) + 1
+    record_play(request.user, song_id)
 
-    # Update artist stats
-    if song.artist:
-        profile.artist_stats[song.artist] = profile.artist_stats.get(song.artist, 0) + 1
+    return Response({"message": f"{title} played successfully"}, status=status.HTTP_202_ACCEPTED)
 
-    # Update language stats
-    if song.language:
-        profile.language_stats[song.language] = profile.language_stats.get(song.language, 0) + 1
-        # ✅ Strong bias: Save most recent language
-        profile.last_played_language = song.language  
 
-    profile.save()
-
-    return Response({
-        "message": f"{song.title} played successfully",
-        "emotion_stats": profile.emotion_stats,
-        "artist_stats": profile.artist_stats,
-        "language_stats": profile.language_stats,
-        "last_played_language": profile.last_played_language,
-    })
+def recommendation_options(params):
+    """engine.recommend() keyword arguments from the query string; raises ValueError."""
+    try:
+        options = {
+            "k": max(1, min(int(params.get("k", DEFAULT_K)), MAX_K)),
+            "emotion_weight": float(params.get("emotion_weight", DEFAULT_EMOTION_WEIGHT)),
+            "artist_weight": float(params.get("artist_weight", DEFAULT_ARTIST_WEIGHT)),
+            "language_weight": float(params.get("language_weight", DEFAULT_LANGUAGE_WEIGHT)),
+        }
+    except ValueError:
+        raise ValueError("k and weights must be numbers")
+    options["language_bias"] = params.get("language_bias", "filter")
+    if options["language_bias"] not in LANGUAGE_BIAS_MODES:
+        raise ValueError(f"language_bias must be one of: {', '.join(LANGUAGE_BIAS_MODES)}")
+    return options
 
 
 @api_view(["GET"])
@@ -336,58 +571,30 @@ def recommended_songs(request):
     1. Last played language (highest priority, forced bias)
     2. Language stats (if no last language)
     3. Emotion + Artist stats for ranking
-    Returns top 6 ranked songs.
+    Returns top 6 ranked songs by default.
+    Optional query params: ?k=, ?emotion_weight=, ?artist_weight=,
+    ?language_bias=filter|boost|none, ?language_weight=
     """
-    user = request.user
-    profile, _ = UserProfile.objects.get_or_create(user=user)
-
-    emotion_stats = profile.emotion_stats or {}
-    artist_stats = profile.artist_stats or {}
-    language_stats = profile.language_stats or {}
-
-    # ✅ Step 1: Always bias to most recently played language
-    if getattr(profile, "last_played_language", None):
-        top_language = profile.last_played_language
-        candidate_songs = Song.objects.filter(language=top_language)
-    elif language_stats:
-        top_language = max(language_stats, key=language_stats.get)
-        candidate_songs = Song.objects.filter(language=top_language)
-    else:
-        candidate_songs = Song.objects.all()
-
-    # Step 2: Score by emotion and artist
-    song_scores = []
-    for song in candidate_songs:
-        emotion_score = emotion_stats.get(song.emotion, 0) if song.emotion else 0
-        artist_score = artist_stats.get(song.artist, 0) if song.artist else 0
-        total_score = (emotion_score * 2) + artist_score
-        song_scores.append((total_score, song))
+    try:
+        options = recommendation_options(request.query_params)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=400)
 
-    # Step 3: Sort
-    song_scores.sort(key=lambda x: (x[0], x[1].id), reverse=True)
-    top_songs = [song for _, song in song_scores[:6]]
+    user = request.user
+    profile = get_profile(user)
+
+    # Steps 1-3: language bias, emotion/artist scoring and top-k (vectorized),
+    # on recency-weighted stats (plays fade with PLAYS_HALF_LIFE_DAYS)
+    top_ids = engine.recommend(
+        *recommendation_stats(profile),
+        last_played_language=getattr(profile, "last_played_language", None),
+        **options,
+    )
+    by_id = Song.objects.in_bulk(top_ids)
+    top_songs = [by_id[song_id] for song_id in top_ids if song_id in by_id]
 
     # Step 4: Serialize
-    def get_absolute_url(file_or_str):
-        if not file_or_str:
-            return None
-        if hasattr(file_or_str, "url"):
-            return request.build_absolute_uri(file_or_str.url)
-        return request.build_absolute_uri(str(file_or_str))
-
-    serialized = []
-    for song in top_songs:
-        serialized.append({
-            "id": song.id,
-            "title": song.title,
-            "artist": song.artist,
-            "src": get_absolute_url(song.src),
-            "cover_url": get_absolute_url(song.cover),
-            "emotion": song.emotion,
-            "language": song.language,
-        })
-
-    return Response(serialized)
+    return Response(SongEncoder(request).tracks(top_songs))
 
 
 
@@ -396,7 +603,9 @@ from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import IsAuthenticated
 from rest_framework.response import Response
 from .models import PlaylistActivity, Playlist
-from django.db.models import Q
+from .activity_buffer import open_buffer
+from django.db.models import Case, Count, F, Q, OuterRef, Subquery, Value, When, Window
+from django.db.models.functions import RowNumber
 from django.utils import timezone
 
 def get_absolute_url(request, file_or_field):
@@ -407,28 +616,129 @@ def get_absolute_url(request, file_or_field):
         return request.build_absolute_uri(file_or_field.url)
     return request.build_absolute_uri(str(file_or_field))
 
-def serialize_playlist(request, activity):
-    """Serialize playlist with songs + meta."""
+RECENT_PLAYLISTS = 5
+FREQUENT_PLAYLISTS = 5
+SUMMARY_COVERS = 4      # ?mode=summary: cover URLs of the first songs
+MAX_SUMMARY_COVERS = 10
+PLAYLIST_MODES = ("full", "summary")
+
+
+def playlist_list_options(params):
+    """(summary, covers) from ?mode=full|summary&covers=N; raises ValueError."""
+    mode = params.get("mode") or "full"
+    if mode not in PLAYLIST_MODES:
+        raise ValueError(f"mode must be one of: {', '.join(PLAYLIST_MODES)}")
+    try:
+        covers = int(params.get("covers", SUMMARY_COVERS))
+    except ValueError:
+        raise ValueError("covers must be an integer")
+    if not 0 <= covers <= MAX_SUMMARY_COVERS:
+        raise ValueError(f"covers must be between 0 and {MAX_SUMMARY_COVERS}")
+    return mode == "summary", covers
+
+
+def ranked_activities(user, pending=(), recent=RECENT_PLAYLISTS, frequent=RECENT_PLAYLISTS + FREQUENT_PLAYLISTS):
+    """
+    Candidates for the recent and frequent lists in one query: activity rows
+    ranked by last_opened and by open_count (ROW_NUMBER), keeping the top
+    of either ranking plus playlists with unflushed opens, whose rank can
+    change once those are merged.
+    """
+    return PlaylistActivity.objects.filter(user=user).select_related("playlist").annotate(
+        recent_rank=Window(RowNumber(), order_by=[F("last_opened").desc(nulls_last=True), F("id").desc()]),
+        frequent_rank=Window(RowNumber(), order_by=[F("open_count").desc(), F("id").desc()]),
+    ).filter(Q(recent_rank__lte=recent) | Q(frequent_rank__lte=frequent) | Q(playlist_id__in=list(pending)))
+
+
+def activities_with_pending(user, activities, pending):
+    """
+    Merge the user's unflushed playlist opens (`pending`, from the open
+    buffer) into evaluated activities. Pending playlists missing from them
+    are added too. Returns {playlist_id: PlaylistActivity}.
+    """
+    rows = {activity.playlist_id: activity for activity in activities}
+    missing = [playlist_id for playlist_id in pending if playlist_id not in rows]
+    if missing:
+        for playlist in Playlist.objects.filter(id__in=missing):
+            rows[playlist.id] = PlaylistActivity(user=user, playlist=playlist, open_count=0, last_opened=None)
+    for activity in rows.values():
+        open_buffer.apply_pending(user.id, activity)
+    return rows
+
+
+def split_recent_frequent(activities):
+    """(recent, frequent) lists; frequent skips what is already recent."""
+    recent = sorted(activities, key=lambda a: a.last_opened, reverse=True)[:RECENT_PLAYLISTS]
+    recent_ids = {pl.playlist_id for pl in recent}
+    frequent = sorted(
+        (a for a in activities if a.playlist_id not in recent_ids),
+        key=lambda a: a.open_count,
+        reverse=True,
+    )[:FREQUENT_PLAYLISTS]
+    return recent, frequent
+
+
+def playlist_summary_entries(playlist_ids, covers=SUMMARY_COVERS):
+    """
+    (playlist_id, song count, position, cover) rows, in one query: entries
+    are numbered by rank separately for songs with and without a cover,
+    so the first `covers` rows with one are the first covers shown.
+    """
+    has_cover = Case(When(Q(song__cover__isnull=True) | Q(song__cover=""), then=Value(False)), default=Value(True))
+    return PlaylistSong.objects.filter(playlist_id__in=playlist_ids).annotate(
+        position=Window(RowNumber(), partition_by=[F("playlist_id"), has_cover], order_by=F("rank").asc()),
+        song_count=Window(Count("id"), partition_by=F("playlist_id")),
+    ).filter(position__lte=max(covers, 1)).order_by("playlist_id", "rank")\
+        .values_list("playlist_id", "song_count", "position", "song__cover")
+
+
+def playlist_summaries(playlist_ids, covers=SUMMARY_COVERS, entries=None):
+    """{playlist_id: (song count, cover names of the first `covers` songs)}."""
+    if entries is None:
+        entries = playlist_summary_entries(playlist_ids, covers)
+    summaries = {playlist_id: (0, []) for playlist_id in playlist_ids}
+    for playlist_id, song_count, position, cover in entries:
+        names = summaries[playlist_id][1]
+        if position <= covers and cover:
+            names.append(cover)
+        summaries[playlist_id] = (song_count, names)
+    return summaries
+
+
+def serialize_playlist(request, activity, encoder=None, summary=None):
+    """
+    Serialize playlist with songs + meta. With a `summary` from
+    playlist_summaries() the song list is replaced by its count and the
+    first songs' cover URLs.
+    """
     playlist = activity.playlist
-    return {
+    encoder = encoder or SongEncoder(request)
+    data = {
         "id": playlist.id,
         "name": playlist.name,
-        "cover_url": get_absolute_url(request, playlist.cover),
-        "songs": [
-            {
-                "id": s.id,
-                "title": s.title,
-                "artist": s.artist,
-                "src": get_absolute_url(request, s.src),
-                "cover_url": get_absolute_url(request, s.cover),
-                "emotion": s.emotion,
-                "language": s.language,
-            }
-            for s in playlist.songs.all()
-        ],
-        "last_opened": activity.last_opened,
-        "open_count": activity.open_count,
+        "cover_url": encoder.url(playlist.cover.name),
+        "cover_variants": encoder.variants(playlist.cover.name),
     }
+    if summary is None:
+        data["songs"] = encoder.tracks(playlist.songs.all())
+        data["song_count"] = len(data["songs"])
+    else:
+        data["song_count"] = summary[0]
+        data["song_covers"] = [encoder.url(name) for name in summary[1]]
+    data["last_opened"] = activity.last_opened
+    data["open_count"] = activity.open_count
+    return data
+
+
+def serialize_playlists_for(request, activities, summary, covers):
+    """serialize_playlist() over several activities with one songs/summary query."""
+    encoder = SongEncoder(request)
+    if summary:
+        summaries = playlist_summaries([a.playlist_id for a in activities], covers)
+        return [serialize_playlist(request, a, encoder, summaries[a.playlist_id]) for a in activities]
+    prefetch_related_objects([a.playlist for a in activities], ordered_songs())
+    return [serialize_playlist(request, a, encoder) for a in activities]
+
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
@@ -437,39 +747,41 @@ def recent_playlists(request):
     Returns playlists based on:
     1. Recently opened
     2. Most frequently opened
+    Unflushed opens from the write-behind buffer are merged in.
+    ?mode=summary swaps each song list for song_count and song_covers
+    (the first ?covers=N, default 4).
     """
+    try:
+        summary, covers = playlist_list_options(request.query_params)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     user = request.user
+    pending = open_buffer.pending_for_user(user.id)
+    rows = activities_with_pending(user, ranked_activities(user, pending), pending)
+    recent, frequent = split_recent_frequent(list(rows.values()))
 
-    activities = PlaylistActivity.objects.filter(user=user)\
-        .select_related("playlist")\
-        .prefetch_related("playlist__songs")
-
-    # Recent playlists
-    recent = activities.order_by("-last_opened")[:5]
-
-    # Frequent playlists (excluding duplicates from recent)
-    recent_ids = [pl.playlist.id for pl in recent]
-    frequent = activities.exclude(playlist__id__in=recent_ids).order_by("-open_count")[:5]
-
+    # One songs/summary query for both lists
+    payload = serialize_playlists_for(request, recent + frequent, summary, covers)
     return Response({
-        "recent_playlists": [serialize_playlist(request, pl) for pl in recent],
-        "frequent_playlists": [serialize_playlist(request, pl) for pl in frequent],
+        "recent_playlists": payload[:len(recent)],
+        "frequent_playlists": payload[len(recent):],
     })
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
 def frequent_playlists(request):
     """
-    Returns most frequently opened playlists only.
+    Returns most frequently opened playlists only (?mode=summary as above).
     """
+    try:
+        summary, covers = playlist_list_options(request.query_params)
+    except ValueError as exc:
+        return Response({"error": str(exc)}, status=status.HTTP_400_BAD_REQUEST)
     user = request.user
-
-    activities = PlaylistActivity.objects.filter(user=user)\
-        .select_related("playlist")\
-        .prefetch_related("playlist__songs")\
-        .order_by("-open_count")[:10]
-
-    return Response([serialize_playlist(request, pl) for pl in activities])
+    pending = open_buffer.pending_for_user(user.id)
+    rows = activities_with_pending(user, ranked_activities(user, pending, recent=0, frequent=10), pending)
+    top = sorted(rows.values(), key=lambda a: a.open_count, reverse=True)[:10]
+    return Response(serialize_playlists_for(request, top, summary, covers))
 
 # ---------------- Playlist Open Tracking ---------------- #
 @api_view(["POST"])
@@ -477,18 +789,26 @@ def frequent_playlists(request):
 def playlist_open(request, playlist_id):
     """
     Call this when a user opens a playlist.
-    Updates last_opened and increments open_count.
+    Updates last_opened and increments open_count through the write-behind
+    buffer; the response already includes the buffered open.
     """
     user = request.user
-    try:
-        playlist = Playlist.objects.get(id=playlist_id)
-    except Playlist.DoesNotExist:
+    # One read: the playlist plus this user's stored activity counters
+    user_activity = PlaylistActivity.objects.filter(user=user, playlist=OuterRef("pk"))
+    playlist = Playlist.objects.filter(id=playlist_id).annotate(
+        stored_count=Subquery(user_activity.values("open_count")[:1]),
+        stored_opened=Subquery(user_activity.values("last_opened")[:1]),
+    ).first()
+    if playlist is None:
         return Response({"error": "Playlist not found"}, status=404)
 
-    activity, created = PlaylistActivity.objects.get_or_create(user=user, playlist=playlist)
-    activity.last_opened = timezone.now()
-    activity.open_count = (activity.open_count or 0) + 1
-    activity.save()
+    open_buffer.record(user.id, playlist.id, timezone.now())
+    activity = open_buffer.apply_pending(user.id, PlaylistActivity(
+        user=user,
+        playlist=playlist,
+        open_count=playlist.stored_count or 0,
+        last_opened=playlist.stored_opened,
+    ))
 
     # Return the serialized playlist
     return Response({
@@ -507,10 +827,15 @@ from rest_framework.response import Response
 from django.db.models import Q
 from .models import Song
 from .serializers import SongSerializer
+from .search_index import search_catalog, song_index, SUGGEST_MAX_RESULTS
+from .cache import catalog_version
+from django.utils.cache import patch_cache_control, patch_vary_headers
+import hashlib
 
 # ---------------- Search Endpoint ---------------- #
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
 def search_songs_artists_emotions(request):
     """
     Search songs, artists, emotions, or languages.
@@ -520,67 +845,220 @@ def search_songs_artists_emotions(request):
     if not query:
         return Response({"songs": [], "artists": [], "emotions": [], "languages": []})
 
-    # Songs matching the title
-    songs = Song.objects.filter(title__icontains=query)
-    
-    # Distinct artists matching the query
-    artists = Song.objects.filter(artist__icontains=query).values_list('artist', flat=True).distinct()
-    
-    # Distinct emotions matching the query
-    emotions = Song.objects.filter(emotion__icontains=query).values_list('emotion', flat=True).distinct()
-    
-    # Distinct languages matching the query
-    languages = Song.objects.filter(language__icontains=query).values_list('language', flat=True).distinct()
-
-    # Serialize songs using SongSerializer for full details
-    serializer = SongSerializer(songs, many=True, context={"request": request})
+    # Ranked hits from the in-memory index (DB fallback while it warms up)
+    songs, artists, emotions, languages = search_catalog(query)
 
     return Response({
-        "songs": serializer.data,
-        "artists": [artist for artist in artists if artist],
-        "emotions": [emotion for emotion in emotions if emotion],
-        "languages": [lang for lang in languages if lang]
+        "songs": SongEncoder(request).encode_many(songs),
+        "artists": artists,
+        "emotions": emotions,
+        "languages": languages,
     })
 
 
+# ---------------- Search Suggestions ---------------- #
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+def suggest_songs(request):
+    """
+    Search-as-you-type suggestions (ids + labels only).
+    Query params: ?q=<prefix>&limit=<n> (n capped at SUGGEST_MAX_RESULTS)
+    Responses are browser-cacheable for a short time so retyped or
+    backspaced prefixes don't hit the server again.
+    """
+    query = request.query_params.get("q", "").strip()
+    try:
+        limit = int(request.query_params.get("limit", SUGGEST_MAX_RESULTS))
+    except ValueError:
+        return Response({"error": "limit must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+    limit = max(1, min(limit, SUGGEST_MAX_RESULTS))
+
+    if not song_index.ensure_fresh():
+        # Cold index: cheap title prefix query, never cached by the browser
+        rows = Song.objects.filter(title__istartswith=query).values_list("id", "title")[:limit] if query else []
+        response = Response({
+            "query": query,
+            "suggestions": [{"type": "song", "id": song_id, "label": title} for song_id, title in rows],
+        })
+        patch_cache_control(response, no_store=True)
+        return response
+
+    # The body echoes `query` as typed, so the validator covers it verbatim
+    digest = hashlib.sha1(f"{query}|{limit}".encode()).hexdigest()[:16]
+    etag = f'"{catalog_version()}-{digest}"'
+    if etag_matches(request, etag):
+        response = Response(status=status.HTTP_304_NOT_MODIFIED)
+    else:
+        response = Response({"query": query, "suggestions": song_index.suggest(query, limit)})
+    response["ETag"] = etag
+    patch_cache_control(response, private=True, max_age=30)
+    patch_vary_headers(response, ["Authorization"])
+    return response
+
+
 # ---------------- Tile Click Endpoints ---------------- #
+from django.db.models import Value
+from django.db.models.functions import Lower
+
+
+def songs_matching(field, value):
+    """
+    Case-insensitive match on `field` that can use the song_<field>_lower_idx
+    index; __iexact compiles to LIKE/UPPER() and always scans the table.
+    """
+    return Song.objects.annotate(**{f"{field}_key": Lower(field)}).filter(
+        **{f"{field}_key": Lower(Value(value))}
+    )
+
+
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
 def songs_by_artist(request, artist_name):
     """
     Return all songs by a specific artist (for artist tile click).
     """
-    songs = Song.objects.filter(artist__iexact=artist_name)
-    serializer = SongSerializer(songs, many=True, context={"request": request})
+    songs = song_rows(songs_matching("artist", artist_name))
     return Response({
         "artist": artist_name,
-        "songs": serializer.data
+        "songs": SongEncoder(request).encode_many(songs)
     })
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
 def songs_by_emotion(request, emotion_name):
     """
     Return all songs of a specific emotion (for emotion tile click).
     """
-    songs = Song.objects.filter(emotion__iexact=emotion_name)
-    serializer = SongSerializer(songs, many=True, context={"request": request})
+    songs = song_rows(songs_matching("emotion", emotion_name))
     return Response({
         "emotion": emotion_name,
-        "songs": serializer.data
+        "songs": SongEncoder(request).encode_many(songs)
     })
 
 
 @api_view(["GET"])
 @permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
 def songs_by_language(request, language_name):
     """
     Return all songs of a specific language (for language tile click).
     """
-    songs = Song.objects.filter(language__iexact=language_name)
-    serializer = SongSerializer(songs, many=True, context={"request": request})
+    songs = song_rows(songs_matching("language", language_name))
     return Response({
         "language": language_name,
-        "songs": serializer.data
-    })
\ No newline at end of file
+        "songs": SongEncoder(request).encode_many(songs)
+    })
+
+# ---------------- Audio Streaming ---------------- #
+from rest_framework.negotiation import BaseContentNegotiation
+from rest_framework.settings import api_settings
+from django.urls import reverse
+from .authentication import StreamTokenAuthentication, make_stream_token, stream_token_max_age
+from .streaming import media_response
+from django.core.files.storage import default_storage
+
+
+class IgnoreClientContentNegotiation(BaseContentNegotiation):
+    """Media elements send Accept: audio/*; errors still render as JSON."""
+
+    def select_parser(self, request, parsers):
+        return parsers[0]
+
+    def select_renderer(self, request, renderers, format_suffix=None):
+        return renderers[0], renderers[0].media_type
+
+
+class SongStreamView(APIView):
+    """
+    Stream a song's audio file with HTTP Range support (206 Partial Content)
+    so players can seek. Accepts the JWT as a header, or a signed stream
+    token from song_stream_url as ?token=.
+    """
+    authentication_classes = [*api_settings.DEFAULT_AUTHENTICATION_CLASSES, StreamTokenAuthentication]
+    permission_classes = [IsAuthenticated]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, song_id):
+        name = Song.objects.filter(id=song_id).values_list("src", flat=True).first()
+        if not name:
+            return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
+        return media_response(request, Song._meta.get_field("src").storage, name)
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+def song_stream_url(request, song_id):
+    """Short-lived stream URL for <audio src>, which can't send the JWT header."""
+    if not Song.objects.filter(id=song_id).exists():
+        return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
+    path = reverse("stream_song", args=[song_id])
+    token = make_stream_token(request.user, song_id)
+    return Response({
+        "url": request.build_absolute_uri(f"{path}?token={token}"),
+        "expires_in": stream_token_max_age(),
+    })
+
+
+# ---------------- Image Variants ---------------- #
+from django.utils.cache import patch_vary_headers
+from .images import (
+    IMAGE_VARIANTS, PRIVATE_IMAGE_PREFIXES, PRIVATE_VARIANT_CACHE_CONTROL, VARIANT_CACHE_CONTROL,
+    ensure_variant, is_variant_source,
+)
+
+
+class ImageVariantView(APIView):
+    """
+    Resized cover / profile image (thumb, medium, large). WebP is sent to
+    clients that accept it, or with ?format=webp. Anonymous callers get
+    covers that were pre-built after upload; signed-in users also trigger
+    generation of missing variants of older uploads. Profile pictures need
+    a signed-in user.
+    """
+    permission_classes = [AllowAny]
+    content_negotiation_class = IgnoreClientContentNegotiation
+
+    def get(self, request, variant, name):
+        if variant not in IMAGE_VARIANTS or not is_variant_source(name):
+            return Response({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
+        signed_in = request.user.is_authenticated
+        private = name.startswith(PRIVATE_IMAGE_PREFIXES)
+        if private and not signed_in:
+            self.permission_denied(request)
+        requested = request.query_params.get("format")
+        webp = requested == "webp" or (requested is None and "image/webp" in request.headers.get("Accept", ""))
+        target = ensure_variant(name, variant, webp, build=signed_in)
+        if target is None:
+            return Response({"error": "Image not found"}, status=status.HTTP_404_NOT_FOUND)
+        cache_control = PRIVATE_VARIANT_CACHE_CONTROL if private else VARIANT_CACHE_CONTROL
+        response = media_response(request, default_storage, target, cache_control=cache_control)
+        patch_vary_headers(response, ("Accept",))
+        return response
+
+
+# ---------------- Waveform ---------------- #
+from .audio import waveform_peaks
+
+
+@api_view(["GET"])
+@permission_classes([IsAuthenticated])
+@read_from_replica
+@cached_catalog_view
+def song_waveform(request, song_id):
+    """
+    Precomputed waveform peaks (0..1) for drawing a scrubber without
+    downloading the audio. Empty until the song has been analyzed.
+    """
+    row = Song.objects.filter(id=song_id).values_list("duration", "waveform").first()
+    if row is None:
+        return Response({"error": "Song not found"}, status=status.HTTP_404_NOT_FOUND)
+    duration, waveform = row
+    peaks = waveform_peaks(waveform)
+    return Response({"id": song_id, "duration": duration, "points": len(peaks), "peaks": peaks})